@@ -12,6 +12,7 @@ from . import tuner
 from . import compiler
 from . import result_utils
 from .frontends import load_model as load
+from .frontends import load_model_batch as load_batch
 from .compiler import compile_model as compile
 from .runner import run_module as run
 from .tuner import tune_model as tune
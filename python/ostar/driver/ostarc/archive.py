@@ -0,0 +1,325 @@
+"""
+Helpers to write and read the tar archives produced by OSTARC.
+"""
+import contextlib
+import gzip
+import hashlib
+import io
+import json
+import os
+import tarfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ostar.driver.ostarc import OSTARCException, OSTARCImportError
+
+
+COMPRESSIONS = [None, "gzip", "zstd"]
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_GZIP_CHUNK_SIZE = 1 << 24
+
+
+def _lazy_zstandard():
+    try:
+        import zstandard  # pylint: disable=import-outside-toplevel
+    except ImportError as error:
+        raise OSTARCImportError("zstandard") from error
+    return zstandard
+
+
+class ParallelGzipWriter(object):
+    """File object compressing its input in parallel, as a multi-member gzip stream.
+
+    The input is split in fixed-size chunks that are compressed by a pool of
+    threads (zlib releases the GIL) and written in order, each one as a
+    complete gzip member. Concatenated gzip members form a valid gzip file,
+    readable by the gzip and tarfile modules.
+
+    Parameters
+    ----------
+    fileobj : file-like
+        The file receiving the compressed data.
+    threads : int, optional
+        The number of compression threads. Defaults to the number of CPUs.
+    level : int, optional
+        The gzip compression level.
+    """
+
+    def __init__(self, fileobj, threads=None, level=6):
+        self._fileobj = fileobj
+        self._level = level
+        self._threads = threads or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=self._threads)
+        self._pending = deque()
+        self._buffer = bytearray()
+
+    def _submit(self, data):
+        self._pending.append(self._executor.submit(gzip.compress, data, self._level))
+        # Bound the memory held by chunks in flight.
+        while len(self._pending) > 2 * self._threads:
+            self._fileobj.write(self._pending.popleft().result())
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= _GZIP_CHUNK_SIZE:
+            self._submit(bytes(self._buffer[:_GZIP_CHUNK_SIZE]))
+            del self._buffer[:_GZIP_CHUNK_SIZE]
+        return len(data)
+
+    def close(self):
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer = bytearray()
+        while self._pending:
+            self._fileobj.write(self._pending.popleft().result())
+        self._executor.shutdown()
+
+
+@contextlib.contextmanager
+def open_archive_writer(path, compression=None, threads=None):
+    """Open a tar archive for streaming writes, optionally compressed.
+
+    Parameters
+    ----------
+    path : str
+        The path of the archive.
+    compression : str, optional
+        None for an uncompressed tar, "gzip" or "zstd".
+    threads : int, optional
+        The number of compression threads.
+
+    Yields
+    ------
+    tar : tarfile.TarFile
+        The archive, opened in stream mode.
+    """
+    if compression not in COMPRESSIONS:
+        raise OSTARCException(
+            f"Unsupported compression '{compression}'. Choose from: {COMPRESSIONS}"
+        )
+
+    with open(path, "wb") as out_file:
+        if compression is None:
+            sink = out_file
+        elif compression == "gzip":
+            sink = ParallelGzipWriter(out_file, threads)
+        else:
+            zstandard = _lazy_zstandard()
+            compressor = zstandard.ZstdCompressor(threads=threads or -1)
+            sink = compressor.stream_writer(out_file, closefd=False)
+        try:
+            with tarfile.open(fileobj=sink, mode="w|") as tar:
+                yield tar
+        finally:
+            if sink is not out_file:
+                sink.close()
+
+
+def is_compressed(path):
+    """Check whether an archive is compressed, as opposed to a plain tar."""
+    with open(path, "rb") as in_file:
+        magic = in_file.read(len(_ZSTD_MAGIC))
+    return magic == _ZSTD_MAGIC or magic[:2] == b"\x1f\x8b"
+
+
+@contextlib.contextmanager
+def open_archive(path):
+    """Open a tar archive written by `open_archive_writer` for reading.
+
+    Compressed archives are opened in stream mode, so their members have to
+    be read in order.
+    """
+    with open(path, "rb") as in_file:
+        magic = in_file.read(len(_ZSTD_MAGIC))
+    if magic != _ZSTD_MAGIC:
+        with tarfile.open(path) as tar:
+            yield tar
+        return
+
+    zstandard = _lazy_zstandard()
+    with open(path, "rb") as in_file:
+        with zstandard.ZstdDecompressor().stream_reader(in_file) as reader:
+            with tarfile.open(fileobj=reader, mode="r|") as tar:
+                yield tar
+
+
+def add_member(tar, name, fileobj, size):
+    """Add a member to a tar archive, reading its contents from a file object."""
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(time.time())
+    tar.addfile(info, fileobj)
+
+
+MANIFEST_NAME = "manifest.json"
+_MANIFEST_VERSION = 1
+
+
+def _package_tarinfo(name, size, mtime):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.mode = 0o644
+    return info
+
+
+def _header_size(info):
+    return len(info.tobuf(tarfile.GNU_FORMAT, tarfile.ENCODING, "surrogateescape"))
+
+
+def _padded(size):
+    return -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+
+def _sha256_file(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as in_file:
+        for chunk in iter(lambda: in_file.read(_GZIP_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def write_package(package_path, members, package_type, executor_type=None, lib=None):
+    """Write a package archive starting with a manifest of its members.
+
+    The manifest is the first member of the archive and lists the name,
+    data offset, size and SHA-256 digest of every other member, together
+    with the package type, so packages can be validated and their members
+    read without scanning or extracting the archive. The offsets are
+    predicted from the exact size of the tar headers, and checked while
+    writing.
+
+    Parameters
+    ----------
+    package_path : str
+        The path of the package.
+    members : list of tuple
+        The (name in the archive, path on disk) of each member.
+    package_type : str
+        The type of the package, e.g. "classic", "vm" or "variants".
+    executor_type : str, optional
+        The executor the package is built for.
+    lib : str, optional
+        The name of the library member.
+    """
+    mtime = int(time.time())
+    infos = [
+        (_package_tarinfo(name, os.path.getsize(path), mtime), path) for name, path in members
+    ]
+    digests = [_sha256_file(path) for _, path in infos]
+
+    manifest_blocks = 0
+    while True:
+        offset = manifest_blocks
+        entries = []
+        for (info, _), digest in zip(infos, digests):
+            offset += _header_size(info)
+            entries.append(
+                {"name": info.name, "offset": offset, "size": info.size, "sha256": digest}
+            )
+            offset += _padded(info.size)
+        manifest = json.dumps(
+            {
+                "version": _MANIFEST_VERSION,
+                "type": package_type,
+                "executor_type": executor_type,
+                "lib": lib,
+                "members": entries,
+            },
+            indent=1,
+        ).encode("utf-8")
+        manifest_info = _package_tarinfo(MANIFEST_NAME, len(manifest), mtime)
+        blocks = _header_size(manifest_info) + _padded(len(manifest))
+        # The offsets depend on the manifest size, iterate until it is stable.
+        if blocks == manifest_blocks:
+            break
+        manifest_blocks = blocks
+
+    with tarfile.open(package_path, "w", format=tarfile.GNU_FORMAT) as tar:
+        tar.addfile(manifest_info, io.BytesIO(manifest))
+        for (info, path), entry in zip(infos, entries):
+            if tar.offset + _header_size(info) != entry["offset"]:
+                raise OSTARCException(f"Unexpected offset of '{info.name}' in {package_path}.")
+            with open(path, "rb") as in_file:
+                tar.addfile(info, in_file)
+
+
+def read_manifest(package_path):
+    """Read the manifest of a package, reading only the front of the archive.
+
+    Returns
+    -------
+    manifest : dict or None
+        The manifest, or None if the package has none (e.g. MLF packages
+        or packages exported by older versions).
+    """
+    with open(package_path, "rb") as in_file:
+        header = in_file.read(tarfile.BLOCKSIZE)
+        try:
+            info = tarfile.TarInfo.frombuf(header, tarfile.ENCODING, "surrogateescape")
+        except tarfile.HeaderError:
+            return None
+        if info.name != MANIFEST_NAME:
+            return None
+        manifest = json.loads(in_file.read(info.size).decode("utf-8"))
+    if manifest.get("version") != _MANIFEST_VERSION:
+        raise OSTARCException(f"Unsupported manifest version {manifest.get('version')}.")
+    return manifest
+
+
+def manifest_member(manifest, name):
+    """Get the manifest entry of a member, raising if it is missing."""
+    for entry in manifest["members"]:
+        if entry["name"] == name:
+            return entry
+    raise OSTARCException(f"Member '{name}' not found in the package manifest.")
+
+
+def read_member(package_path, entry):
+    """Read the contents of a package member listed in its manifest."""
+    with open(package_path, "rb") as in_file:
+        in_file.seek(entry["offset"])
+        return in_file.read(entry["size"])
+
+
+def extract_member(package_path, entry, path):
+    """Copy a package member listed in its manifest to a file."""
+    with open(package_path, "rb") as in_file, open(path, "wb") as out_file:
+        in_file.seek(entry["offset"])
+        remaining = entry["size"]
+        while remaining:
+            chunk = in_file.read(min(remaining, _GZIP_CHUNK_SIZE))
+            if not chunk:
+                raise OSTARCException(f"Truncated member '{entry['name']}' in {package_path}.")
+            out_file.write(chunk)
+            remaining -= len(chunk)
+
+
+def verify_package(package_path, manifest=None):
+    """Check the members of a package against the digests of its manifest.
+
+    Raises
+    ------
+    OSTARCException
+        If the package has no manifest, or a member is truncated or corrupt.
+    """
+    manifest = manifest or read_manifest(package_path)
+    if manifest is None:
+        raise OSTARCException(f"{package_path} has no manifest to validate against.")
+    with open(package_path, "rb") as in_file:
+        for entry in manifest["members"]:
+            in_file.seek(entry["offset"])
+            sha = hashlib.sha256()
+            remaining = entry["size"]
+            while remaining:
+                chunk = in_file.read(min(remaining, _GZIP_CHUNK_SIZE))
+                if not chunk:
+                    break
+                sha.update(chunk)
+                remaining -= len(chunk)
+            if remaining or sha.hexdigest() != entry["sha256"]:
+                raise OSTARCException(
+                    f"Member '{entry['name']}' of {package_path} is truncated or corrupt."
+                )
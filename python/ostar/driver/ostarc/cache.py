@@ -0,0 +1,455 @@
+"""
+On-disk, content-addressed caches used by OSTARC.
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+from typing import Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import ostar
+from ostar.driver.ostarc import OSTARCException
+from ostar.driver.ostarc.model import OSTARCModel, OSTARCPackage
+from ostar.driver.ostarc.param_io import tensor_digest
+from ostar.driver.ostarc.params import LazyParam
+
+
+# pylint: disable=invalid-name
+logger = logging.getLogger("OSTARC")
+
+DEFAULT_CACHE_SIZE = 10 * 1024**3
+
+_LOCK_NAME = ".lock"
+_STATS_NAME = "stats.json"
+_CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path: str):
+    """Compute the SHA-256 digest of a file, reading it in chunks.
+
+    Parameters
+    ----------
+    path : str
+        The path to the file.
+
+    Returns
+    -------
+    digest : str
+        The hex digest of the file contents.
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as in_file:
+        for chunk in iter(lambda: in_file.read(_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def params_digest(params):
+    """Compute the SHA-256 digest of a params dict.
+
+    The digest covers the name, dtype, shape and contents of every param.
+    LazyParams are hashed on their description, as they have no data yet.
+
+    Parameters
+    ----------
+    params : Mapping
+        Mapping from parameter names to NDArrays, NumPy arrays or LazyParams.
+
+    Returns
+    -------
+    digest : str
+        The hex digest of the params.
+    """
+    sha = hashlib.sha256()
+    for name in sorted(params):
+        value = params[name]
+        sha.update(name.encode("utf-8") + b"\0")
+        if isinstance(value, LazyParam):
+            sha.update(repr((value.shape, value.dtype, value.fill, value.seed)).encode("utf-8"))
+            continue
+        sha.update(tensor_digest(value).encode("utf-8"))
+    return sha.hexdigest()
+
+
+def make_cache_key(*parts):
+    """Combine JSON-serializable parts into a single cache key.
+
+    Values that cannot be serialized as JSON (e.g. OSTAR objects) are
+    represented by their ``repr``.
+    """
+    text = json.dumps(parts, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DirectoryLRUCache(object):
+    """A size-bounded cache of files stored in a directory.
+
+    Each entry is a single file named after its key. Entries are evicted in
+    least-recently-used order, using the file modification time as the access
+    time. All modifications happen under an exclusive file lock, and entries
+    are published with an atomic rename, so the cache can be shared by
+    several processes.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory holding the cache entries. Created if missing.
+    max_size : int, optional
+        Maximum total size of the entries, in bytes.
+    suffix : str, optional
+        File suffix used for the entries.
+    """
+
+    def __init__(self, cache_dir: str, max_size: Optional[int] = None, suffix: str = ""):
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.max_size = DEFAULT_CACHE_SIZE if max_size is None else max_size
+        self.suffix = suffix
+        if self.max_size <= 0:
+            raise OSTARCException("The cache size must be a positive number of bytes.")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(os.path.join(self.cache_dir, _LOCK_NAME), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _bump_stat(self, name, count=1):
+        """Increment a persistent counter. Must be called with the lock held."""
+        stats = self._read_stats()
+        stats[name] = stats.get(name, 0) + count
+        tmp_path = os.path.join(self.cache_dir, "." + _STATS_NAME)
+        with open(tmp_path, "w") as stats_file:
+            json.dump(stats, stats_file)
+        os.replace(tmp_path, os.path.join(self.cache_dir, _STATS_NAME))
+
+    def _read_stats(self):
+        try:
+            with open(os.path.join(self.cache_dir, _STATS_NAME)) as stats_file:
+                return json.load(stats_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(".") or not name.endswith(self.suffix) or name == _STATS_NAME:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return entries
+
+    def entry_path(self, key: str):
+        """Get the path where the entry for ``key`` is stored."""
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def lookup(self, key: str):
+        """Look up an entry, marking it as recently used.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+
+        Returns
+        -------
+        path : str or None
+            The path to the cached entry, or None on a miss.
+        """
+        path = self.entry_path(key)
+        with self._locked():
+            if os.path.exists(path):
+                os.utime(path)
+                self._bump_stat("hits")
+                logger.debug("cache hit: %s", path)
+                return path
+            self._bump_stat("misses")
+        logger.debug("cache miss: %s", key)
+        return None
+
+    def insert(self, key: str, writer: Callable[[str], None]):
+        """Create an entry by calling ``writer`` with a temporary path.
+
+        The temporary file is moved in place once ``writer`` returns, and
+        the least recently used entries are evicted to respect ``max_size``.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+        writer : Callable[[str], None]
+            Function that writes the entry contents to the given path.
+
+        Returns
+        -------
+        path : str
+            The path to the cached entry.
+        """
+        path = self.entry_path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-", suffix=self.suffix)
+        os.close(fd)
+        try:
+            writer(tmp_path)
+            with self._locked():
+                os.replace(tmp_path, path)
+                self._evict(keep=path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    def remove(self, key: str, corrupt: bool = False):
+        """Remove the entry for ``key``, if any.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+        corrupt : bool, optional
+            Whether the entry is removed because it could not be read. Its
+            lookup was then counted as a hit, so it is recorded as a miss.
+        """
+        path = self.entry_path(key)
+        with self._locked():
+            if corrupt:
+                self._bump_stat("hits", -1)
+                self._bump_stat("misses")
+            if os.path.exists(path):
+                os.remove(path)
+                self._bump_stat("evictions")
+                logger.debug("cache eviction: %s", path)
+
+    def _evict(self, keep=None):
+        """Remove least recently used entries. Must be called with the lock held."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            total -= size
+            evicted += 1
+            logger.debug("cache eviction: %s", path)
+        if evicted:
+            self._bump_stat("evictions", evicted)
+
+    def stats(self):
+        """Get the cache statistics.
+
+        Returns
+        -------
+        stats : dict
+            The number of hits, misses and evictions recorded since the cache
+            was created, together with the number and total size of entries.
+        """
+        with self._locked():
+            stats = self._read_stats()
+            entries = self._entries()
+        return {
+            "hits": stats.get("hits", 0),
+            "misses": stats.get("misses", 0),
+            "evictions": stats.get("evictions", 0),
+            "entries": len(entries),
+            "size": sum(size for _, size, _ in entries),
+            "max_size": self.max_size,
+        }
+
+    def clear(self):
+        """Remove all entries and reset the statistics."""
+        with self._locked():
+            for _, _, path in self._entries():
+                os.remove(path)
+            stats_path = os.path.join(self.cache_dir, _STATS_NAME)
+            if os.path.exists(stats_path):
+                os.remove(stats_path)
+
+
+class ImportCache(DirectoryLRUCache):
+    """Cache of imported models, stored as saved OSTARCModels.
+
+    Entries are keyed on the model file digest, the frontend name, the
+    input shapes and the frontend options, so a hit can be served without
+    importing the original framework.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory holding the cache entries.
+    max_size : int, optional
+        Maximum total size of the cached models, in bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_size: Optional[int] = None):
+        super(ImportCache, self).__init__(cache_dir, max_size, suffix=".tar")
+
+    @staticmethod
+    def key(path, frontend_name, shape_dict=None, **kwargs):
+        """Compute the cache key of a model import.
+
+        Parameters
+        ----------
+        path : str
+            The path to the model file.
+        frontend_name : str
+            The name of the frontend used to import the model.
+        shape_dict : dict, optional
+            Mapping from input names to their shapes.
+        kwargs : dict
+            Additional options passed to the frontend.
+
+        Returns
+        -------
+        key : str
+            The cache key.
+        """
+        shapes = None
+        if shape_dict is not None:
+            shapes = {name: [str(dim) for dim in shape] for name, shape in shape_dict.items()}
+        return make_cache_key(
+            ostar.__version__, file_digest(path), frontend_name, shapes, kwargs
+        )
+
+    def get(self, key: str):
+        """Get a cached model.
+
+        Returns
+        -------
+        ostarc_model : OSTARCModel or None
+            The cached model, or None on a miss. A truncated or corrupt
+            entry is evicted and counts as a miss, so it gets re-imported.
+        """
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            return OSTARCModel(model_path=path)
+        except FileNotFoundError:
+            # Evicted by another process in the meantime.
+            return None
+        except (tarfile.ReadError, EOFError, ValueError, ostar.error.OSTARError) as error:
+            # A truncated archive, or a valid archive with truncated members.
+            logger.warning("evicting corrupt import cache entry %s: %s", path, error)
+            self.remove(key, corrupt=True)
+            return None
+
+    def put(self, key: str, ostarc_model: OSTARCModel):
+        """Store an imported model in the cache."""
+        return self.insert(key, ostarc_model.save)
+
+
+class PackageCache(DirectoryLRUCache):
+    """Cache of compiled packages, as exported by `OSTARCModel.export_package`.
+
+    Entries are keyed on the structural hash of the module, the digest of
+    its params and every compilation option that changes the generated
+    code, so recompiling an unchanged model for an unchanged target is
+    served from the cache.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory holding the cache entries.
+    max_size : int, optional
+        Maximum total size of the cached packages, in bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_size: Optional[int] = None):
+        super(PackageCache, self).__init__(cache_dir, max_size, suffix=".tar")
+
+    @staticmethod
+    def key(
+        ostarc_model: OSTARCModel,
+        target,
+        executor=None,
+        runtime=None,
+        pass_context_configs: Optional[Dict] = None,
+        **kwargs,
+    ):
+        """Compute the cache key of a compilation.
+
+        Parameters
+        ----------
+        ostarc_model : OSTARCModel
+            The model to compile.
+        target : str or ostar.target.Target
+            The compilation target, including its host if any.
+        executor : ostar.relay.backend.Executor, optional
+            The executor configuration.
+        runtime : ostar.relay.backend.Runtime, optional
+            The runtime configuration.
+        pass_context_configs : dict, optional
+            The configs of the PassContext used for the compilation.
+        kwargs : dict
+            Additional options changing the output, e.g. the optimization
+            level, the tuning records digest or the output format.
+
+        Returns
+        -------
+        key : str
+            The cache key.
+        """
+        return make_cache_key(
+            ostar.__version__,
+            str(ostar.ir.structural_hash(ostarc_model.mod)),
+            params_digest(ostarc_model.params or {}),
+            str(target),
+            # str() of a Target leaves out its host.
+            str(getattr(target, "host", None)),
+            str(executor),
+            str(runtime),
+            {name: str(value) for name, value in (pass_context_configs or {}).items()},
+            kwargs,
+        )
+
+    def get(self, key: str, package_path: Optional[str] = None):
+        """Get a cached package.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+        package_path : str, optional
+            If given, the cached package is copied to this path, so it
+            outlives the eviction of the cache entry.
+
+        Returns
+        -------
+        ostarc_package : OSTARCPackage or None
+            The cached package, or None on a miss.
+        """
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            if package_path is not None:
+                shutil.copyfile(path, package_path)
+                path = package_path
+            return OSTARCPackage(path)
+        except FileNotFoundError:
+            # Evicted by another process in the meantime.
+            return None
+
+    def put(self, key: str, package_path: str):
+        """Store an exported package in the cache."""
+        return self.insert(key, lambda path: shutil.copyfile(package_path, path))
@@ -1,8 +1,17 @@
+import io
 import logging
 import os
 import sys
 import re
 import importlib
+import mmap
+import numbers
+import struct
+import multiprocessing
+from collections import namedtuple
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from abc import ABC
 from abc import abstractmethod
 from typing import Optional, List, Dict
@@ -10,10 +19,23 @@ from pathlib import Path
 
 import numpy as np
 
+import ostar
 from ostar import relay
 from ostar import parser
+from ostar.contrib import utils
 from ostar.driver.ostarc import OSTARCException, OSTARCImportError
 from ostar.driver.ostarc.model import OSTARCModel
+from ostar.driver.ostarc.cache import ImportCache
+from ostar.driver.ostarc.onnx_simplify import simplify_onnx_model
+from ostar.driver.ostarc.param_io import LazyParamDict, map_file_region
+from ostar.driver.ostarc.params import (
+    LazyParam,
+    cast_params_storage,
+    dedup_params as dedup_params_by_content,
+    materialize_params,
+    ndarray_view,
+)
+from ostar.driver.ostarc.profiling import ImportProfile, profile_import, profile_stage
 
 
 # pylint: disable=invalid-name
@@ -67,9 +89,20 @@ def lazy_import(pkg_name, from_pkg_name=None, hide_stderr=False):
         if hide_stderr:
             sys.stderr = stderr
 
+
+def _read_file(path):
+    """Read a model file, so that its read is profiled apart from its deserialization."""
+    with open(path, "rb") as model_file:
+        return model_file.read()
+
+
 class OnnxFrontend(Frontend):
     """ONNX frontend for OSTARC"""
 
+    def __init__(self):
+        # Report of the last graph simplification, see `simplify_onnx_model`.
+        self.simplify_report = None
+
     @staticmethod
     def name():
         return "onnx"
@@ -80,11 +113,141 @@ class OnnxFrontend(Frontend):
 
     def load(self, path, shape_dict=None, **kwargs):
         onnx = lazy_import("onnx")
+        mmap_external_data = kwargs.pop("mmap_external_data", False)
+        simplify = kwargs.pop("simplify", False)
+
+        if mmap_external_data:
+            return self._load_mmap_external_data(onnx, path, shape_dict, simplify, **kwargs)
+
+        with profile_stage("file_read"):
+            data = _read_file(path)
+        with profile_stage("deserialize"):
+            # pylint: disable=E1101
+            model = onnx.load_model_from_string(data)
+        del data
+        with profile_stage("file_read"):
+            onnx.external_data_helper.load_external_data_for_model(
+                model, os.path.dirname(os.path.abspath(path))
+            )
+
+        if simplify:
+            with profile_stage("simplify"):
+                self.simplify_report = simplify_onnx_model(onnx, model, shape_dict)
+
+        with profile_stage("convert"):
+            return relay.frontend.from_onnx(model, shape=shape_dict, **kwargs)
+
+    @staticmethod
+    def _map_external_initializers(onnx, initializers, base_dir):
+        """Memory-map the external data of the given initializers as NumPy arrays."""
+        if hasattr(onnx.helper, "tensor_dtype_to_np_dtype"):
+            to_np_dtype = onnx.helper.tensor_dtype_to_np_dtype
+        else:
+            to_np_dtype = lambda data_type: onnx.mapping.TENSOR_TYPE_TO_NP_TYPE[data_type]
+
+        mapped_files = {}
+        file_sizes = {}
+        arrays = {}
+        for init in initializers:
+            info = {entry.key: entry.value for entry in init.external_data}
+            location = os.path.join(base_dir, info["location"])
+            offset = int(info.get("offset", 0))
+            dtype = np.dtype(to_np_dtype(init.data_type)).newbyteorder("<")
+            count = int(np.prod(init.dims, dtype=np.int64))
+            nbytes = count * dtype.itemsize
+            if "length" in info and int(info["length"]) != nbytes:
+                raise OSTARCException(
+                    f"External data of initializer '{init.name}' has length {info['length']}, "
+                    f"expected {nbytes} bytes."
+                )
 
-        # pylint: disable=E1101
-        model = onnx.load(path)
+            if location not in file_sizes:
+                file_sizes[location] = os.path.getsize(location)
+            if offset < 0 or offset + nbytes > file_sizes[location]:
+                raise OSTARCImportError(
+                    f"External data of initializer '{init.name}' spans bytes {offset} to "
+                    f"{offset + nbytes} of {location}, which has {file_sizes[location]} bytes."
+                )
+            if nbytes == 0:
+                # Nothing to map, and empty files cannot be mapped.
+                arrays[init.name] = np.empty(tuple(init.dims), dtype=dtype)
+                continue
+
+            if location not in mapped_files:
+                with open(location, "rb") as data_file:
+                    # Private mapping: pages are shared with the page cache
+                    # until written, and the arrays stay writable.
+                    mapped_files[location] = mmap.mmap(
+                        data_file.fileno(), 0, access=mmap.ACCESS_COPY
+                    )
+            array = np.frombuffer(mapped_files[location], dtype=dtype, count=count, offset=offset)
+            arrays[init.name] = array.reshape(tuple(init.dims))
+        return arrays
 
-        return relay.frontend.from_onnx(model, shape=shape_dict, **kwargs)
+    def _load_mmap_external_data(self, onnx, path, shape_dict=None, simplify=False, **kwargs):
+        """Load a model whose external data is memory-mapped instead of read.
+
+        Initializers stored as external data are turned into graph inputs,
+        so that the converter does not copy them, and the params dict is
+        built from memory maps of the weight files.
+        """
+        with profile_stage("file_read"):
+            data = _read_file(path)
+        with profile_stage("deserialize"):
+            # pylint: disable=E1101
+            model = onnx.load_model_from_string(data)
+        del data
+        graph = model.graph
+
+        if simplify:
+            with profile_stage("simplify"):
+                self.simplify_report = simplify_onnx_model(onnx, model, shape_dict)
+
+        external = [
+            init
+            for init in graph.initializer
+            if init.data_location == onnx.TensorProto.EXTERNAL
+        ]
+        base_dir = os.path.dirname(os.path.abspath(path))
+        with profile_stage("file_read"):
+            arrays = self._map_external_initializers(onnx, external, base_dir)
+
+        inlined = [init for init in graph.initializer if init.name not in arrays]
+        del graph.initializer[:]
+        graph.initializer.extend(inlined)
+        input_names = {graph_input.name for graph_input in graph.input}
+        for init in external:
+            if init.name not in input_names:
+                graph.input.append(
+                    onnx.helper.make_tensor_value_info(init.name, init.data_type, list(init.dims))
+                )
+        logger.debug("memory-mapped %d external initializers", len(arrays))
+
+        freeze_params = kwargs.get("freeze_params", False)
+        with profile_stage("convert"):
+            mod, params = relay.frontend.from_onnx(model, shape=shape_dict, **kwargs)
+
+        with profile_stage("params"):
+            mapped_params = {name: ndarray_view(array) for name, array in arrays.items()}
+            if freeze_params:
+                mod["main"] = relay.build_module.bind_params_by_name(mod["main"], mapped_params)
+            else:
+                params.update(mapped_params)
+
+        return mod, params
+
+
+# Torch dtypes whose tensors can be handed to OSTAR through DLPack as they are.
+DLPACK_TORCH_DTYPES = [
+    "float16",
+    "float32",
+    "float64",
+    "int8",
+    "int16",
+    "int32",
+    "int64",
+    "uint8",
+]
 
 
 class PyTorchFrontend(Frontend):
@@ -101,20 +264,117 @@ class PyTorchFrontend(Frontend):
 
     def load(self, path, shape_dict=None, **kwargs):
         torch = lazy_import("torch")
+        zero_copy_params = kwargs.pop("zero_copy_params", True)
 
         if shape_dict is None:
             raise OSTARCException("--input-shapes must be specified for %s" % self.name())
 
-        traced_model = torch.jit.load(path)
+        with profile_stage("file_read"):
+            data = _read_file(path)
+        with profile_stage("deserialize"):
+            traced_model = torch.jit.load(io.BytesIO(data))
+        del data
         traced_model.eval()  # Switch to inference mode
 
         # Convert shape dictionary to list for Pytorch frontend compatibility
         input_shapes = list(shape_dict.items())
 
         logger.debug("parse Torch model and convert into Relay computation graph")
-        return relay.frontend.from_pytorch(
-            traced_model, input_shapes, keep_quantized_weight=True, **kwargs
-        )
+        with profile_stage("convert"):
+            mod, params = relay.frontend.from_pytorch(
+                traced_model, input_shapes, keep_quantized_weight=True, **kwargs
+            )
+
+        if zero_copy_params:
+            with profile_stage("params"):
+                self._share_torch_params(torch, traced_model, params)
+
+        return mod, params
+
+    @staticmethod
+    def _share_torch_params(torch, traced_model, params):
+        """Replace converted params by zero-copy DLPack views of the model weights.
+
+        Only contiguous CPU tensors of a dtype that round-trips through DLPack
+        are shared; any other param keeps the copy made by the converter.
+        Params are matched by name, so a param the converter renamed, or one
+        missing from the state dict, keeps its copy as well.
+
+        This only deduplicates the steady state: the converter has already
+        copied the weights, so the import peak still holds both copies, and
+        the converter copies are released once the params are swapped.
+        """
+        shared = 0
+        for name, tensor in traced_model.state_dict().items():
+            converted = params.get(name)
+            if converted is None:
+                continue
+            tensor = tensor.detach()
+            dtype = str(tensor.dtype).replace("torch.", "")
+            if (
+                tensor.device.type != "cpu"
+                or not tensor.is_contiguous()
+                or dtype not in DLPACK_TORCH_DTYPES
+                or dtype != converted.dtype
+                or tuple(tensor.shape) != tuple(converted.shape)
+            ):
+                continue
+            params[name] = ostar.nd.from_dlpack(torch.utils.dlpack.to_dlpack(tensor))
+            shared += 1
+        logger.debug("shared %d of %d params with the Torch model", shared, len(params))
+
+
+def _gen_params(ir_mod, skip_names=None, placeholder=None):
+    """Populate all the params of the module with random data.
+
+    When ``placeholder`` is "zeros" or "random", only the shape and dtype
+    of each param are recorded, as LazyParams that generate their data on
+    first use.
+    """
+    main_func = ir_mod["main"]
+    shape_dict = {p.name_hint: p.checked_type.concrete_shape for p in main_func.params}
+    type_dict = {p.name_hint: p.checked_type.dtype for p in main_func.params}
+    params = {}
+    for index, (name, shape) in enumerate(shape_dict.items()):
+        if skip_names and name in skip_names:
+            continue
+
+        if placeholder is not None:
+            data = LazyParam(shape, type_dict[name], fill=placeholder, seed=index)
+        elif "int" in type_dict[name]:
+            data = np.random.randint(128, size=shape, dtype=type_dict[name])
+        else:
+            data = np.random.uniform(-1, 1, size=shape).astype(type_dict[name])
+        params[name] = data
+    return params
+
+
+def _parse_relay_text(path):
+    """Read, validate and parse a Relay text file."""
+    with profile_stage("file_read"):
+        with open(path, "r", encoding="utf-8") as relay_text:
+            text = relay_text.read()
+
+    def _validate_text(text):
+        """Check the provided file contents.
+        The relay.txt artifact contained in the MLF is missing the version header and
+        the metadata which is required to use meta[relay.Constant]."""
+
+        if re.compile(r".*\#\[version\.*").match(text) is None:
+            raise OSTARCException(
+                "The relay model does not include the required version information."
+            )
+        if re.compile(r".*meta\[.+\].*", re.DOTALL).match(text):
+            if "#[metadata]" not in text:
+                raise OSTARCException(
+                    "The relay model does not include the required #[metadata] section. "
+                    "Use ir_mod.astext(show_meta_data=True) to export compatible code."
+                )
+
+    with profile_stage("convert"):
+        _validate_text(text)
+        return parser.fromtext(text)
+
 
 class RelayFrontend(Frontend):
     """Relay frontend for OSTARC"""
@@ -128,57 +388,128 @@ class RelayFrontend(Frontend):
         return ["relay"]
 
     def load(self, path, shape_dict=None, **kwargs):
-        with open(path, "r", encoding="utf-8") as relay_text:
-            text = relay_text.read()
+        placeholder_params = kwargs.pop("placeholder_params", None)
         if shape_dict is None:
             logger.warning(
                 "Specify --input-shapes to ensure that model inputs "
                 "will not be considered as constants."
             )
 
-        def _validate_text(text):
-            """Check the provided file contents.
-            The relay.txt artifact contained in the MLF is missing the version header and
-            the metadata which is required to use meta[relay.Constant]."""
-
-            if re.compile(r".*\#\[version\.*").match(text) is None:
-                raise OSTARCException(
-                    "The relay model does not include the required version information."
-                )
-            if re.compile(r".*meta\[.+\].*", re.DOTALL).match(text):
-                if "#[metadata]" not in text:
-                    raise OSTARCException(
-                        "The relay model does not include the required #[metadata] section. "
-                        "Use ir_mod.astext(show_meta_data=True) to export compatible code."
-                    )
-
-        _validate_text(text)
-
-        ir_mod = parser.fromtext(text)
+        ir_mod = _parse_relay_text(path)
 
         if shape_dict:
             input_names = shape_dict.keys()
         else:
             input_names = []
 
-        def _gen_params(ir_mod, skip_names=None):
-            """Populate the all the params in the mode with ones."""
-            main_func = ir_mod["main"]
-            shape_dict = {p.name_hint: p.checked_type.concrete_shape for p in main_func.params}
-            type_dict = {p.name_hint: p.checked_type.dtype for p in main_func.params}
-            params = {}
-            for name, shape in shape_dict.items():
-                if skip_names and name in skip_names:
-                    continue
-
-                if "int" in type_dict[name]:
-                    data = np.random.randint(128, size=shape, dtype=type_dict[name])
-                else:
-                    data = np.random.uniform(-1, 1, size=shape).astype(type_dict[name])
-                params[name] = data
-            return params
-
-        params = _gen_params(ir_mod, skip_names=input_names)
+        with profile_stage("params"):
+            params = _gen_params(ir_mod, skip_names=input_names, placeholder=placeholder_params)
+
+        return ir_mod, params
+
+
+# Binary Relay files start with this magic, followed by a header holding
+# the format version and the sizes of the module JSON and params sections.
+RELAY_BINARY_MAGIC = b"OSTARRLB"
+RELAY_BINARY_VERSION = 1
+_RELAY_BINARY_HEADER = struct.Struct("<8sIIQQ")
+
+
+def save_relay_binary(path, ir_mod, params=None):
+    """Save a Relay module, and optionally its params, in the binary Relay format.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file to write.
+    ir_mod : ostar.IRModule
+        The module to save. Metadata constants are saved along with it.
+    params : dict, optional
+        The parameters of the module.
+    """
+    mod_json = ostar.ir.save_json(ir_mod).encode("utf-8")
+    params_bytes = relay.save_param_dict(materialize_params(params)) if params else b""
+    header = _RELAY_BINARY_HEADER.pack(
+        RELAY_BINARY_MAGIC, RELAY_BINARY_VERSION, 0, len(mod_json), len(params_bytes)
+    )
+    with open(path, "wb") as binary_file:
+        binary_file.write(header)
+        binary_file.write(mod_json)
+        binary_file.write(params_bytes)
+
+
+def convert_relay_to_binary(path, output_path, params=None):
+    """Convert a Relay text file to the binary Relay format.
+
+    Parameters
+    ----------
+    path : str
+        The path to the Relay text file.
+    output_path : str
+        The path of the binary Relay file to write.
+    params : dict, optional
+        Parameters to store along with the module. When they are not
+        provided, the binary frontend generates them on load, the same
+        way the text frontend does.
+    """
+    save_relay_binary(output_path, _parse_relay_text(path), params)
+
+
+class RelayBinaryFrontend(Frontend):
+    """Binary Relay frontend for OSTARC
+
+    Loads modules saved by `save_relay_binary` or `convert_relay_to_binary`,
+    which store the module as serialized JSON instead of Relay text, so
+    loading does not go through the Relay parser. The JSON is still parsed
+    and InferType still runs, so the saving is the Relay text parse and the
+    params re-encode, not the whole load. The file is memory-mapped, and
+    the params are views of the mapping where their data is aligned, one
+    copy per param otherwise.
+    """
+
+    @staticmethod
+    def name():
+        return "relay-binary"
+
+    @staticmethod
+    def suffixes():
+        return ["relaybin"]
+
+    def load(self, path, shape_dict=None, **kwargs):
+        placeholder_params = kwargs.pop("placeholder_params", None)
+        size = os.path.getsize(path)
+        if size < _RELAY_BINARY_HEADER.size:
+            raise OSTARCException(f"'{path}' is not a binary Relay file.")
+        with profile_stage("file_read"):
+            # Private mapping, so that the params stay writable.
+            data = map_file_region(path, 0, size)
+
+        magic, version, _, json_size, params_size = _RELAY_BINARY_HEADER.unpack_from(data)
+        if magic != RELAY_BINARY_MAGIC:
+            raise OSTARCException(f"'{path}' is not a binary Relay file.")
+        if version != RELAY_BINARY_VERSION:
+            raise OSTARCException(
+                f"Unsupported binary Relay version {version}, expected {RELAY_BINARY_VERSION}."
+            )
+
+        json_start = _RELAY_BINARY_HEADER.size
+        params_start = json_start + json_size
+        if len(data) != params_start + params_size:
+            raise OSTARCException(f"The binary Relay file '{path}' is truncated.")
+
+        with profile_stage("deserialize"):
+            ir_mod = ostar.ir.load_json(bytes(data[json_start:params_start]).decode("utf-8"))
+            ir_mod = relay.transform.InferType()(ir_mod)
+
+        input_names = shape_dict.keys() if shape_dict else []
+        with profile_stage("params"):
+            if params_size:
+                stored = LazyParamDict(data, params_start)
+                params = {name: stored[name] for name in stored if name not in input_names}
+            else:
+                params = _gen_params(
+                    ir_mod, skip_names=input_names, placeholder=placeholder_params
+                )
 
         return ir_mod, params
 
@@ -187,6 +518,7 @@ ALL_FRONTENDS = [
     OnnxFrontend,
     PyTorchFrontend,
     RelayFrontend,
+    RelayBinaryFrontend,
 ]
 
 
@@ -262,6 +594,12 @@ def load_model(
     path: str,
     model_format: Optional[str] = None,
     shape_dict: Optional[Dict[str, List[int]]] = None,
+    cache_dir: Optional[str] = None,
+    cache_size: Optional[int] = None,
+    profile: bool = False,
+    profile_path: Optional[str] = None,
+    params_dtype: Optional[str] = None,
+    dedup_params: bool = False,
     **kwargs,
 ):
     """Load a model from a supported framework and convert it
@@ -275,7 +613,32 @@ def load_model(
         The underlying framework used to create the model.
         If not specified, this will be inferred from the file type.
     shape_dict : dict, optional
-        Mapping from input names to their shapes.
+        Mapping from input names to their shapes. Dimensions given as None
+        or as a negative number are imported as symbolic dimensions, and
+        `OSTARCModel.specialize` can then derive statically-shaped models
+        from the imported one.
+    cache_dir : str, optional
+        Directory of an import cache. When given, the imported model is
+        looked up there first, keyed on the model file contents, the frontend,
+        the shapes and the frontend options, and stored there on a miss.
+    cache_size : int, optional
+        Maximum size in bytes of the import cache. The least recently
+        used models are evicted when it is exceeded.
+    profile : bool, optional
+        Record the time and memory taken by each stage of the import
+        (file read, framework deserialization, graph conversion and params
+        materialization) in the ``import_profile`` attribute of the model.
+    profile_path : str, optional
+        Append the import profile to this JSON lines file. Implies ``profile``.
+    params_dtype : str, optional
+        Store the float32 params as "float16" or "bfloat16" from the import
+        on, with casts back to float32 inserted in the Relay graph. This
+        halves the params footprint in memory, in the saved model and in the
+        exported package.
+    dedup_params : bool, optional
+        Make params with identical contents, such as tied embeddings, share
+        a single entry of the params dict. The report of the deduplication
+        is kept in the ``dedup_report`` attribute of the model.
 
     Returns
     -------
@@ -289,6 +652,240 @@ def load_model(
     else:
         frontend = guess_frontend(path)
 
-    mod, params = frontend.load(path, shape_dict, **kwargs)
+    import_profile = None
+    if profile or profile_path is not None:
+        import_profile = ImportProfile(path, frontend.name())
+
+    with profile_import(import_profile):
+        ostarc_model = _load_model(
+            frontend, path, shape_dict, cache_dir, cache_size, params_dtype, dedup_params, **kwargs
+        )
+
+    if import_profile is not None:
+        ostarc_model.import_profile = import_profile
+        logger.info("%s", import_profile)
+        if profile_path is not None:
+            import_profile.dump(profile_path)
+
+    return ostarc_model
+
+
+def _symbolic_shape_dict(shape_dict):
+    """Replace the None or negative dimensions of the shapes by relay.Any()."""
+    if shape_dict is None:
+        return None
+    return {
+        name: [
+            relay.Any() if dim is None or (isinstance(dim, numbers.Integral) and dim < 0) else dim
+            for dim in shape
+        ]
+        for name, shape in shape_dict.items()
+    }
+
+
+def _load_model(
+    frontend, path, shape_dict, cache_dir, cache_size, params_dtype, dedup_params, **kwargs
+):
+    cache = None
+    if cache_dir is not None:
+        cache = ImportCache(cache_dir, cache_size)
+        with profile_stage("cache_lookup"):
+            cache_key = ImportCache.key(
+                path,
+                frontend.name(),
+                shape_dict,
+                params_dtype=params_dtype,
+                dedup_params=dedup_params,
+                **kwargs,
+            )
+            ostarc_model = cache.get(cache_key)
+        if ostarc_model is not None:
+            logger.info("loaded %s from the import cache", path)
+            return ostarc_model
+
+    mod, params = frontend.load(path, _symbolic_shape_dict(shape_dict), **kwargs)
+    dedup_report = None
+    if dedup_params:
+        with profile_stage("params"):
+            mod, dedup_report = dedup_params_by_content(mod, params)
+    if params_dtype is not None:
+        with profile_stage("params"):
+            mod = cast_params_storage(mod, params, params_dtype)
+    ostarc_model = OSTARCModel(mod, params)
+    ostarc_model.dedup_report = dedup_report
+    ostarc_model.simplify_report = getattr(frontend, "simplify_report", None)
+
+    if cache is not None:
+        with profile_stage("cache_store"):
+            cache.put(cache_key, ostarc_model)
+
+    return ostarc_model
+
+
+# Result of a single job of `load_model_batch`. `model` is an OSTARCModel,
+# or the path to the saved model when an output directory is used, and
+# `error` holds the exception raised by a failed job.
+BatchImportResult = namedtuple("BatchImportResult", ["path", "model", "error"])
+
+
+def _init_batch_worker(memory_limit):
+    if memory_limit is not None:
+        import resource  # pylint: disable=import-outside-toplevel
+
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _running_marker(output_path):
+    """Path of the file marking a batch job as running in a worker."""
+    return output_path + ".running"
+
+
+def _run_batch_job(job, output_path, kwargs):
+    # The marker outlives the job only if its worker dies while running it.
+    marker = _running_marker(output_path)
+    open(marker, "w").close()
+    try:
+        path, model_format, shape_dict = job
+        ostarc_model = load_model(path, model_format, shape_dict, **kwargs)
+        ostarc_model.save(output_path)
+    finally:
+        os.remove(marker)
+    return output_path
+
+
+def _run_batch_jobs(jobs, output_paths, num_workers, memory_limit, kwargs):
+    """Run the jobs in a process pool, returning a result or an error per job."""
+    outcomes = [None] * len(jobs)
+    for output_path in output_paths:
+        if os.path.exists(_running_marker(output_path)):
+            os.remove(_running_marker(output_path))
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_batch_worker,
+        initargs=(memory_limit,),
+    ) as executor:
+        futures = {
+            executor.submit(_run_batch_job, jobs[index], output_paths[index], kwargs): index
+            for index in range(len(jobs))
+        }
+        for future in as_completed(futures):
+            try:
+                outcomes[futures[future]] = (future.result(), None)
+            except Exception as error:  # pylint: disable=broad-except
+                outcomes[futures[future]] = (None, error)
+    return outcomes
+
+
+def _batch_job(index, job):
+    """Check a job of `load_model_batch` and pad it to (path, model_format, shape_dict)."""
+    if (
+        isinstance(job, (str, bytes))
+        or not isinstance(job, Sequence)
+        or not 1 <= len(job) <= 3
+        or not isinstance(job[0], (str, os.PathLike))
+    ):
+        raise OSTARCException(
+            f"Invalid job {index}: {job!r}. Jobs are (path, model_format, shape_dict) "
+            "tuples, whose model format and shapes can be omitted."
+        )
+    return tuple(job) + (None,) * (3 - len(job))
+
 
-    return OSTARCModel(mod, params)
+def load_model_batch(
+    jobs,
+    num_workers: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+    output_dir: Optional[str] = None,
+    **kwargs,
+):
+    """Load many models in parallel, using a pool of worker processes.
+
+    A failing job does not abort the batch, its error is reported in the
+    corresponding result instead. A job whose worker process dies (e.g.
+    killed for exceeding ``memory_limit``) is reported with an
+    OSTARCException, and the other jobs are rerun.
+
+    Parameters
+    ----------
+    jobs : list of tuple
+        The models to load, as (path, model_format, shape_dict) tuples.
+        The model format and shapes can be omitted or None.
+    num_workers : int, optional
+        The number of worker processes. Defaults to the number of CPUs.
+    memory_limit : int, optional
+        Maximum address space of each worker process, in bytes.
+    output_dir : str, optional
+        When given, each model is saved there as model_<index>.tar and the
+        results hold the paths of these files instead of the loaded models.
+    kwargs : dict
+        Options passed to `load_model` for every job.
+
+    Returns
+    -------
+    results : list of BatchImportResult
+        The result of each job, in the order of ``jobs``.
+    """
+    jobs = [_batch_job(index, job) for index, job in enumerate(jobs)]
+    temp = None
+    if output_dir is None:
+        temp = utils.tempdir()
+        output_dir = temp.temp_dir
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+    output_paths = [os.path.join(output_dir, f"model_{index}.tar") for index in range(len(jobs))]
+
+    outcomes = [None] * len(jobs)
+    pending = list(range(len(jobs)))
+    pool_size = num_workers
+    # A worker that dies (e.g. killed for running out of memory) breaks the
+    # whole pool, failing every pending job. The jobs still marked as running
+    # are the ones whose workers died: when there is a single one, it killed
+    # its worker and is reported as failed, and the other jobs are rerun
+    # together in a new pool. When there are several, they are rerun in a
+    # pool of one worker, so that the next crash identifies its job.
+    while pending:
+        batch_outcomes = _run_batch_jobs(
+            [jobs[index] for index in pending],
+            [output_paths[index] for index in pending],
+            pool_size,
+            memory_limit,
+            kwargs,
+        )
+        crashed = []
+        for index, outcome in zip(pending, batch_outcomes):
+            outcomes[index] = outcome
+            if isinstance(outcome[1], BrokenProcessPool):
+                crashed.append(index)
+        running = [
+            index for index in crashed if os.path.exists(_running_marker(output_paths[index]))
+        ]
+        if not running:
+            # The pool broke without running any job, e.g. a worker failed
+            # to start: report the error for every crashed job.
+            break
+        if len(running) == 1:
+            index = running[0]
+            error = OSTARCException(
+                f"The worker process died while loading {jobs[index][0]}, "
+                "e.g. killed for exceeding the memory limit."
+            )
+            error.__cause__ = outcomes[index][1]
+            outcomes[index] = (None, error)
+            os.remove(_running_marker(output_paths[index]))
+            crashed.remove(index)
+            pool_size = num_workers
+        else:
+            pool_size = 1
+        pending = crashed
+
+    results = []
+    for job, (model_path, error) in zip(jobs, outcomes):
+        if error is not None:
+            logger.warning("failed to load %s: %s", job[0], error)
+            results.append(BatchImportResult(job[0], None, error))
+        elif temp is not None:
+            results.append(BatchImportResult(job[0], OSTARCModel(model_path=model_path), None))
+        else:
+            results.append(BatchImportResult(job[0], model_path, None))
+    return results
@@ -0,0 +1,325 @@
+"""
+Detection of the host CPU, to compile for the machine running OSTARC.
+"""
+import functools
+import glob
+import logging
+import os
+import platform
+import sys
+from typing import Dict, FrozenSet, Optional
+
+
+# pylint: disable=invalid-name
+logger = logging.getLogger("OSTARC")
+
+# Name of the target resolved to a fully specified llvm target for the host.
+NATIVE_TARGET = "native"
+
+# /proc/cpuinfo x86 flags and the LLVM features they enable.
+X86_FEATURES = {
+    "sse4_1": "sse4.1",
+    "sse4_2": "sse4.2",
+    "ssse3": "ssse3",
+    "popcnt": "popcnt",
+    "avx": "avx",
+    "avx2": "avx2",
+    "fma": "fma",
+    "f16c": "f16c",
+    "bmi1": "bmi",
+    "bmi2": "bmi2",
+    "avx_vnni": "avxvnni",
+    "avx512f": "avx512f",
+    "avx512cd": "avx512cd",
+    "avx512bw": "avx512bw",
+    "avx512dq": "avx512dq",
+    "avx512vl": "avx512vl",
+    "avx512_vnni": "avx512vnni",
+    "avx512_bf16": "avx512bf16",
+    "avx512_fp16": "avx512fp16",
+    "avx512_vbmi": "avx512vbmi",
+    "avx512_vbmi2": "avx512vbmi2",
+    "amx_tile": "amx-tile",
+    "amx_int8": "amx-int8",
+    "amx_bf16": "amx-bf16",
+}
+
+# /proc/cpuinfo AArch64 features and the LLVM features they enable.
+AARCH64_FEATURES = {
+    "asimd": "neon",
+    "asimddp": "dotprod",
+    "asimdhp": "fullfp16",
+    "i8mm": "i8mm",
+    "bf16": "bf16",
+    "sve": "sve",
+    "sve2": "sve2",
+}
+
+# Implementer code of the CPUs designed by Arm.
+ARM_IMPLEMENTER = 0x41
+
+# Arm CPU part numbers and their LLVM CPU names. Part numbers are only
+# meaningful together with their implementer.
+ARM_CPU_PARTS = {
+    0xD08: "cortex-a72",
+    0xD0B: "cortex-a76",
+    0xD0C: "neoverse-n1",
+    0xD40: "neoverse-v1",
+    0xD49: "neoverse-n2",
+    0xD4F: "neoverse-v2",
+}
+
+# The newest Intel AVX-512 CPUs first, each with a flag it introduced.
+INTEL_AVX512_CPUS = [
+    ("sapphirerapids", "amx_tile"),
+    ("icelake-server", "avx512_vbmi2"),
+    ("cooperlake", "avx512_bf16"),
+    ("cascadelake", "avx512_vnni"),
+    ("skylake-avx512", "avx512f"),
+]
+
+
+class HostCPUInfo(object):
+    """Description of the host CPU.
+
+    Attributes
+    ----------
+    arch : str
+        The machine architecture, e.g. "x86_64" or "aarch64".
+    vendor : str or None
+        The CPU vendor, e.g. "GenuineIntel" or "AuthenticAMD".
+    model_name : str or None
+        The marketing name of the CPU.
+    family, model : int or None
+        The CPU family and model numbers, or the Arm implementer and part.
+    flags : frozenset of str
+        The ISA features reported by the kernel.
+    num_cores : int
+        The number of physical cores, at most the number of CPUs the
+        process may run on.
+    num_threads : int
+        The number of logical CPUs.
+    caches : dict
+        The size in bytes of each cache of the first CPU, e.g. "L1d", "L2".
+    """
+
+    def __init__(
+        self,
+        arch: str,
+        vendor: Optional[str] = None,
+        model_name: Optional[str] = None,
+        family: Optional[int] = None,
+        model: Optional[int] = None,
+        flags: FrozenSet[str] = frozenset(),
+        num_cores: int = 1,
+        num_threads: int = 1,
+        caches: Optional[Dict[str, int]] = None,
+    ):
+        self.arch = arch
+        self.vendor = vendor
+        self.model_name = model_name
+        self.family = family
+        self.model = model
+        self.flags = frozenset(flags)
+        self.num_cores = num_cores
+        self.num_threads = num_threads
+        self.caches = caches or {}
+
+    @property
+    def mcpu(self):
+        """The LLVM CPU name of the host, or None if it is not known."""
+        if self.arch in ("x86_64", "AMD64"):
+            if self.vendor == "GenuineIntel":
+                for cpu, flag in INTEL_AVX512_CPUS:
+                    if flag in self.flags:
+                        return cpu
+                if "avx2" in self.flags:
+                    return "skylake" if "clflushopt" in self.flags else "haswell"
+            elif self.vendor == "AuthenticAMD" and self.family is not None:
+                return _amd_mcpu(self.family, self.model or 0)
+            return "x86-64-v3" if {"avx2", "fma", "bmi2"} <= self.flags else "x86-64"
+        if self.arch in ("aarch64", "arm64"):
+            if self.family == ARM_IMPLEMENTER:
+                return ARM_CPU_PARTS.get(self.model, "generic")
+            return "generic"
+        return None
+
+    @property
+    def mattr(self):
+        """The LLVM features of the host, as a list of "+feature" and "-feature".
+
+        The CPU named by `mcpu` implies its own features, but a hypervisor
+        may hide some of them from the guest, e.g. AVX-512 on a Zen 4 host.
+        Known features missing from the flags are thus disabled explicitly,
+        so the generated code does not use them.
+        """
+        if self.arch in ("x86_64", "AMD64"):
+            features = X86_FEATURES
+        elif self.arch in ("aarch64", "arm64"):
+            features = AARCH64_FEATURES
+        else:
+            return []
+        if not self.flags:
+            return []
+        return [
+            f"+{feature}" if flag in self.flags else f"-{feature}"
+            for flag, feature in features.items()
+        ]
+
+    def target_options(self):
+        """Get the llvm target options matching the host."""
+        options = {}
+        if self.arch in ("aarch64", "arm64") and sys.platform.startswith("linux"):
+            options["mtriple"] = "aarch64-linux-gnu"
+        if self.mcpu is not None:
+            options["mcpu"] = self.mcpu
+        if self.mattr:
+            options["mattr"] = ",".join(self.mattr)
+        options["num-cores"] = str(self.num_cores)
+        return options
+
+    def target_string(self):
+        """Get a fully specified llvm target string for the host."""
+        options = " ".join(f"-{key}={value}" for key, value in self.target_options().items())
+        return f"llvm {options}"
+
+    def __str__(self):
+        lines = [
+            f"Host CPU: {self.model_name or 'unknown'} ({self.arch})",
+            f"  vendor      {self.vendor or 'unknown'}",
+            f"  family      {self.family}, model {self.model}",
+            f"  cores       {self.num_cores} ({self.num_threads} threads)",
+        ]
+        for name, size in sorted(self.caches.items()):
+            lines.append(f"  {name:<11} {size // 1024} KiB")
+        lines.append(f"  target      {self.target_string()}")
+        return "\n".join(lines)
+
+
+def _amd_mcpu(family, model):
+    """Map an AMD family and model to a Zen generation."""
+    if family == 0x17:
+        return "znver1" if model < 0x30 else "znver2"
+    if family == 0x19:
+        if 0x10 <= model <= 0x1F or 0x60 <= model <= 0x7F or 0xA0 <= model <= 0xAF:
+            return "znver4"
+        return "znver3"
+    if family == 0x1A:
+        return "znver5"
+    return "x86-64"
+
+
+def _parse_cpuinfo(text):
+    """Parse /proc/cpuinfo into one dict per logical CPU."""
+    processors = []
+    current = {}
+    for line in text.splitlines():
+        if not line.strip():
+            if current:
+                processors.append(current)
+                current = {}
+            continue
+        key, _, value = line.partition(":")
+        current[key.strip()] = value.strip()
+    if current:
+        processors.append(current)
+    return processors
+
+
+def _parse_size(text):
+    """Parse a sysfs cache size, e.g. "32K" or "1M", into bytes."""
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3}
+    text = text.strip()
+    if text and text[-1] in units:
+        return int(text[:-1]) * units[text[-1]]
+    return int(text)
+
+
+def _read_caches(sysfs_cpu="/sys/devices/system/cpu/cpu0"):
+    caches = {}
+    for index in sorted(glob.glob(os.path.join(sysfs_cpu, "cache", "index*"))):
+        try:
+            with open(os.path.join(index, "level")) as level_file:
+                level = level_file.read().strip()
+            with open(os.path.join(index, "type")) as type_file:
+                cache_type = type_file.read().strip()
+            with open(os.path.join(index, "size")) as size_file:
+                size = _parse_size(size_file.read())
+        except (OSError, ValueError):
+            continue
+        suffix = {"Data": "d", "Instruction": "i"}.get(cache_type, "")
+        caches[f"L{level}{suffix}"] = size
+    return caches
+
+
+def _available_cpus():
+    """The number of CPUs the process may run on, or None if it is not known."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return None
+
+
+def _int(value, base=10):
+    try:
+        return int(value, base)
+    except (TypeError, ValueError):
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def detect_host_cpu():
+    """Detect the host CPU from /proc/cpuinfo and sysfs.
+
+    The result is cached for the lifetime of the process. On systems
+    without /proc/cpuinfo, only the architecture and the number of CPUs
+    are detected.
+
+    Returns
+    -------
+    info : HostCPUInfo
+        The description of the host CPU.
+    """
+    arch = platform.machine()
+    num_threads = _available_cpus() or os.cpu_count() or 1
+    try:
+        with open("/proc/cpuinfo") as cpuinfo_file:
+            processors = _parse_cpuinfo(cpuinfo_file.read())
+    except OSError:
+        processors = []
+    if not processors:
+        logger.debug("could not read /proc/cpuinfo, detected %s with %d CPUs", arch, num_threads)
+        return HostCPUInfo(arch, num_cores=num_threads, num_threads=num_threads)
+
+    first = processors[0]
+    if "flags" in first:
+        # x86
+        vendor = first.get("vendor_id")
+        family = _int(first.get("cpu family"))
+        model = _int(first.get("model"))
+        flags = first["flags"].split()
+        core_ids = {(cpu.get("physical id"), cpu.get("core id")) for cpu in processors}
+        num_cores = len(core_ids) if (None, None) not in core_ids else len(processors)
+    else:
+        # AArch64 reports an implementer and a part number instead.
+        vendor = first.get("CPU implementer")
+        family = _int(first.get("CPU implementer"), 16)
+        model = _int(first.get("CPU part"), 16)
+        flags = first.get("Features", "").split()
+        num_cores = len(processors)
+    available = _available_cpus()
+    if available is not None:
+        num_cores = min(num_cores, available)
+
+    info = HostCPUInfo(
+        arch,
+        vendor=vendor,
+        model_name=first.get("model name"),
+        family=family,
+        model=model,
+        flags=frozenset(flags),
+        num_cores=num_cores,
+        num_threads=len(processors),
+        caches=_read_caches(),
+    )
+    logger.debug("detected host CPU: %s", info.target_string())
+    return info
@@ -0,0 +1,258 @@
+"""
+Streaming latency distribution of repeated runs.
+"""
+import json
+import logging
+import math
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+# pylint: disable=invalid-name
+logger = logging.getLogger("OSTARC")
+
+DEFAULT_PERCENTILES = [50, 90, 99, 99.9]
+
+# Robust z-score scale making the MAD a consistent estimator of the std.
+_MAD_SCALE = 1.4826
+
+# Below this many samples, the blocks of the warmup window are too small
+# for their medians to tell warmup from noise, so nothing is trimmed.
+MIN_WARMUP_SAMPLES = 40
+
+
+class LatencyDistribution(object):
+    """Latency distribution of repeated runs, collected in constant memory.
+
+    Samples are recorded in a log-linear histogram, in the style of HDR
+    histograms: values keep ``significant_bits + 1`` significant bits, so
+    percentiles are exact to about ``2 ** -significant_bits`` relative
+    error, and the number of buckets grows with the logarithm of the range.
+    The mean and standard deviation are updated with Welford's algorithm.
+
+    The first ``warmup_window`` samples are buffered to detect the warmup
+    phase: the window is split in blocks, and the samples preceding the
+    first block whose median is within tolerance of the steady-state median
+    (that of the second half of the window) are trimmed. The steady-state
+    median and MAD are then used to flag outliers, the samples whose robust
+    z-score exceeds ``outlier_threshold``. Nothing is trimmed from fewer
+    than `MIN_WARMUP_SAMPLES` samples.
+
+    Parameters
+    ----------
+    significant_bits : int, optional
+        The precision of the histogram.
+    warmup_window : int, optional
+        The number of samples buffered for warmup detection. 0 disables it,
+        together with outlier detection.
+    outlier_threshold : float, optional
+        The robust z-score above which a sample is flagged as an outlier.
+    max_outliers : int, optional
+        The maximum number of outliers whose iteration and value are kept.
+    sample_name : str, optional
+        What a sample measures, e.g. "run", or "repeat" for samples that are
+        each the mean of several runs. Used to label the percentiles.
+    """
+
+    def __init__(
+        self,
+        significant_bits: int = 7,
+        warmup_window: int = 1000,
+        outlier_threshold: float = 5.0,
+        max_outliers: int = 100,
+        sample_name: str = "run",
+    ):
+        self.significant_bits = significant_bits
+        self.warmup_window = warmup_window
+        self.outlier_threshold = outlier_threshold
+        self.max_outliers = max_outliers
+        self.sample_name = sample_name
+        self.buckets = {}
+        self.count = 0
+        self.warmup_count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.outliers = []
+        self.num_outliers = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._iterations = 0
+        self._window = []
+        self._outlier_limit = None
+
+    @classmethod
+    def from_samples(cls, samples: Iterable[float], **kwargs):
+        """Build a distribution from latencies, in seconds."""
+        distribution = cls(**kwargs)
+        distribution.record_many(samples)
+        return distribution.finalize()
+
+    def _bucket_index(self, nanoseconds):
+        shift = max(0, nanoseconds.bit_length() - self.significant_bits - 1)
+        return (shift << self.significant_bits) + (nanoseconds >> shift)
+
+    def _bucket_bounds(self, index):
+        """The lower bound and width of a bucket, in nanoseconds."""
+        shift = max(0, (index >> self.significant_bits) - 1)
+        return (index - (shift << self.significant_bits)) << shift, 1 << shift
+
+    def record(self, seconds: float):
+        """Record the latency of a run, in seconds."""
+        self._iterations += 1
+        if self._outlier_limit is None and len(self._window) < self.warmup_window:
+            self._window.append(seconds)
+            if len(self._window) == self.warmup_window:
+                self._end_warmup()
+            return
+        self._add(seconds, self._iterations - 1)
+
+    def record_many(self, samples: Iterable[float]):
+        """Record the latencies of several runs, in seconds."""
+        for seconds in samples:
+            self.record(seconds)
+
+    def _end_warmup(self):
+        """Trim the warmup phase from the buffered window and record the rest."""
+        window = np.asarray(self._window, dtype="float64")
+        self._window = []
+        if window.size == 0:
+            return
+        steady = window[window.size // 2 :]
+        median = float(np.median(steady))
+        mad = float(np.median(np.abs(steady - median))) * _MAD_SCALE
+        tolerance = max(3 * mad, 0.05 * median)
+        block_size = max(1, window.size // 20)
+        start = 0
+        if window.size >= MIN_WARMUP_SAMPLES:
+            for start in range(0, window.size, block_size):
+                if np.median(window[start : start + block_size]) <= median + tolerance:
+                    break
+            else:
+                start = 0
+        self.warmup_count = start
+        self._outlier_limit = median + self.outlier_threshold * max(mad, 1e-3 * median)
+        if start:
+            logger.debug("trimmed %d warmup samples", start)
+        for iteration in range(start, window.size):
+            self._add(float(window[iteration]), iteration)
+
+    def _add(self, seconds, iteration):
+        nanoseconds = max(0, int(round(seconds * 1e9)))
+        index = self._bucket_index(nanoseconds)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        delta = seconds - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (seconds - self._mean)
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        if self._outlier_limit is not None and seconds > self._outlier_limit:
+            self.num_outliers += 1
+            if len(self.outliers) < self.max_outliers:
+                self.outliers.append((iteration, seconds))
+
+    def finalize(self):
+        """Process the samples still buffered for warmup detection.
+
+        Called implicitly by the statistics, so recording can resume after.
+        """
+        if self._outlier_limit is None and self._window:
+            self._end_warmup()
+        return self
+
+    @property
+    def mean(self):
+        self.finalize()
+        return self._mean if self.count else math.nan
+
+    @property
+    def std(self):
+        self.finalize()
+        return math.sqrt(self._m2 / self.count) if self.count else math.nan
+
+    def percentile(self, percent: float):
+        """Get a percentile of the latencies, in seconds.
+
+        Parameters
+        ----------
+        percent : float
+            The percentile, between 0 and 100.
+        """
+        self.finalize()
+        if not self.count:
+            return math.nan
+        rank = max(1, math.ceil(percent / 100 * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                low, width = self._bucket_bounds(index)
+                value = (low + (width - 1) / 2) / 1e9
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def histogram(self):
+        """Get the non-empty buckets of the histogram.
+
+        Returns
+        -------
+        buckets : list of tuple
+            The (lower bound, upper bound, count) of each bucket, with the
+            bounds in seconds.
+        """
+        self.finalize()
+        result = []
+        for index in sorted(self.buckets):
+            low, width = self._bucket_bounds(index)
+            result.append((low / 1e9, (low + width) / 1e9, self.buckets[index]))
+        return result
+
+    def to_dict(self, percentiles: Optional[Iterable[float]] = None):
+        """Get the distribution as a dict, with latencies in seconds."""
+        percentiles = DEFAULT_PERCENTILES if percentiles is None else percentiles
+        self.finalize()
+        return {
+            "sample": self.sample_name,
+            "count": self.count,
+            "warmup_count": self.warmup_count,
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "percentiles": {f"p{percent:g}": self.percentile(percent) for percent in percentiles},
+            "num_outliers": self.num_outliers,
+            "outliers": [
+                {"iteration": iteration, "latency": seconds}
+                for iteration, seconds in self.outliers
+            ],
+            "histogram": [list(bucket) for bucket in self.histogram()],
+        }
+
+    def to_json(self, path: Optional[str] = None):
+        """Export the distribution as JSON, to a file if ``path`` is given."""
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, "w") as json_file:
+                json_file.write(text)
+        return text
+
+    def format_percentiles(self, percentiles: Optional[Iterable[float]] = None):
+        """Format the percentiles as a small table, in milliseconds.
+
+        .. code-block::
+            Latency percentiles per run (warmup: 12 trimmed, outliers: 3):
+            p50 (ms)   p90 (ms)   p99 (ms)   p99.9 (ms)
+            0.14310    0.15102    0.16020    0.16161
+        """
+        percentiles = DEFAULT_PERCENTILES if percentiles is None else percentiles
+        self.finalize()
+        header = "   ".join(f"{f'p{percent:g} (ms)':<10}" for percent in percentiles)
+        values = "   ".join(f"{self.percentile(percent) * 1000:<10.5f}" for percent in percentiles)
+        return (
+            f"Latency percentiles per {self.sample_name} (warmup: {self.warmup_count} trimmed, "
+            f"outliers: {self.num_outliers}):\n{header}\n{values}"
+        )
+
+    def __str__(self):
+        return self.format_percentiles()
@@ -1,7 +1,9 @@
+import io
+import logging
 import os
 import tarfile
 import json
-from typing import Optional, Union, Dict, Callable, TextIO
+from typing import Optional, Union, Dict, Callable, List, TextIO
 from pathlib import Path
 import numpy as np
 
@@ -10,23 +12,78 @@ import ostar.contrib.cc
 from ostar import relay
 from ostar.contrib import utils
 from ostar.driver.ostarc import OSTARCException
+from ostar.driver.ostarc.archive import (
+    add_member,
+    extract_member,
+    is_compressed,
+    manifest_member,
+    open_archive,
+    open_archive_writer,
+    read_manifest,
+    read_member,
+    verify_package,
+    write_package,
+)
+from ostar.driver.ostarc.latency import LatencyDistribution
+from ostar.driver.ostarc.output_store import OutputStore
+from ostar.driver.ostarc.param_io import (
+    DEFAULT_ALIGNMENT,
+    INDEXED_PARAMS_MAGIC,
+    PARAMS_FORMATS,
+    IndexedParamsReader,
+    IndexedParamsStream,
+    LazyParamDict,
+    ParamArena,
+    is_indexed_params,
+    map_file_region,
+    load_params,
+    numpy_view,
+    param_dict_reader,
+    param_names_header,
+    params_to_bytes,
+    parse_param_dict,
+    save_indexed_params,
+    tensor_digest,
+)
+from ostar.driver.ostarc.params import (
+    LazyParam,
+    materialize_params,
+    rebind_main,
+    split_lazy_params,
+    storage_param_names,
+)
+from ostar.driver.ostarc.summary import summarize_model
 from ostar.relay.backend.executor_factory import GraphExecutorFactoryModule
 from ostar.runtime.module import BenchmarkResult
 from ostar.runtime.vm import Executable
 
 
+# pylint: disable=invalid-name
+logger = logging.getLogger("OSTARC")
+
 try:
     from ostar.micro import export_model_library_format
 except ImportError:
     export_model_library_format = None
 
 
+# Member of a saved model describing its LazyParam placeholders.
+PLACEHOLDERS_NAME = "placeholders.json"
+
+# Member of a saved model holding the reports of its import, and the
+# attributes of the model they are kept in.
+REPORTS_NAME = "reports.json"
+REPORT_ATTRS = ["dedup_report", "simplify_report"]
+
+
 class OSTARCModel(object):
     def __init__(
         self,
         mod: Optional[ostar.IRModule] = None,
         params: Optional[Dict[str, ostar.nd.NDArray]] = None,
         model_path: Optional[str] = None,
+        lazy: bool = False,
+        packed: bool = False,
     ):
         if (mod is None or params is None) and (model_path is None):
             raise OSTARCException(
@@ -34,42 +91,142 @@ class OSTARCModel(object):
                 "or a path to a previously saved OSTARCModel"
             )
         self._tmp_dir = utils.tempdir()
+        self._pending_members = {}
+        self.import_profile = None
+        self.dedup_report = None
+        self.simplify_report = None
         if model_path is not None:
-            self.load(model_path)
+            self.load(model_path, lazy, packed)
         else:
             self.mod = mod
             self.params = params if params else {}
 
-    def save(self, model_path: str):
-        temp = self._tmp_dir
+    def save(
+        self,
+        model_path: str,
+        compression: Optional[str] = None,
+        compression_threads: Optional[int] = None,
+        params_format: str = "legacy",
+        shard_size: Optional[int] = None,
+    ):
+        """Save the model, and its tuning records and package if they exist, to a tar file.
+
+        The members are streamed straight into the archive: the params are
+        serialized one tensor at a time instead of as a single blob. The
+        import reports (``dedup_report`` and ``simplify_report``) are saved
+        as well, so models served from the import cache keep them. The
+        archive replaces ``model_path`` once complete, so a model can be
+        saved over the archive it was lazily loaded from.
+
+        Parameters
+        ----------
+        model_path : str
+            The path of the archive to write.
+        compression : str, optional
+            None for a plain tar, "gzip" or "zstd" for a compressed archive.
+            Compression runs in a pool of threads.
+        compression_threads : int, optional
+            The number of compression threads. Defaults to the number of CPUs.
+        params_format : str, optional
+            "legacy" to save the params as a relay.save_param_dict blob, or
+            "indexed" to save them as an indexed container, which supports
+            reading single tensors and memory mapping.
+        shard_size : int, optional
+            With the indexed format, split the params into shards of at most
+            this many bytes, saved as model.params, model.params.1, ...
+        """
+        if params_format not in PARAMS_FORMATS:
+            raise OSTARCException(
+                f"Unsupported params format '{params_format}'. Choose from: {PARAMS_FORMATS}"
+            )
+
+        # Write next to the destination and move the archive into place, so
+        # that saving over the archive of a lazy load does not truncate the
+        # file its params are mapped from.
+        tmp_path = f"{model_path}.{os.getpid()}.tmp"
+        try:
+            with open_archive_writer(tmp_path, compression, compression_threads) as tar:
+                # Save relay graph
+                mod_json = ostar.ir.save_json(self.mod).encode("utf-8")
+                add_member(tar, "model.json", io.BytesIO(mod_json), len(mod_json))
+
+                # Save params. LazyParam placeholders are saved as their
+                # description, so that they are not materialized.
+                params, placeholders = split_lazy_params(self.params)
+                if placeholders:
+                    placeholders_json = json.dumps(
+                        {name: value.to_dict() for name, value in placeholders.items()}
+                    ).encode("utf-8")
+                    add_member(
+                        tar,
+                        PLACEHOLDERS_NAME,
+                        io.BytesIO(placeholders_json),
+                        len(placeholders_json),
+                    )
+                reports = {
+                    attr: getattr(self, attr)
+                    for attr in REPORT_ATTRS
+                    if getattr(self, attr) is not None
+                }
+                if reports:
+                    reports_json = json.dumps(reports).encode("utf-8")
+                    add_member(tar, REPORTS_NAME, io.BytesIO(reports_json), len(reports_json))
+                packed = isinstance(params, ParamArena) and not shard_size
+                if params_format == "indexed" and packed:
+                    add_member(tar, "model.params", params.reader(), params.nbytes)
+                elif params_format == "indexed":
+                    stream = IndexedParamsStream(params, "model.params", shard_size)
+                    for shard, shard_size_bytes in enumerate(stream.shard_sizes):
+                        add_member(
+                            tar,
+                            stream.index["shards"][shard],
+                            stream.reader(shard),
+                            shard_size_bytes,
+                        )
+                else:
+                    params_reader, params_size = param_dict_reader(params)
+                    add_member(tar, "model.params", params_reader, params_size)
+
+                # If default tuning records exist, save them as well.
+                if os.path.exists(self.default_tuning_records_path()):
+                    tar.add(self.default_tuning_records_path(), "tuning_records")
+                # Also save the compiled package if it can be found.
+                if os.path.exists(self.default_package_path()):
+                    tar.add(self.default_package_path(), "model_package.tar")
+            os.replace(tmp_path, model_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self, model_path: str, lazy: bool = False, packed: bool = False):
+        """Load a model saved with `save`.
+
+        Parameters
+        ----------
+        model_path : str
+            The path to the saved model.
+        lazy : bool, optional
+            Read the members in place instead of extracting the archive,
+            which must be an uncompressed tar. The params are memory-mapped
+            and their NDArrays are only created on first access, sharing the
+            mapped memory. The tuning records and the compiled package are
+            only extracted when their paths are requested.
+        packed : bool, optional
+            Load params saved in the unsharded indexed format as a
+            `ParamArena`, with a single read into one aligned buffer. Lazy
+            loads of such params always produce an arena over the mapping.
+        """
+        if lazy and is_compressed(model_path):
+            logger.warning("lazy loading needs an uncompressed tar, extracting %s", model_path)
+            lazy = False
+
+        if lazy:
+            self._load_lazy(model_path)
+            return
 
-        # Save relay graph
-        relay_name = "model.json"
-        relay_path = temp.relpath(relay_name)
-        with open(relay_path, "w") as relay_file:
-            relay_file.write(ostar.ir.save_json(self.mod))
-
-        # Save params
-        params_name = "model.params"
-        params_path = temp.relpath(params_name)
-        with open(params_path, "wb") as params_file:
-            params_file.write(relay.save_param_dict(self.params))
-
-        # Create a tar file.
-        with tarfile.open(model_path, "w") as tar:
-            tar.add(relay_path, relay_name)
-            tar.add(params_path, params_name)
-            # If default tuning records exist, save them as well.
-            if os.path.exists(self.default_tuning_records_path()):
-                tar.add(self.default_tuning_records_path(), "tuning_records")
-            # Also save the compiled package if it can be found.
-            if os.path.exists(self.default_package_path()):
-                tar.add(self.default_package_path(), "model_package.tar")
-
-    def load(self, model_path: str):
         temp = self._tmp_dir
-        t = tarfile.open(model_path)
-        t.extractall(temp.relpath("."))
+        with open_archive(model_path) as tar:
+            tar.extractall(temp.relpath("."))
 
         # Load relay IR.
         relay_path = temp.relpath("model.json")
@@ -79,9 +236,111 @@ class OSTARCModel(object):
         # Load parameter dictionary.
         params_path = temp.relpath("model.params")
         with open(params_path, "rb") as params_file:
-            self.params = relay.load_param_dict(params_file.read())
+            if is_indexed_params(params_file.read(len(INDEXED_PARAMS_MAGIC))):
+                reader = IndexedParamsReader.open(params_path)
+                if packed and len(reader.index["shards"]) == 1:
+                    self.params = ParamArena.load(params_path)
+                else:
+                    self.params = reader.read_all()
+            else:
+                params_file.seek(0)
+                self.params = relay.load_param_dict(params_file.read())
+
+        def _read_member(name):
+            if not os.path.exists(temp.relpath(name)):
+                return None
+            with open(temp.relpath(name), "rb") as member_file:
+                return member_file.read()
+
+        self._load_metadata(_read_member)
+
+    def _load_lazy(self, model_path: str):
+        with tarfile.open(model_path, "r:") as tar:
+            members = {member.name: member for member in tar.getmembers()}
+            self.mod = ostar.ir.load_json(tar.extractfile(members["model.json"]).read().decode())
+
+        def _map_member(name):
+            return map_file_region(model_path, members[name].offset_data, members[name].size)
+
+        params_buffer = _map_member("model.params")
+        if is_indexed_params(params_buffer):
+            reader = IndexedParamsReader(params_buffer, _map_member)
+            self.params = ParamArena(params_buffer) if len(reader.index["shards"]) == 1 else reader
+        else:
+            self.params = LazyParamDict(params_buffer)
+        with tarfile.open(model_path, "r:") as tar:
+            self._load_metadata(
+                lambda name: tar.extractfile(members[name]).read() if name in members else None
+            )
+        self._pending_members = {
+            name: (model_path, members[name])
+            for name in ("tuning_records", "model_package.tar")
+            if name in members
+        }
+
+    def _load_metadata(self, read_member):
+        """Restore the LazyParam placeholders and the import reports saved by `save`.
+
+        ``read_member`` returns the contents of a member of the saved model,
+        or None if it does not exist.
+        """
+        placeholders_json = read_member(PLACEHOLDERS_NAME)
+        if placeholders_json is not None:
+            params = {name: self.params[name] for name in self.params}
+            for name, entry in json.loads(placeholders_json).items():
+                params[name] = LazyParam(**entry)
+            self.params = params
+        reports_json = read_member(REPORTS_NAME)
+        if reports_json is not None:
+            for attr, report in json.loads(reports_json).items():
+                setattr(self, attr, report)
+
+    def build_params(self, executor: str = "graph"):
+        """Get the params to hand to relay.build and to the runners.
+
+        Only NDArrays can be bound to a module, so the LazyParam
+        placeholders are materialized here. Other params are passed as they
+        are, so params sharing memory with a file or a framework still do.
+
+        For the graph executor, the params stored in a smaller type by
+        `cast_params_storage` are left out: they stay inputs of the built
+        module, so constant folding does not turn them back into float32,
+        and `export_package` adds them to the params of the package. The VM
+        has no separate params, so all of them are bound for it.
+
+        Parameters
+        ----------
+        executor : str, optional
+            The executor the module is built for, "graph" or "vm".
+
+        Returns
+        -------
+        params : dict
+            Mapping from parameter names to NDArrays or NumPy arrays.
+        """
+        params = self.params
+        if executor != "vm":
+            storage_names = set(storage_param_names(self.mod, params))
+            params = {name: value for name, value in params.items() if name not in storage_names}
+        return materialize_params(params)
+
+    def _package_params(self, executor_factory):
+        """Get the params of a built module along with the params it takes as inputs."""
+        params = dict(executor_factory.get_params())
+        storage_names = storage_param_names(self.mod, self.params)
+        params.update(materialize_params({name: self.params[name] for name in storage_names}))
+        return params
+
+    def _extract_pending(self, name):
+        """Extract a member left in the archive by a lazy load, if any."""
+        pending = self._pending_members.pop(name, None)
+        if pending is not None:
+            model_path, member = pending
+            with tarfile.open(model_path, "r:") as tar:
+                tar.extract(member, self._tmp_dir.relpath("."))
 
     def default_tuning_records_path(self):
+        self._extract_pending("tuning_records")
         return self._tmp_dir.relpath("tuning_records")
 
     def default_package_path(self):
@@ -95,6 +354,7 @@ class OSTARCModel(object):
         records_path: str
             A path to the default location for tuning records.
         """
+        self._extract_pending("model_package.tar")
         return self._tmp_dir.relpath("model_package.tar")
 
     def export_vm_format(
@@ -112,8 +372,7 @@ class OSTARCModel(object):
         vm_exec.mod.export_library(path_lib)
         self.lib_path = path_lib
         # Package up all the temp files into a tar file.
-        with tarfile.open(package_path, "w") as tar:
-            tar.add(path_lib, lib_name)
+        write_package(package_path, [(lib_name, path_lib)], "vm", "vm", lib_name)
 
         return package_path
 
@@ -124,6 +383,7 @@ class OSTARCModel(object):
         cross: Optional[Union[str, Callable]] = None,
         cross_options: Optional[str] = None,
         lib_format: str = "so",
+        params_format: str = "legacy",
     ):
         lib_name = "mod." + lib_format
         graph_name = "mod.json"
@@ -134,30 +394,123 @@ class OSTARCModel(object):
             package_path = self.default_package_path()
         path_lib = temp.relpath(lib_name)
 
-        if not cross:
-            executor_factory.get_lib().export_library(path_lib)
-        else:
-            if not cross_options:
-                executor_factory.get_lib().export_library(
-                    path_lib, ostar.contrib.cc.cross_compiler(cross)
-                )
-            else:
-                executor_factory.get_lib().export_library(
-                    path_lib, ostar.contrib.cc.cross_compiler(cross, options=cross_options.split(" "))
-                )
+        _export_library(executor_factory, path_lib, cross, cross_options)
         self.lib_path = path_lib
 
         with open(temp.relpath(graph_name), "w") as graph_file:
             graph_file.write(executor_factory.get_graph_json())
 
-        with open(temp.relpath(param_name), "wb") as params_file:
-            params_file.write(relay.save_param_dict(executor_factory.get_params()))
+        params = self._package_params(executor_factory)
+        if params_format == "indexed":
+            param_paths = save_indexed_params(params, temp.relpath(param_name))
+        else:
+            with open(temp.relpath(param_name), "wb") as params_file:
+                params_file.write(relay.save_param_dict(params))
+            param_paths = [temp.relpath(param_name)]
 
         # Package up all the temp files into a tar file.
-        with tarfile.open(package_path, "w") as tar:
-            tar.add(path_lib, lib_name)
-            tar.add(temp.relpath(graph_name), graph_name)
-            tar.add(temp.relpath(param_name), param_name)
+        members = [(lib_name, path_lib), (graph_name, temp.relpath(graph_name))]
+        members += [(os.path.basename(path), path) for path in param_paths]
+        write_package(package_path, members, "classic", "graph", lib_name)
+
+        return package_path
+
+    def export_variants_package(
+        self,
+        executor_factories: Dict[str, GraphExecutorFactoryModule],
+        package_path: Optional[str] = None,
+        cross: Optional[Union[str, Callable]] = None,
+        cross_options: Optional[str] = None,
+        lib_format: str = "so",
+        params_format: str = "legacy",
+    ):
+        """Export several compilations of the model into one package.
+
+        Each variant (e.g. a batch size) gets its own library and graph
+        under ``variants/<name>/``, while the params of all the variants are
+        saved once, in a shared ``mod.params`` store where params with the
+        same contents are deduplicated. ``variants.json`` maps the params of
+        each variant to their entry in the store.
+
+        Parameters
+        ----------
+        executor_factories : dict
+            Mapping from variant names to the graph executor factories
+            returned by relay.build. The first variant is the default one.
+        package_path : str, optional
+            The path of the package. Defaults to `default_package_path`.
+        cross : str or Callable, optional
+            The cross compiler used to export the libraries.
+        cross_options : str, optional
+            The options of the cross compiler.
+        lib_format : str, optional
+            The format of the libraries, "so" or "tar".
+        params_format : str, optional
+            The format of the shared params store, "legacy" or "indexed".
+
+        Returns
+        -------
+        package_path : str
+            The path of the package.
+        """
+        if lib_format not in ["so", "tar"]:
+            raise OSTARCException("Only 'so' and 'tar' library formats are supported.")
+        if not executor_factories:
+            raise OSTARCException("At least one variant is required.")
+        if params_format not in PARAMS_FORMATS:
+            raise OSTARCException(
+                f"Unsupported params format '{params_format}'. Choose from: {PARAMS_FORMATS}"
+            )
+
+        temp = self._tmp_dir
+        if package_path is None:
+            package_path = self.default_package_path()
+
+        store = {}
+        digests = {}
+        index = {"default": next(iter(executor_factories)), "variants": {}}
+        files = []
+        for variant, executor_factory in executor_factories.items():
+            if not variant or "/" in variant or variant.startswith("."):
+                raise OSTARCException(f"Invalid variant name '{variant}'.")
+            variant_dir = f"variants/{variant}"
+            os.makedirs(temp.relpath(variant_dir), exist_ok=True)
+            lib_name = f"{variant_dir}/mod.{lib_format}"
+            _export_library(executor_factory, temp.relpath(lib_name), cross, cross_options)
+            graph_name = f"{variant_dir}/mod.json"
+            with open(temp.relpath(graph_name), "w") as graph_file:
+                graph_file.write(executor_factory.get_graph_json())
+            files += [lib_name, graph_name]
+
+            param_map = {}
+            for name, value in self._package_params(executor_factory).items():
+                digest = tensor_digest(value)
+                if digest not in digests:
+                    store_name = name if name not in store else f"{variant}/{name}"
+                    store[store_name] = value
+                    digests[digest] = store_name
+                param_map[name] = digests[digest]
+            index["variants"][variant] = {"lib": lib_name, "graph": graph_name, "params": param_map}
+
+        if params_format == "indexed":
+            param_paths = save_indexed_params(store, temp.relpath("mod.params"))
+        else:
+            with open(temp.relpath("mod.params"), "wb") as params_file:
+                params_file.write(relay.save_param_dict(store))
+            param_paths = [temp.relpath("mod.params")]
+        with open(temp.relpath(VARIANTS_INDEX), "w") as index_file:
+            json.dump(index, index_file, indent=2)
+
+        total = sum(len(variant["params"]) for variant in index["variants"].values())
+        logger.info(
+            "exported %d variants, sharing %d params out of %d",
+            len(executor_factories),
+            len(store),
+            total,
+        )
+        members = [(name, temp.relpath(name)) for name in [VARIANTS_INDEX] + files]
+        members += [(os.path.basename(path), path) for path in param_paths]
+        write_package(package_path, members, "variants", "graph")
 
         return package_path
 
@@ -168,6 +521,7 @@ class OSTARCModel(object):
         cross: Optional[Union[str, Callable]] = None,
         cross_options: Optional[str] = None,
         output_format: str = "so",
+        params_format: str = "legacy",
     ):
         if output_format not in ["so", "tar", "mlf"]:
             raise OSTARCException("Only 'so', 'tar', and 'mlf' output formats are supported.")
@@ -179,7 +533,7 @@ class OSTARCModel(object):
             package_path = self.export_vm_format(executor_factory, package_path, output_format)
         elif output_format in ["so", "tar"]:
             package_path = self.export_classic_format(
-                executor_factory, package_path, cross, cross_options, output_format
+                executor_factory, package_path, cross, cross_options, output_format, params_format
             )
         elif output_format == "mlf":
             if export_model_library_format:
@@ -189,8 +543,150 @@ class OSTARCModel(object):
 
         return package_path
 
-    def summary(self, file: TextIO = None):
-        print(self.mod, file=file)
+    def specialize(self, shape_dict: Dict[str, List[int]]):
+        """Derive a model with static input shapes from this model.
+
+        This is meant to be used on a model imported once with symbolic
+        dimensions, to cheaply produce one statically-shaped variant per
+        set of shapes instead of importing the model again.
+
+        Parameters
+        ----------
+        shape_dict : dict
+            Mapping from input names to their concrete shapes.
+
+        Returns
+        -------
+        ostarc_model : OSTARCModel
+            The specialized model. It shares the params dict of this model.
+        """
+        main_func = self.mod["main"]
+        param_names = [param.name_hint for param in main_func.params]
+        unknown_names = [name for name in shape_dict if name not in param_names]
+        if unknown_names:
+            raise OSTARCException(
+                f"Unknown inputs {unknown_names}. The model inputs are: {param_names}"
+            )
+
+        binds = {}
+        new_params = []
+        inferred_params = None
+        for index, param in enumerate(main_func.params):
+            if param.name_hint not in shape_dict:
+                new_params.append(param)
+                continue
+            param_type = param.type_annotation
+            if param_type is None:
+                # Unannotated input: take the type inferred for it instead.
+                if inferred_params is None:
+                    try:
+                        inferred_params = relay.transform.InferType()(self.mod)["main"].params
+                    except ostar.error.OSTARError as error:
+                        raise OSTARCException(
+                            f"Cannot infer the type of input '{param.name_hint}': {error}"
+                        ) from error
+                param_type = inferred_params[index].checked_type
+            if not isinstance(param_type, relay.TensorType):
+                raise OSTARCException(
+                    f"Cannot specialize input '{param.name_hint}' of type {param_type}, "
+                    "only tensor inputs can be given a shape."
+                )
+            new_param = relay.var(
+                param.name_hint, shape=shape_dict[param.name_hint], dtype=param_type.dtype
+            )
+            binds[param] = new_param
+            new_params.append(new_param)
+
+        mod = rebind_main(self.mod, new_params, binds)
+        mod = relay.transform.DynamicToStatic()(mod)
+
+        return OSTARCModel(mod, self.params)
+
+    def pack_params(self, alignment: int = DEFAULT_ALIGNMENT):
+        """Pack the params into a single aligned, contiguous buffer.
+
+        The params are replaced by a `ParamArena`, a read-only params dict
+        whose NDArrays are views of the buffer. Saving the model with the
+        "indexed" params format then writes the buffer as it is.
+
+        Parameters
+        ----------
+        alignment : int, optional
+            Alignment of the buffer and of each param, in bytes.
+
+        Returns
+        -------
+        arena : ParamArena
+            The packed params.
+        """
+        if not isinstance(self.params, ParamArena):
+            self.params = ParamArena.pack(self.params, alignment)
+        return self.params
+
+    def statistics(self, top_k: int = 10):
+        """Compute the statistics of the model, without printing its IR.
+
+        Parameters
+        ----------
+        top_k : int, optional
+            The number of largest tensors to report.
+
+        Returns
+        -------
+        summary : ModelSummary
+            The op histogram, IR node counts, params size by dtype, largest
+            tensors and MAC count of the model.
+        """
+        return summarize_model(self.mod, self.params, top_k)
+
+    def summary(self, file: TextIO = None, mode: str = "ir"):
+        """Print a summary of the model.
+
+        Parameters
+        ----------
+        file : TextIO, optional
+            The file to print to.
+        mode : str, optional
+            "ir" to print the whole Relay module, "stats" to print the
+            statistics of `statistics` or "json" to print them as JSON.
+        """
+        if mode == "ir":
+            print(self.mod, file=file)
+        elif mode == "stats":
+            print(self.statistics(), file=file)
+        elif mode == "json":
+            print(self.statistics().to_json(), file=file)
+        else:
+            raise OSTARCException(
+                f"Unsupported summary mode '{mode}'. Choose from: ir, stats, json"
+            )
+
+
+def _export_library(executor_factory, path_lib, cross=None, cross_options=None):
+    """Export the library of a graph executor factory, cross-compiling it if requested."""
+    if not cross:
+        executor_factory.get_lib().export_library(path_lib)
+    else:
+        if not cross_options:
+            executor_factory.get_lib().export_library(
+                path_lib, ostar.contrib.cc.cross_compiler(cross)
+            )
+        else:
+            executor_factory.get_lib().export_library(
+                path_lib, ostar.contrib.cc.cross_compiler(cross, options=cross_options.split(" "))
+            )
+
+
+# Index of the variants of a multi-variant package.
+VARIANTS_INDEX = "variants.json"
+
+# Library file names of the classic and VM package formats, in lookup order.
+PACKAGE_LIBRARIES = [
+    ("mod.so", "classic"),
+    ("mod.tar", "classic"),
+    ("lib.so", "vm"),
+    ("lib.tar", "vm"),
+]
 
 
 class OSTARCPackage(object):
@@ -198,15 +694,235 @@ class OSTARCPackage(object):
         self,
         package_path: str,
         project_dir: Optional[Union[Path, str]] = None,
+        lazy: bool = False,
+        variant: Optional[str] = None,
     ):
         self._tmp_dir = utils.tempdir()
+        self.variant = variant
+        self.variants = []
+        self._variants_index = None
+        self._params = None
+        self._graph = None
+        self._load_params = None
+        self._load_graph = None
+        self._lib_path = None
+        self._extract_lib = None
+        self.manifest = None
+        self.params_view = None
         self.package_path = package_path
-        self.import_package(self.package_path)
+        if not (lazy and self._import_package_lazy(self.package_path)):
+            self.import_package(self.package_path)
 
         if project_dir and self.type != "mlf":
             raise OSTARCException("Setting 'project_dir' is only allowed when importing a MLF.!")
         self.project_dir = project_dir
 
+    @property
+    def params(self):
+        """The serialized params, in the relay.save_param_dict format.
+
+        This is a private bytearray copy, as the runtime only loads params
+        from a bytearray. Lazily imported packages also expose the params
+        without copying, as the memory map ``params_view`` and through
+        `param_arrays`.
+        """
+        if self._params is None and self._load_params is not None:
+            self._params = self._load_params()
+        return self._params
+
+    @params.setter
+    def params(self, value):
+        self._params = value
+
+    @property
+    def graph(self):
+        """The graph JSON of graph executor packages."""
+        if self._graph is None and self._load_graph is not None:
+            self._graph = self._load_graph()
+        return self._graph
+
+    @graph.setter
+    def graph(self, value):
+        self._graph = value
+
+    @property
+    def lib_path(self):
+        """The path to the extracted library, extracted on first access by lazy imports."""
+        if self._lib_path is None and self._extract_lib is not None:
+            self._lib_path = self._extract_lib()
+        return self._lib_path
+
+    @lib_path.setter
+    def lib_path(self, value):
+        self._lib_path = value
+
+    def validate(self):
+        """Check the members of the package against the digests of its manifest.
+
+        Raises
+        ------
+        OSTARCException
+            If the package has no manifest, or a member is truncated or corrupt.
+        """
+        verify_package(self.package_path, self.manifest)
+
+    def read_member(self, name: str):
+        """Read a member of the package through its manifest, without extracting it."""
+        manifest = self.manifest or read_manifest(self.package_path)
+        if manifest is None:
+            raise OSTARCException(f"{self.package_path} has no manifest.")
+        return read_member(self.package_path, manifest_member(manifest, name))
+
+    def param_arrays(self):
+        """Get the params of a lazily imported package as read-only NumPy arrays.
+
+        The arrays are views of the shared memory map of the package, so
+        they cost no memory beyond the page cache. bfloat16 params are
+        returned as their uint16 bits.
+
+        Returns
+        -------
+        arrays : dict
+            Mapping from parameter names to NumPy arrays.
+        """
+        if self.params_view is None:
+            raise OSTARCException("The params of the package are not memory-mapped.")
+        if is_indexed_params(self.params_view):
+            reader = IndexedParamsReader(self.params_view)
+            return {name: reader.view(name) for name in reader}
+        return {
+            name: numpy_view(self.params_view, dtype, shape, offset)
+            for name, dtype, shape, offset, _ in parse_param_dict(self.params_view)
+        }
+
+    def _import_package_lazy(self, package_path: str):
+        """Load a classic or VM package without extracting it.
+
+        Only the library is extracted, as it has to be loaded from a file.
+        The params are memory-mapped read-only, in ``params_view``, so that
+        processes importing the same package share their pages. The graph
+        JSON is only read when first accessed. When the package has a
+        manifest, importing only reads the manifest, and the library is
+        extracted when ``lib_path`` is first accessed.
+
+        Returns
+        -------
+        imported : bool
+            False if the package cannot be imported lazily (an MLF or a
+            compressed archive), in which case nothing was imported.
+        """
+        if is_compressed(package_path):
+            return False
+        manifest = read_manifest(package_path)
+        if manifest is not None:
+            if manifest["type"] not in ("classic", "vm"):
+                return False
+            members = {entry["name"]: entry for entry in manifest["members"]}
+            lib_name, package_type = manifest["lib"], manifest["type"]
+
+            def _extract_lib():
+                lib_path = self._tmp_dir.relpath(lib_name)
+                extract_member(package_path, members[lib_name], lib_path)
+                return lib_path
+
+            self._extract_lib = _extract_lib
+            self.manifest = manifest
+        else:
+            with tarfile.open(package_path, "r:") as tar:
+                tar_members = {member.name: member for member in tar.getmembers()}
+                if "metadata.json" in tar_members or VARIANTS_INDEX in tar_members:
+                    return False
+                for lib_name, package_type in PACKAGE_LIBRARIES:
+                    if lib_name in tar_members:
+                        break
+                else:
+                    raise OSTARCException("Couldn't find exported library in the package.")
+                tar.extract(tar_members[lib_name], self._tmp_dir.relpath("."))
+            members = {
+                name: {"offset": member.offset_data, "size": member.size}
+                for name, member in tar_members.items()
+            }
+            self.lib_path = self._tmp_dir.relpath(lib_name)
+
+        self.lib_name = lib_name
+        self.type = package_type
+        self.executor_type = "graph" if package_type == "classic" else "vm"
+        if package_type != "classic":
+            return True
+
+        params_member = members["mod.params"]
+        self.params_view = map_file_region(
+            package_path, params_member["offset"], params_member["size"], writable=False
+        )
+        self._load_params = lambda: bytearray(params_to_bytes(self.params_view))
+        self._load_graph = lambda: read_member(package_path, members["mod.json"]).decode("utf-8")
+        return True
+
+    def _load_variants_store(self):
+        """Load the params store shared by the variants of the package."""
+
+        def _read(name):
+            with open(self._tmp_dir.relpath(name), "rb") as params_file:
+                return params_file.read()
+
+        return load_params(_read("mod.params"), _read)
+
+    def create_variant_executors(self, device, variants: Optional[List[str]] = None):
+        """Instantiate graph executors for several variants of the package.
+
+        The params shared by the variants are loaded once: each param is
+        loaded by the first executor using it, and later executors refer to
+        the same device memory through GraphExecutor.share_params.
+
+        Parameters
+        ----------
+        device : ostar.runtime.Device
+            The device to run the variants on.
+        variants : list of str, optional
+            The variants to instantiate. Defaults to all of them.
+
+        Returns
+        -------
+        executors : dict
+            Mapping from variant names to GraphModules.
+        """
+        from ostar.contrib import graph_executor  # pylint: disable=import-outside-toplevel
+
+        if self._variants_index is None:
+            raise OSTARCException("The package does not contain variants.")
+        store = self._load_variants_store()
+        owners = {}
+        executors = {}
+        for variant in variants or self.variants:
+            if variant not in self.variants:
+                raise OSTARCException(
+                    f"Variant '{variant}' not found. Choose from: {self.variants}"
+                )
+            entry = self._variants_index["variants"][variant]
+            lib = ostar.runtime.load_module(self._tmp_dir.relpath(entry["lib"]))
+            with open(self._tmp_dir.relpath(entry["graph"])) as graph_file:
+                module = graph_executor.create(graph_file.read(), lib, device)
+
+            shared = {}
+            own = {}
+            for name, store_name in entry["params"].items():
+                owner = owners.get(store_name)
+                if (
+                    owner is not None
+                    and owner[0] == name
+                    and owner[1].get_input_index(name) == module.get_input_index(name)
+                ):
+                    shared.setdefault(id(owner[1]), (owner[1], []))[1].append(name)
+                else:
+                    own[name] = store[store_name]
+                    owners.setdefault(store_name, (name, module))
+            for owner_module, names in shared.values():
+                module.share_params(owner_module, param_names_header(names))
+            if own:
+                module.load_params(relay.save_param_dict(own))
+            executors[variant] = module
+        return executors
+
     def import_package(self, package_path: str):
         """Load a OSTARCPackage from a previously exported OSTARCModel.
 
@@ -218,8 +934,35 @@ class OSTARCPackage(object):
         temp = self._tmp_dir
         t = tarfile.open(package_path)
         t.extractall(temp.relpath("."))
+        self.manifest = read_manifest(package_path) if not is_compressed(package_path) else None
 
-        if os.path.exists(temp.relpath("metadata.json")):
+        if os.path.exists(temp.relpath(VARIANTS_INDEX)):
+            # Multi-variant format
+            with open(temp.relpath(VARIANTS_INDEX)) as index_file:
+                self._variants_index = json.load(index_file)
+            self.variants = list(self._variants_index["variants"])
+            if self.variant is None:
+                self.variant = self._variants_index["default"]
+            if self.variant not in self.variants:
+                raise OSTARCException(
+                    f"Variant '{self.variant}' not found. Choose from: {self.variants}"
+                )
+            entry = self._variants_index["variants"][self.variant]
+            self.lib_name = entry["lib"]
+            self.lib_path = temp.relpath(self.lib_name)
+            self.type = "classic"
+            self.executor_type = "graph"
+            graph = temp.relpath(entry["graph"])
+            params = temp.relpath(f"variants/{self.variant}/mod.params")
+            store = self._load_variants_store()
+            with open(params, "wb") as params_file:
+                params_file.write(
+                    relay.save_param_dict(
+                        {name: store[store_name] for name, store_name in entry["params"].items()}
+                    )
+                )
+
+        elif os.path.exists(temp.relpath("metadata.json")):
             # Model Library Format (MLF)
             self.lib_name = None
             self.lib_path = None
@@ -261,7 +1004,10 @@ class OSTARCPackage(object):
             vm_lib_name_so = "lib.so"
             vm_lib_name_tar = "lib.tar"
 
-            if os.path.exists(temp.relpath(classic_lib_name_so)):
+            if self.manifest is not None and self.manifest["type"] in ("classic", "vm"):
+                self.lib_name = self.manifest["lib"]
+                self.type = self.manifest["type"]
+            elif os.path.exists(temp.relpath(classic_lib_name_so)):
                 self.lib_name = classic_lib_name_so
                 self.type = "classic"
             elif os.path.exists(temp.relpath(classic_lib_name_tar)):
@@ -287,7 +1033,12 @@ class OSTARCPackage(object):
 
         if params is not None:
             with open(params, "rb") as param_file:
-                self.params = bytearray(param_file.read())
+                if is_indexed_params(param_file.read(len(INDEXED_PARAMS_MAGIC))):
+                    # The runtime only reads the relay.save_param_dict format.
+                    self.params = IndexedParamsReader.open(params).to_param_dict_bytes()
+                else:
+                    param_file.seek(0)
+                    self.params = bytearray(param_file.read())
         else:
             self.params = None
 
@@ -299,9 +1050,22 @@ class OSTARCPackage(object):
 
 
 class OSTARCResult(object):
-    def __init__(self, outputs: Dict[str, np.ndarray], times: BenchmarkResult):
+    def __init__(
+        self,
+        outputs: Dict[str, np.ndarray],
+        times: BenchmarkResult,
+        latency: Optional[LatencyDistribution] = None,
+    ):
         self.outputs = outputs
         self.times = times
+        if latency is None and times is not None and getattr(times, "results", None):
+            # Each result is the mean of the runs of a repeat: there are few
+            # of them and the warmup is already averaged in, so none is
+            # trimmed and the percentiles are those of the repeats.
+            latency = LatencyDistribution.from_samples(
+                times.results, warmup_window=0, sample_name="repeat"
+            )
+        self.latency = latency
 
     def format_times(self):
         """Format the mean, max, min and std of the execution times.
@@ -312,12 +1076,18 @@ class OSTARCResult(object):
             mean (ms)  median (ms) max (ms)    min (ms)    std (ms)
             0.14310      0.14310   0.16161     0.12933    0.01004
 
+        followed by the latency percentiles, when a latency distribution is
+        available. Without one from the runner, the percentiles are those of
+        the per-repeat means of ``times``.
+
         Returns
         -------
         str
             A formatted string containing the statistics.
         """
-        return str(self.times)
+        if self.latency is None or not self.latency.count:
+            return str(self.times)
+        return str(self.times) + "\n" + self.latency.format_percentiles()
 
     def get_output(self, name: str):
         """A helper function to grab one of the outputs by name.
@@ -337,6 +1107,16 @@ class OSTARCResult(object):
     def save(self, output_path: str):
         np.savez(output_path, **self.outputs)
 
+    def append_to(self, store: OutputStore):
+        """Append the outputs to a store collecting the outputs of repeated runs.
+
+        Parameters
+        ----------
+        store : OutputStore
+            The store, typically shared by the runs over a dataset.
+        """
+        store.append(self.outputs)
+
     def __str__(self):
         stat_table = self.format_times()
         output_keys = f"Output Names:\n {list(self.outputs.keys())}"
@@ -0,0 +1,377 @@
+"""
+Simplification of ONNX graphs before their conversion to Relay.
+
+Exported graphs often compute static shapes at run time, with chains of
+Shape, Gather, Unsqueeze and Concat nodes, and carry initializers that no
+node uses. Folding the former and pruning the latter before `from_onnx`
+saves their conversion and every later pass over them.
+"""
+import logging
+import numbers
+import time
+
+import numpy as np
+
+
+# pylint: disable=invalid-name
+logger = logging.getLogger("OSTARC")
+
+# Folded results larger than this number of elements are not materialized,
+# so that folding never inflates the model.
+DEFAULT_MAX_FOLDED_SIZE = 1 << 16
+
+
+def _np_dtype(onnx, data_type):
+    if hasattr(onnx.helper, "tensor_dtype_to_np_dtype"):
+        return np.dtype(onnx.helper.tensor_dtype_to_np_dtype(data_type))
+    return np.dtype(onnx.mapping.TENSOR_TYPE_TO_NP_TYPE[data_type])
+
+
+def _attrs(onnx, node):
+    return {attr.name: onnx.helper.get_attribute_value(attr) for attr in node.attribute}
+
+
+def _normalize_axes(axes, rank):
+    return [int(axis) + rank if axis < 0 else int(axis) for axis in axes]
+
+
+def _fold_constant(onnx, attrs, inputs):
+    # pylint: disable=unused-argument
+    if "value" in attrs:
+        return onnx.numpy_helper.to_array(attrs["value"])
+    if "value_float" in attrs:
+        return np.array(attrs["value_float"], dtype="float32")
+    if "value_floats" in attrs:
+        return np.array(attrs["value_floats"], dtype="float32")
+    if "value_int" in attrs:
+        return np.array(attrs["value_int"], dtype="int64")
+    if "value_ints" in attrs:
+        return np.array(attrs["value_ints"], dtype="int64")
+    return None
+
+
+def _fold_gather(onnx, attrs, inputs):
+    return np.take(inputs[0], inputs[1], axis=attrs.get("axis", 0))
+
+
+def _fold_concat(onnx, attrs, inputs):
+    return np.concatenate(inputs, axis=attrs["axis"])
+
+
+def _fold_unsqueeze(onnx, attrs, inputs):
+    axes = attrs["axes"] if "axes" in attrs else inputs[1]
+    data = inputs[0]
+    for axis in sorted(_normalize_axes(axes, data.ndim + len(axes))):
+        data = np.expand_dims(data, axis)
+    return data
+
+
+def _fold_squeeze(onnx, attrs, inputs):
+    axes = attrs["axes"] if "axes" in attrs else (inputs[1] if len(inputs) > 1 else None)
+    if axes is None:
+        return np.squeeze(inputs[0])
+    return np.squeeze(inputs[0], axis=tuple(_normalize_axes(axes, inputs[0].ndim)))
+
+
+def _fold_slice(onnx, attrs, inputs):
+    data = inputs[0]
+    if "starts" in attrs:
+        starts, ends = attrs["starts"], attrs["ends"]
+        axes, steps = attrs.get("axes"), None
+    else:
+        starts, ends = inputs[1], inputs[2]
+        axes = inputs[3] if len(inputs) > 3 else None
+        steps = inputs[4] if len(inputs) > 4 else None
+    if axes is None:
+        axes = range(len(starts))
+    if steps is None:
+        steps = [1] * len(starts)
+    slices = [slice(None)] * data.ndim
+    for axis, start, end, step in zip(_normalize_axes(axes, data.ndim), starts, ends, steps):
+        slices[axis] = slice(int(start), int(end), int(step))
+    return data[tuple(slices)]
+
+
+def _fold_cast(onnx, attrs, inputs):
+    return inputs[0].astype(_np_dtype(onnx, attrs["to"]))
+
+
+def _fold_reshape(onnx, attrs, inputs):
+    data, shape = inputs[0], [int(dim) for dim in inputs[1]]
+    if not attrs.get("allowzero", 0):
+        shape = [data.shape[index] if dim == 0 else dim for index, dim in enumerate(shape)]
+    return data.reshape(shape)
+
+
+def _fold_identity(onnx, attrs, inputs):
+    return inputs[0]
+
+
+def _fold_div(onnx, attrs, inputs):
+    lhs, rhs = inputs
+    if np.issubdtype(lhs.dtype, np.integer):
+        # Integer division truncates towards zero in ONNX.
+        return np.trunc(np.true_divide(lhs, rhs)).astype(lhs.dtype)
+    return np.divide(lhs, rhs)
+
+
+def _fold_range(onnx, attrs, inputs):
+    start, limit, delta = inputs
+    return np.arange(start, limit, delta, dtype=start.dtype)
+
+
+def _fold_constant_of_shape(onnx, attrs, inputs):
+    if "value" in attrs:
+        value = onnx.numpy_helper.to_array(attrs["value"])
+    else:
+        value = np.zeros(1, dtype="float32")
+    return np.full([int(dim) for dim in inputs[0]], value.reshape(-1)[0], dtype=value.dtype)
+
+
+# Evaluation rules of the foldable operators. Each takes the onnx module, the
+# node attributes and the constant inputs, and returns the constant output.
+FOLDING_RULES = {
+    "Constant": _fold_constant,
+    "Gather": _fold_gather,
+    "Concat": _fold_concat,
+    "Unsqueeze": _fold_unsqueeze,
+    "Squeeze": _fold_squeeze,
+    "Slice": _fold_slice,
+    "Cast": _fold_cast,
+    "Reshape": _fold_reshape,
+    "Identity": _fold_identity,
+    "Add": lambda onnx, attrs, inputs: np.add(inputs[0], inputs[1]),
+    "Sub": lambda onnx, attrs, inputs: np.subtract(inputs[0], inputs[1]),
+    "Mul": lambda onnx, attrs, inputs: np.multiply(inputs[0], inputs[1]),
+    "Div": _fold_div,
+    "Range": _fold_range,
+    "ConstantOfShape": _fold_constant_of_shape,
+}
+
+
+def _output_size_estimate(op_type, inputs):
+    """Size of the output of the operators that can create large tensors."""
+    if op_type == "ConstantOfShape":
+        return int(np.prod(inputs[0], dtype=np.int64))
+    if op_type == "Range":
+        start, limit, delta = (np.asarray(value).item() for value in inputs)
+        return max(int(np.ceil((limit - start) / delta)), 0) if delta else 0
+    return 0
+
+
+def _static_shape(value_info):
+    """Get the shape of a value info if all its dimensions are known."""
+    tensor_type = value_info.type.tensor_type
+    if not tensor_type.HasField("shape"):
+        return None
+    shape = []
+    for dim in tensor_type.shape.dim:
+        if not dim.HasField("dim_value") or dim.dim_value <= 0:
+            return None
+        shape.append(dim.dim_value)
+    return shape
+
+
+def _static_dim(dim):
+    """Get a dimension of a user-given shape as an int, or None if it is not static."""
+    if isinstance(dim, numbers.Integral) and dim > 0:
+        return int(dim)
+    return None
+
+
+def _infer_static_shapes(onnx, model, shape_dict):
+    """Infer the static shapes of the graph values.
+
+    Shape inference runs on a skeleton of the graph that declares the
+    initializers as inputs, so the weights are never copied. The shapes of
+    ``shape_dict`` override the declared input shapes, and their dimensions
+    that are not positive integers (None, negative or relay.Any()) are
+    unknown, so that the Shape and Size nodes depending on them are not
+    folded to the declared dimensions.
+    """
+    graph = model.graph
+    shape_dict = shape_dict or {}
+    initializer_names = {init.name for init in graph.initializer}
+
+    inputs = []
+    for graph_input in graph.input:
+        if graph_input.name in initializer_names:
+            continue
+        shape = shape_dict.get(graph_input.name)
+        if shape is not None:
+            graph_input = onnx.helper.make_tensor_value_info(
+                graph_input.name,
+                graph_input.type.tensor_type.elem_type,
+                [_static_dim(dim) for dim in shape],
+            )
+        inputs.append(graph_input)
+    for init in graph.initializer:
+        inputs.append(onnx.helper.make_tensor_value_info(init.name, init.data_type, init.dims))
+
+    skeleton = onnx.helper.make_model(
+        onnx.helper.make_graph(graph.node, graph.name, inputs, graph.output),
+        opset_imports=model.opset_import,
+        ir_version=model.ir_version,
+    )
+    try:
+        inferred = onnx.shape_inference.infer_shapes(skeleton).graph
+    except Exception as error:  # pylint: disable=broad-except
+        logger.debug("ONNX shape inference failed: %s", error)
+        inferred = skeleton.graph
+
+    shapes = {}
+    for value_info in list(inferred.input) + list(inferred.value_info) + list(inferred.output):
+        shape = _static_shape(value_info)
+        if shape is not None:
+            shapes[value_info.name] = shape
+    return shapes
+
+
+def _subgraph_inputs(onnx, node):
+    """Names used by the subgraphs (e.g. If or Loop bodies) of a node."""
+    names = set()
+    for attr in node.attribute:
+        graphs = []
+        if attr.type == onnx.AttributeProto.GRAPH:
+            graphs.append(attr.g)
+        elif attr.type == onnx.AttributeProto.GRAPHS:
+            graphs.extend(attr.graphs)
+        for subgraph in graphs:
+            for sub_node in subgraph.node:
+                names.update(sub_node.input)
+                names.update(_subgraph_inputs(onnx, sub_node))
+    return names
+
+
+def simplify_onnx_model(onnx, model, shape_dict=None, max_folded_size=DEFAULT_MAX_FOLDED_SIZE):
+    """Fold static subgraphs and prune unused nodes and initializers, in place.
+
+    Parameters
+    ----------
+    onnx : module
+        The onnx package.
+    model : onnx.ModelProto
+        The model to simplify.
+    shape_dict : dict, optional
+        Mapping from input names to their shapes.
+    max_folded_size : int, optional
+        Largest number of elements of a folded tensor.
+
+    Returns
+    -------
+    report : dict
+        The number of folded nodes, removed nodes and removed initializers,
+        the number of initializer bytes removed and the time it took.
+    """
+    start = time.perf_counter()
+    graph = model.graph
+    num_nodes = len(graph.node)
+    shapes = _infer_static_shapes(onnx, model, shape_dict)
+
+    initializers = {init.name: init for init in graph.initializer}
+    constants = {}
+
+    def _get_constant(name):
+        if name in constants:
+            return constants[name]
+        init = initializers.get(name)
+        if (
+            init is None
+            or init.data_location == onnx.TensorProto.EXTERNAL
+            or np.prod(init.dims, dtype=np.int64) > max_folded_size
+        ):
+            return None
+        constants[name] = onnx.numpy_helper.to_array(init)
+        return constants[name]
+
+    folded = set()
+    for index, node in enumerate(graph.node):
+        if node.domain not in ("", "ai.onnx") or len(node.output) != 1:
+            continue
+        attrs = _attrs(onnx, node)
+        try:
+            if node.op_type in ("Shape", "Size"):
+                shape = shapes.get(node.input[0])
+                if shape is None:
+                    continue
+                if node.op_type == "Size":
+                    value = np.array(np.prod(shape), dtype="int64")
+                else:
+                    value = np.array(shape, dtype="int64")[attrs.get("start", 0) : attrs.get("end")]
+            elif node.op_type in FOLDING_RULES:
+                inputs = [_get_constant(name) if name else None for name in node.input]
+                if any(value is None for value, name in zip(inputs, node.input) if name):
+                    continue
+                if _output_size_estimate(node.op_type, inputs) > max_folded_size:
+                    continue
+                value = FOLDING_RULES[node.op_type](onnx, attrs, inputs)
+            else:
+                continue
+        except Exception as error:  # pylint: disable=broad-except
+            logger.debug("could not fold %s node %s: %s", node.op_type, node.name, error)
+            continue
+        if value is None or value.size > max_folded_size:
+            continue
+        value = np.asarray(value)
+        constants[node.output[0]] = value
+        shapes[node.output[0]] = list(value.shape)
+        folded.add(index)
+
+    # Walk the graph backwards from its outputs to find the live values.
+    live = {output.name for output in graph.output}
+    kept_nodes = []
+    for index in reversed(range(len(graph.node))):
+        node = graph.node[index]
+        if index in folded or not any(name in live for name in node.output):
+            continue
+        kept_nodes.append(node)
+        live.update(name for name in node.input if name)
+        live.update(_subgraph_inputs(onnx, node))
+    kept_nodes.reverse()
+
+    removed_bytes = 0
+    kept_initializers = []
+    for init in graph.initializer:
+        if init.name in live:
+            kept_initializers.append(init)
+        else:
+            removed_bytes += (
+                int(np.prod(init.dims, dtype=np.int64)) * _np_dtype(onnx, init.data_type).itemsize
+            )
+    kept_names = {init.name for init in kept_initializers}
+    new_initializers = [
+        onnx.numpy_helper.from_array(constants[node.output[0]], node.output[0])
+        for index, node in enumerate(graph.node)
+        if index in folded and node.output[0] in live and node.output[0] not in kept_names
+    ]
+    kept_inputs = [
+        graph_input
+        for graph_input in graph.input
+        if graph_input.name not in initializers or graph_input.name in live
+    ]
+
+    num_initializers = len(graph.initializer)
+    del graph.node[:]
+    graph.node.extend(kept_nodes)
+    del graph.initializer[:]
+    graph.initializer.extend(kept_initializers + new_initializers)
+    del graph.input[:]
+    graph.input.extend(kept_inputs)
+
+    report = {
+        "folded_nodes": len(folded),
+        "removed_nodes": num_nodes - len(graph.node),
+        "removed_initializers": num_initializers - len(kept_initializers),
+        "removed_bytes": removed_bytes,
+        "time": time.perf_counter() - start,
+    }
+    logger.info(
+        "simplified ONNX graph: %d nodes folded, %d nodes and %d initializers (%d bytes) "
+        "removed in %.3f s",
+        report["folded_nodes"],
+        report["removed_nodes"],
+        report["removed_initializers"],
+        report["removed_bytes"],
+        report["time"],
+    )
+    return report
@@ -0,0 +1,269 @@
+"""
+Appendable on-disk store for the outputs of repeated runs.
+"""
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+from ostar.driver.ostarc import OSTARCException
+
+
+# pylint: disable=invalid-name
+logger = logging.getLogger("OSTARC")
+
+STORE_COMPRESSIONS = [None, "zlib"]
+
+DEFAULT_CHUNK_SAMPLES = 1024
+DEFAULT_CHUNK_BYTES = 64 * 1024**2
+
+_INDEX_NAME = "index.json"
+_STORE_VERSION = 1
+
+
+def _read_index(path):
+    try:
+        with open(os.path.join(path, _INDEX_NAME)) as index_file:
+            index = json.load(index_file)
+    except FileNotFoundError as error:
+        raise OSTARCException(f"No outputs store found at {path}.") from error
+    if index.get("version") != _STORE_VERSION:
+        raise OSTARCException(f"Unsupported outputs store version {index.get('version')}.")
+    return index
+
+
+class OutputStore(object):
+    """Appendable store of run outputs, chunked along a sample axis.
+
+    Each output is stored as a sequence of chunks stacking the samples
+    appended to the store, so ``num_samples`` runs of an output of shape
+    ``S`` read back as an array of shape ``(num_samples, *S)``. Samples are
+    buffered in memory until a chunk is full, which bounds the memory used
+    by the store to about one chunk per output. The index of the store is
+    rewritten after every chunk, so a store can be reopened and appended to.
+
+    Parameters
+    ----------
+    path : str
+        The directory holding the store. Created if missing.
+    compression : str, optional
+        None to store the chunks as .npy files, which can be memory-mapped
+        by `OutputStoreReader`, or "zlib" to store them compressed.
+    chunk_samples : int, optional
+        The maximum number of samples in a chunk.
+    chunk_bytes : int, optional
+        The maximum size of the samples buffered for an output, in bytes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compression: Optional[str] = None,
+        chunk_samples: int = DEFAULT_CHUNK_SAMPLES,
+        chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    ):
+        if compression not in STORE_COMPRESSIONS:
+            raise OSTARCException(
+                f"Unsupported compression '{compression}'. Choose from: {STORE_COMPRESSIONS}"
+            )
+        self.path = path
+        self.chunk_samples = chunk_samples
+        self.chunk_bytes = chunk_bytes
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, _INDEX_NAME)):
+            self._index = _read_index(path)
+            if self._index["compression"] != compression:
+                logger.info(
+                    "appending to %s with its existing compression '%s'",
+                    path,
+                    self._index["compression"],
+                )
+        else:
+            self._index = {
+                "version": _STORE_VERSION,
+                "compression": compression,
+                "num_samples": 0,
+                "outputs": {},
+            }
+        self._buffers = {name: [] for name in self._index["outputs"]}
+
+    @property
+    def num_samples(self):
+        """The number of samples appended to the store, including buffered ones."""
+        buffered = max((len(buffer) for buffer in self._buffers.values()), default=0)
+        return self._index["num_samples"] + buffered
+
+    def append(self, outputs: Dict[str, np.ndarray]):
+        """Append the outputs of one run.
+
+        Parameters
+        ----------
+        outputs : dict
+            Mapping from output names to their values. Every output of the
+            store has to be given, with the same shape and dtype each time.
+        """
+        if not outputs:
+            raise OSTARCException("no outputs to append")
+        entries = self._index["outputs"]
+        if not entries and self._index["num_samples"] == 0:
+            for number, (name, value) in enumerate(outputs.items()):
+                value = np.asarray(value)
+                entries[name] = {
+                    "dtype": value.dtype.str,
+                    "shape": list(value.shape),
+                    "dir": f"output_{number}",
+                    "chunks": [],
+                }
+                self._buffers[name] = []
+                os.makedirs(os.path.join(self.path, entries[name]["dir"]), exist_ok=True)
+
+        if set(outputs) != set(entries):
+            raise OSTARCException(
+                f"Expected outputs {sorted(entries)}, got {sorted(outputs)}."
+            )
+        values = {}
+        for name, value in outputs.items():
+            value = np.asarray(value)
+            entry = entries[name]
+            if list(value.shape) != entry["shape"] or value.dtype.str != entry["dtype"]:
+                raise OSTARCException(
+                    f"Output '{name}' has shape {list(value.shape)} and dtype {value.dtype}, "
+                    f"expected shape {entry['shape']} and dtype {np.dtype(entry['dtype'])}."
+                )
+            values[name] = value
+
+        for name, value in values.items():
+            # Copy, as runtimes may reuse their output buffers between runs.
+            self._buffers[name].append(np.array(value))
+
+        num_buffered = len(next(iter(self._buffers.values())))
+        buffered_bytes = num_buffered * max(value.nbytes for value in values.values())
+        if num_buffered >= self.chunk_samples or buffered_bytes >= self.chunk_bytes:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered samples as a new chunk of each output."""
+        count = max((len(buffer) for buffer in self._buffers.values()), default=0)
+        if count == 0:
+            return
+        for name, buffer in self._buffers.items():
+            entry = self._index["outputs"][name]
+            number = len(entry["chunks"])
+            data = np.stack(buffer)
+            if self._index["compression"] is None:
+                file_name = f"{number:06d}.npy"
+                np.save(os.path.join(self.path, entry["dir"], file_name), data)
+            else:
+                file_name = f"{number:06d}.npz"
+                np.savez_compressed(os.path.join(self.path, entry["dir"], file_name), data=data)
+            entry["chunks"].append({"file": file_name, "samples": count})
+            buffer.clear()
+        self._index["num_samples"] += count
+        self._write_index()
+
+    def _write_index(self):
+        tmp_path = os.path.join(self.path, "." + _INDEX_NAME)
+        with open(tmp_path, "w") as index_file:
+            json.dump(self._index, index_file)
+        os.replace(tmp_path, os.path.join(self.path, _INDEX_NAME))
+
+    def close(self):
+        """Flush the buffered samples."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class OutputStoreReader(object):
+    """Reader of the outputs saved by an `OutputStore`.
+
+    Uncompressed chunks are memory-mapped, so reading a slice of samples
+    only touches the chunks covering it.
+
+    Parameters
+    ----------
+    path : str
+        The directory holding the store.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index = _read_index(path)
+
+    @property
+    def names(self):
+        """The names of the stored outputs."""
+        return list(self._index["outputs"])
+
+    @property
+    def num_samples(self):
+        return self._index["num_samples"]
+
+    def __len__(self):
+        return self.num_samples
+
+    def _load_chunk(self, entry, chunk):
+        chunk_path = os.path.join(self.path, entry["dir"], chunk["file"])
+        if chunk["file"].endswith(".npz"):
+            with np.load(chunk_path) as archive:
+                return archive["data"]
+        return np.load(chunk_path, mmap_mode="r")
+
+    def iter_chunks(self, name: str):
+        """Iterate over the chunks of an output.
+
+        Yields
+        ------
+        chunk : np.ndarray
+            The samples of a chunk, stacked along the first axis.
+        """
+        entry = self._index["outputs"][name]
+        for chunk in entry["chunks"]:
+            yield self._load_chunk(entry, chunk)
+
+    def read(self, name: str, start: int = 0, stop: Optional[int] = None):
+        """Read a range of samples of an output.
+
+        Parameters
+        ----------
+        name : str
+            The name of the output.
+        start : int, optional
+            The first sample to read.
+        stop : int, optional
+            The sample after the last one to read. Defaults to the end.
+
+        Returns
+        -------
+        samples : np.ndarray
+            The samples, stacked along the first axis. When they all belong
+            to one uncompressed chunk, this is a read-only view of its
+            memory map.
+        """
+        if name not in self._index["outputs"]:
+            raise OSTARCException(f"Output '{name}' not found in {self.path}.")
+        entry = self._index["outputs"][name]
+        start, stop, _ = slice(start, stop).indices(self.num_samples)
+        parts = []
+        chunk_start = 0
+        for chunk in entry["chunks"]:
+            chunk_stop = chunk_start + chunk["samples"]
+            if chunk_stop > start and chunk_start < stop:
+                data = self._load_chunk(entry, chunk)
+                first = max(start - chunk_start, 0)
+                parts.append(data[first : min(stop, chunk_stop) - chunk_start])
+            chunk_start = chunk_stop
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.empty([0] + entry["shape"], dtype=entry["dtype"])
+        return np.concatenate(parts)
+
+    def __getitem__(self, name: str):
+        return self.read(name)
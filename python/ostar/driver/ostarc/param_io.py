@@ -0,0 +1,777 @@
+"""
+Serialization of parameter dictionaries.
+"""
+import functools
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import ostar
+from ostar import relay
+from ostar.driver.ostarc.params import NDARRAY_ALIGNMENT, LazyParam, ndarray_view
+
+
+# pylint: disable=invalid-name
+logger = logging.getLogger("OSTARC")
+
+# Magic numbers of the runtime serialization of NDArray lists and NDArrays,
+# as produced by relay.save_param_dict.
+NDARRAY_LIST_MAGIC = 0xF7E58D4F05049CB7
+NDARRAY_MAGIC = 0xDD5E40F096B4A13F
+
+_DTYPE_CODES = {"int": 0, "uint": 1, "float": 2, "bfloat": 4}
+_CHUNK_SIZE = 1 << 22
+
+
+def dtype_descriptor(dtype):
+    """Get the DLPack (code, bits, lanes) triple of a dtype string."""
+    dtype = str(dtype)
+    if dtype == "bool":
+        return 1, 1, 1
+    match = re.fullmatch(r"(bfloat|float|uint|int)(\d+)", dtype)
+    if match is None:
+        raise ValueError(f"Unsupported param dtype '{dtype}'.")
+    return _DTYPE_CODES[match.group(1)], int(match.group(2)), 1
+
+
+def _tensor_nbytes(shape, dtype):
+    _, bits, lanes = dtype_descriptor(dtype)
+    return int(np.prod(shape, dtype=np.int64)) * ((bits * lanes + 7) // 8)
+
+
+def _tensor_header(shape, dtype):
+    code, bits, lanes = dtype_descriptor(dtype)
+    return b"".join(
+        [
+            # magic, reserved, CPU device (type 1, id 0) and ndim
+            struct.pack("<QQiii", NDARRAY_MAGIC, 0, 1, 0, len(shape)),
+            struct.pack("<BBH", code, bits, lanes),
+            struct.pack(f"<{len(shape)}q", *shape),
+            struct.pack("<q", _tensor_nbytes(shape, dtype)),
+        ]
+    )
+
+
+def _tensor_data(value):
+    """Get the raw little-endian bytes of a param as a memoryview."""
+    if isinstance(value, LazyParam):
+        value = value.materialize()
+    dtype = str(value.dtype)
+    if dtype == "bfloat16":
+        # NumPy has no bfloat16, take the bytes serialized by the runtime.
+        blob = relay.save_param_dict({"_": value})
+        return memoryview(blob)[len(blob) - _tensor_nbytes(value.shape, dtype) :]
+    data = value if isinstance(value, np.ndarray) else value.numpy()
+    data = np.ascontiguousarray(data)
+    if data.dtype.byteorder == ">" or (data.dtype.byteorder == "=" and sys.byteorder == "big"):
+        data = data.byteswap()
+    return memoryview(data.reshape(-1).view("uint8"))
+
+
+def _param_info(params, name):
+    """Get the dtype and shape of a param.
+
+    Params dicts over a buffer (LazyParamDict, IndexedParamsReader) describe
+    their tensors without creating NDArrays for them.
+    """
+    if hasattr(params, "info"):
+        info = params.info(name)
+        return str(info["dtype"]), tuple(int(dim) for dim in info["shape"])
+    value = params[name]
+    return str(value.dtype), tuple(int(dim) for dim in value.shape)
+
+
+def _param_data(params, name):
+    """Get the raw bytes of a param, viewing the buffer of the params dict if it has one."""
+    if hasattr(params, "view"):
+        return _tensor_data(params.view(name))
+    return _tensor_data(params[name])
+
+
+def tensor_digest(value):
+    """Compute the SHA-256 digest of the dtype, shape and contents of a param."""
+    sha = hashlib.sha256(repr((str(value.dtype), tuple(int(dim) for dim in value.shape))).encode())
+    sha.update(_tensor_data(value))
+    return sha.hexdigest()
+
+
+def param_names_header(names):
+    """Serialize the header of a params dict, up to and including the tensor count.
+
+    GraphExecutor.share_params only reads the names of a params dict, so
+    this header is enough to share params between executors without
+    serializing their data.
+    """
+    names = [name.encode("utf-8") for name in names]
+    return b"".join(
+        [struct.pack("<QQQ", NDARRAY_LIST_MAGIC, 0, len(names))]
+        + [struct.pack("<Q", len(name)) + name for name in names]
+        + [struct.pack("<Q", len(names))]
+    )
+
+
+class ParamDictStream(object):
+    """Serialize a params dict in the relay.save_param_dict format, in chunks.
+
+    The total size is known before any data is produced, and the tensors
+    are serialized one at a time, so a whole params dict can be written to
+    an archive member while only holding one tensor in memory. LazyParam
+    placeholders are materialized one at a time as well.
+
+    Parameters
+    ----------
+    params : dict
+        Mapping from parameter names to NDArrays, NumPy arrays or LazyParams.
+    """
+
+    def __init__(self, params):
+        self.params = params
+        self._header = param_names_header(params)
+        self._tensor_headers = {}
+        self.size = len(self._header)
+        for name in params:
+            dtype, shape = _param_info(params, name)
+            self._tensor_headers[name] = _tensor_header(shape, dtype)
+            self.size += len(self._tensor_headers[name]) + _tensor_nbytes(shape, dtype)
+
+    def chunks(self):
+        """Generate the serialized params dict, in chunks of at most a few MiB."""
+        yield self._header
+        for name, header in self._tensor_headers.items():
+            yield header
+            data = _param_data(self.params, name)
+            for start in range(0, len(data), _CHUNK_SIZE):
+                yield data[start : start + _CHUNK_SIZE]
+
+    def reader(self):
+        """Get a file-like object reading the serialized params dict."""
+        return IterReader(self.chunks())
+
+
+class IterReader(object):
+    """Minimal read-only file object over an iterable of byte chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b"")
+
+    def read(self, size=-1):
+        parts = []
+        while size < 0 or size > 0:
+            if not self._pending:
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._pending = memoryview(chunk).cast("B")
+                continue
+            count = len(self._pending) if size < 0 else min(size, len(self._pending))
+            parts.append(self._pending[:count])
+            self._pending = self._pending[count:]
+            if size > 0:
+                size -= count
+        return b"".join(parts)
+
+
+@functools.lru_cache(maxsize=None)
+def streaming_supported():
+    """Check that ParamDictStream matches the runtime serialization."""
+    sample = {"a": ostar.nd.array(np.arange(6, dtype="float32").reshape(2, 3))}
+    expected = bytes(relay.save_param_dict(sample))
+    if ParamDictStream(sample).reader().read() == expected:
+        return True
+    logger.warning("unexpected params serialization format, params will not be streamed")
+    return False
+
+
+def param_dict_reader(params):
+    """Get a file-like object and the size of the serialized params dict.
+
+    Parameters
+    ----------
+    params : dict
+        Mapping from parameter names to NDArrays, NumPy arrays or LazyParams.
+
+    Returns
+    -------
+    reader : file-like
+        An object whose ``read`` method returns the serialized params.
+    size : int
+        The size of the serialized params, in bytes.
+    """
+    if streaming_supported():
+        stream = ParamDictStream(params)
+        return stream.reader(), stream.size
+    blob = relay.save_param_dict(
+        {
+            name: value.materialize() if isinstance(value, LazyParam) else value
+            for name, value in params.items()
+        }
+    )
+    return IterReader([blob]), len(blob)
+
+
+_DTYPE_NAMES = {code: name for name, code in _DTYPE_CODES.items()}
+
+
+def _dtype_name(code, bits, lanes):
+    if code == 1 and bits == 1:
+        dtype = "bool"
+    else:
+        dtype = f"{_DTYPE_NAMES[code]}{bits}"
+    return dtype if lanes == 1 else f"{dtype}x{lanes}"
+
+
+def parse_param_dict(buffer, offset=0):
+    """Parse the layout of a serialized params dict, without reading the tensors.
+
+    Parameters
+    ----------
+    buffer : buffer
+        A buffer (e.g. a memory map) holding the params dict, as written by
+        relay.save_param_dict.
+    offset : int, optional
+        The position of the params dict in ``buffer``.
+
+    Returns
+    -------
+    entries : list of tuple
+        The (name, dtype, shape, offset, nbytes) of each tensor, where
+        offset is the position of the tensor data in ``buffer``.
+    """
+    magic, _, num_names = struct.unpack_from("<QQQ", buffer, offset)
+    if magic != NDARRAY_LIST_MAGIC:
+        raise ValueError("Invalid params dict: bad magic number.")
+    offset += 24
+    names = []
+    for _ in range(num_names):
+        (length,) = struct.unpack_from("<Q", buffer, offset)
+        names.append(bytes(buffer[offset + 8 : offset + 8 + length]).decode("utf-8"))
+        offset += 8 + length
+    (num_arrays,) = struct.unpack_from("<Q", buffer, offset)
+    offset += 8
+    if num_arrays != num_names:
+        raise ValueError("Invalid params dict: names and arrays do not match.")
+
+    entries = []
+    for name in names:
+        magic, _, _, _, ndim = struct.unpack_from("<QQiii", buffer, offset)
+        if magic != NDARRAY_MAGIC:
+            raise ValueError(f"Invalid params dict: bad magic number for '{name}'.")
+        code, bits, lanes = struct.unpack_from("<BBH", buffer, offset + 28)
+        shape = struct.unpack_from(f"<{ndim}q", buffer, offset + 32)
+        (nbytes,) = struct.unpack_from("<q", buffer, offset + 32 + 8 * ndim)
+        offset += 40 + 8 * ndim
+        entries.append((name, _dtype_name(code, bits, lanes), tuple(shape), offset, nbytes))
+        offset += nbytes
+    return entries
+
+
+def numpy_view(buffer, dtype, shape, offset):
+    """Get tensor data held in a buffer as a NumPy array sharing its memory.
+
+    bfloat16 data, which NumPy has no dtype for, is viewed as uint16 bits.
+    """
+    dtype = "<u2" if dtype == "bfloat16" else np.dtype(dtype).newbyteorder("<")
+    count = int(np.prod(shape, dtype=np.int64))
+    return np.frombuffer(buffer, dtype, count, offset).reshape(shape)
+
+
+def tensor_from_buffer(buffer, dtype, shape, offset):
+    """Create an NDArray over tensor data held in a buffer, without copying when possible.
+
+    The runtime requires the data of an NDArray to be aligned to
+    `NDARRAY_ALIGNMENT` bytes. Tensors of legacy params files sit at
+    arbitrary offsets, so the data is copied when it is not aligned.
+    """
+    data = numpy_view(buffer, dtype, shape, offset)
+    if dtype == "bfloat16":
+        return ostar.nd.empty(shape, dtype).copyfrom(data)
+    if data.ctypes.data % NDARRAY_ALIGNMENT != 0:
+        return ostar.nd.array(np.array(data))
+    return ndarray_view(data)
+
+
+class LazyParamDict(Mapping):
+    """Read-only params dict whose NDArrays are created on first access.
+
+    The NDArrays share the memory of the buffer whenever the layout allows
+    it, see `ndarray_view`. Tensors whose data is not aligned in the buffer,
+    as in most legacy params files, are copied.
+
+    Parameters
+    ----------
+    buffer : buffer
+        A buffer (e.g. a memory map) holding a serialized params dict.
+    offset : int, optional
+        The position of the params dict in ``buffer``.
+    """
+
+    def __init__(self, buffer, offset=0):
+        self._buffer = buffer
+        self._entries = {entry[0]: entry[1:] for entry in parse_param_dict(buffer, offset)}
+        self._arrays = {}
+
+    def info(self, name):
+        """Get the dtype, shape, offset and size of a tensor, without reading it."""
+        dtype, shape, offset, nbytes = self._entries[name]
+        return {"dtype": dtype, "shape": list(shape), "offset": offset, "size": nbytes}
+
+    def view(self, name):
+        """Get a tensor as a NumPy array sharing the memory of the buffer.
+
+        No NDArray is created, so nothing is copied even when the tensor is
+        not aligned. bfloat16 tensors are viewed as their uint16 bits.
+        """
+        dtype, shape, offset, _ = self._entries[name]
+        return numpy_view(self._buffer, dtype, shape, offset)
+
+    def __getitem__(self, name):
+        if name not in self._arrays:
+            dtype, shape, offset, _ = self._entries[name]
+            self._arrays[name] = tensor_from_buffer(self._buffer, dtype, shape, offset)
+        return self._arrays[name]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def map_file_region(path, offset, size, writable=True):
+    """Memory-map a region of a file.
+
+    Parameters
+    ----------
+    path : str
+        The path to the file.
+    offset : int
+        The position of the region in the file.
+    size : int
+        The size of the region.
+    writable : bool, optional
+        Whether the mapping is a private, copy-on-write one. Otherwise it is
+        read-only, and shared with the other processes mapping the file.
+
+    Returns
+    -------
+    region : memoryview
+        A view of the region. The mapping stays alive as long as the view.
+    """
+    access = mmap.ACCESS_COPY if writable else mmap.ACCESS_READ
+    with open(path, "rb") as in_file:
+        mapped = mmap.mmap(in_file.fileno(), 0, access=access)
+    return memoryview(mapped)[offset : offset + size]
+
+
+# Indexed params container: a header holding a JSON index of the tensors,
+# followed by the tensor data, each tensor aligned for memory mapping.
+# Tensors can be split across several shard files, shard 0 being the file
+# holding the index. Each shard ends with a table of the CRC-32 of its
+# tensors, in index order, so that the checksums are computed while the
+# data is written.
+PARAMS_FORMATS = ["legacy", "indexed"]
+INDEXED_PARAMS_MAGIC = b"OSTARPRM"
+INDEXED_PARAMS_VERSION = 2
+DEFAULT_ALIGNMENT = 64
+_INDEXED_HEADER = struct.Struct("<8sIIQ")
+_CRC_TABLE = struct.Struct("<I")
+
+
+def _align(offset, alignment):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def is_indexed_params(buffer):
+    """Check whether a buffer starts with an indexed params container."""
+    return bytes(buffer[: len(INDEXED_PARAMS_MAGIC)]) == INDEXED_PARAMS_MAGIC
+
+
+def shard_name(name, shard):
+    """Get the file name of a shard of the container named ``name``."""
+    return name if shard == 0 else f"{name}.{shard}"
+
+
+class IndexedParamsStream(object):
+    """Serialize a params dict as an indexed, optionally sharded, container.
+
+    The layout is computed when the stream is created, so the size of each
+    shard is known before its data is produced. The checksums are computed
+    while the data is produced, so each param is only serialized (and each
+    LazyParam only materialized) once per shard written.
+
+    Parameters
+    ----------
+    params : dict
+        Mapping from parameter names to NDArrays, NumPy arrays or LazyParams.
+    name : str, optional
+        The file name of the container, used to name the shards.
+    shard_size : int, optional
+        Maximum size of the tensor data of a shard, in bytes. A tensor
+        larger than this gets a shard of its own. All tensors are stored
+        in a single file by default.
+    alignment : int, optional
+        Alignment of the tensor data, in bytes.
+    """
+
+    def __init__(self, params, name="model.params", shard_size=None, alignment=DEFAULT_ALIGNMENT):
+        self.params = params
+        self.alignment = alignment
+        tensors = []
+        shard_sizes = [0]
+        shard_counts = [0]
+        for param_name in params:
+            dtype, shape = _param_info(params, param_name)
+            nbytes = _tensor_nbytes(shape, dtype)
+            offset = _align(shard_sizes[-1], alignment)
+            if shard_size is not None and shard_sizes[-1] and offset + nbytes > shard_size:
+                shard_sizes.append(0)
+                shard_counts.append(0)
+                offset = 0
+            tensors.append(
+                {
+                    "name": param_name,
+                    "dtype": dtype,
+                    "shape": list(shape),
+                    "shard": len(shard_sizes) - 1,
+                    "offset": offset,
+                    "nbytes": nbytes,
+                }
+            )
+            shard_sizes[-1] = offset + nbytes
+            shard_counts[-1] += 1
+
+        checksums = [_align(size, _CRC_TABLE.size) for size in shard_sizes]
+        shard_sizes = [
+            offset + count * _CRC_TABLE.size for offset, count in zip(checksums, shard_counts)
+        ]
+        self.index = {
+            "alignment": alignment,
+            "shards": [shard_name(name, shard) for shard in range(len(shard_sizes))],
+            "checksums": checksums,
+            "tensors": tensors,
+        }
+        index_bytes = json.dumps(self.index).encode("utf-8")
+        header = _INDEXED_HEADER.pack(
+            INDEXED_PARAMS_MAGIC, INDEXED_PARAMS_VERSION, alignment, len(index_bytes)
+        )
+        header += index_bytes
+        self._header = header + bytes(_align(len(header), alignment) - len(header))
+        self.shard_sizes = [len(self._header) + shard_sizes[0]] + shard_sizes[1:]
+
+    @property
+    def num_shards(self):
+        return len(self.shard_sizes)
+
+    def chunks(self, shard=0):
+        """Generate the contents of a shard, in chunks."""
+        position = 0
+        if shard == 0:
+            yield self._header
+        checksums = []
+        for tensor in self.index["tensors"]:
+            if tensor["shard"] != shard:
+                continue
+            yield bytes(tensor["offset"] - position)
+            data = _param_data(self.params, tensor["name"])
+            checksum = 0
+            for start in range(0, tensor["nbytes"], _CHUNK_SIZE):
+                chunk = data[start : start + _CHUNK_SIZE]
+                checksum = zlib.crc32(chunk, checksum)
+                yield chunk
+            checksums.append(checksum)
+            position = tensor["offset"] + tensor["nbytes"]
+        yield bytes(self.index["checksums"][shard] - position)
+        yield b"".join(_CRC_TABLE.pack(checksum) for checksum in checksums)
+
+    def reader(self, shard=0):
+        """Get a file-like object reading the contents of a shard."""
+        return IterReader(self.chunks(shard))
+
+
+def save_indexed_params(params, path, shard_size=None, alignment=DEFAULT_ALIGNMENT):
+    """Save a params dict as an indexed container.
+
+    Parameters
+    ----------
+    params : dict
+        Mapping from parameter names to NDArrays, NumPy arrays or LazyParams.
+    path : str
+        The path of the container. Additional shards are written next to it,
+        with the shard number appended to the name.
+    shard_size : int, optional
+        Maximum size of the tensor data of a shard, in bytes.
+    alignment : int, optional
+        Alignment of the tensor data, in bytes.
+
+    Returns
+    -------
+    paths : list of str
+        The paths of the files written, starting with ``path``.
+    """
+    stream = IndexedParamsStream(params, os.path.basename(path), shard_size, alignment)
+    paths = []
+    for shard in range(stream.num_shards):
+        shard_path = os.path.join(os.path.dirname(path), stream.index["shards"][shard])
+        with open(shard_path, "wb") as shard_file:
+            for chunk in stream.chunks(shard):
+                shard_file.write(chunk)
+        paths.append(shard_path)
+    return paths
+
+
+class IndexedParamsReader(Mapping):
+    """Random-access reader of an indexed params container.
+
+    It is also a read-only params dict, whose NDArrays are created on first
+    access and share the memory of the container when possible.
+
+    Parameters
+    ----------
+    buffer : buffer
+        A buffer (e.g. a memory map) holding the container.
+    open_shard : Callable[[str], buffer], optional
+        Function returning the buffer of a shard given its name. Needed
+        only for sharded containers.
+    """
+
+    def __init__(self, buffer, open_shard=None):
+        magic, version, _, index_size = _INDEXED_HEADER.unpack_from(buffer, 0)
+        if magic != INDEXED_PARAMS_MAGIC:
+            raise ValueError("Invalid indexed params container: bad magic number.")
+        if version != INDEXED_PARAMS_VERSION:
+            raise ValueError(f"Unsupported indexed params version {version}.")
+        index_end = _INDEXED_HEADER.size + index_size
+        self.index = json.loads(bytes(buffer[_INDEXED_HEADER.size : index_end]).decode("utf-8"))
+        self._tensors = {tensor["name"]: tensor for tensor in self.index["tensors"]}
+        # Position of the checksum of each tensor in the table of its shard.
+        self._checksum_slots = {}
+        shard_counts = [0] * len(self.index["shards"])
+        for tensor in self.index["tensors"]:
+            self._checksum_slots[tensor["name"]] = shard_counts[tensor["shard"]]
+            shard_counts[tensor["shard"]] += 1
+        self._data_start = [_align(index_end, self.index["alignment"])] + [0] * (
+            len(self.index["shards"]) - 1
+        )
+        self._shards = [buffer] + [None] * (len(self.index["shards"]) - 1)
+        self._open_shard = open_shard
+        self._arrays = {}
+
+    @classmethod
+    def open(cls, path):
+        """Open a container file, memory-mapping it and its shards."""
+        base_dir = os.path.dirname(path)
+
+        def _open_shard(name):
+            shard_path = os.path.join(base_dir, name)
+            return map_file_region(shard_path, 0, os.path.getsize(shard_path))
+
+        return cls(map_file_region(path, 0, os.path.getsize(path)), _open_shard)
+
+    def _shard_buffer(self, shard):
+        if self._shards[shard] is None:
+            if self._open_shard is None:
+                raise ValueError("Reading a sharded container requires a way to open the shards.")
+            self._shards[shard] = self._open_shard(self.index["shards"][shard])
+        return self._shards[shard]
+
+    def _checksum(self, name):
+        shard = self._tensors[name]["shard"]
+        offset = (
+            self._data_start[shard]
+            + self.index["checksums"][shard]
+            + self._checksum_slots[name] * _CRC_TABLE.size
+        )
+        return _CRC_TABLE.unpack_from(self._shard_buffer(shard), offset)[0]
+
+    def info(self, name):
+        """Get the dtype, shape, shard, offset, size and checksum of a tensor."""
+        return dict(self._tensors[name], crc32=self._checksum(name))
+
+    def read(self, name, verify=False):
+        """Read a single tensor.
+
+        Parameters
+        ----------
+        name : str
+            The name of the tensor.
+        verify : bool, optional
+            Check the tensor data against its checksum.
+
+        Returns
+        -------
+        array : ostar.nd.NDArray
+            The tensor, sharing the memory of the container when possible.
+        """
+        tensor = self._tensors[name]
+        buffer = self._shard_buffer(tensor["shard"])
+        offset = self._data_start[tensor["shard"]] + tensor["offset"]
+        if verify:
+            data = memoryview(buffer)[offset : offset + tensor["nbytes"]]
+            if zlib.crc32(data) != self._checksum(name):
+                raise ValueError(f"Checksum mismatch for param '{name}'.")
+        return tensor_from_buffer(buffer, tensor["dtype"], tuple(tensor["shape"]), offset)
+
+    def view(self, name):
+        """Get a tensor as a NumPy array sharing the memory of the container.
+
+        Unlike `read`, no NDArray is created, so nothing is copied even
+        when the tensor is not aligned. bfloat16 tensors are viewed as
+        their uint16 bits.
+        """
+        tensor = self._tensors[name]
+        offset = self._data_start[tensor["shard"]] + tensor["offset"]
+        return numpy_view(
+            self._shard_buffer(tensor["shard"]), tensor["dtype"], tuple(tensor["shape"]), offset
+        )
+
+    def read_all(self, num_threads=None, verify=False):
+        """Read all the tensors, using several threads.
+
+        Returns
+        -------
+        params : dict
+            Mapping from parameter names to NDArrays.
+        """
+        names = list(self._tensors)
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            arrays = executor.map(lambda name: self.read(name, verify), names)
+            return dict(zip(names, arrays))
+
+    def to_param_dict_bytes(self):
+        """Serialize the params in the relay.save_param_dict format."""
+        return relay.save_param_dict(dict(self.items()))
+
+    def __getitem__(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = self.read(name)
+        return self._arrays[name]
+
+    def __iter__(self):
+        return iter(self._tensors)
+
+    def __len__(self):
+        return len(self._tensors)
+
+
+def _aligned_buffer(size, alignment):
+    """Allocate a zero-initialized byte buffer whose start is aligned."""
+    raw = np.zeros(size + alignment, dtype="uint8")
+    start = -raw.ctypes.data % alignment
+    return raw[start : start + size]
+
+
+class ParamArena(IndexedParamsReader):
+    """Params packed in a single aligned, contiguous buffer.
+
+    The buffer holds an unsharded indexed container, and each param is an
+    NDArray view of its aligned region, so the params cost one allocation
+    instead of one per tensor, are saved with a single write and loaded
+    with a single read or a memory map.
+
+    Parameters
+    ----------
+    buffer : buffer
+        A writable buffer holding an unsharded indexed container.
+    """
+
+    def __init__(self, buffer):
+        super(ParamArena, self).__init__(buffer)
+        if len(self.index["shards"]) > 1:
+            raise ValueError("A params arena cannot be sharded.")
+        self.buffer = buffer
+
+    @property
+    def nbytes(self):
+        return len(memoryview(self.buffer))
+
+    @classmethod
+    def pack(cls, params, alignment=DEFAULT_ALIGNMENT):
+        """Pack a params dict into an arena.
+
+        Parameters
+        ----------
+        params : dict
+            Mapping from parameter names to NDArrays, NumPy arrays or LazyParams.
+        alignment : int, optional
+            Alignment of the buffer and of each tensor, in bytes.
+        """
+        stream = IndexedParamsStream(params, alignment=alignment)
+        buffer = _aligned_buffer(stream.shard_sizes[0], alignment)
+        view = memoryview(buffer)
+        position = 0
+        for chunk in stream.chunks():
+            view[position : position + len(chunk)] = chunk
+            position += len(chunk)
+        logger.debug("packed %d params into a %d bytes arena", len(params), len(buffer))
+        return cls(buffer)
+
+    @classmethod
+    def load(cls, path, mmap_file=False):
+        """Load an arena saved with `save`, or any unsharded indexed container.
+
+        Parameters
+        ----------
+        path : str
+            The path to the container.
+        mmap_file : bool, optional
+            Map the file, copy-on-write, instead of reading it.
+        """
+        size = os.path.getsize(path)
+        if mmap_file:
+            return cls(map_file_region(path, 0, size))
+        with open(path, "rb") as in_file:
+            _, _, alignment, _ = _INDEXED_HEADER.unpack(in_file.read(_INDEXED_HEADER.size))
+            in_file.seek(0)
+            buffer = _aligned_buffer(size, alignment)
+            in_file.readinto(memoryview(buffer))
+        return cls(buffer)
+
+    def reader(self):
+        """Get a file-like object reading the arena."""
+        view = memoryview(self.buffer)
+        return IterReader(
+            view[start : start + _CHUNK_SIZE] for start in range(0, len(view), _CHUNK_SIZE)
+        )
+
+    def save(self, path):
+        """Save the arena, with a single write."""
+        with open(path, "wb") as out_file:
+            out_file.write(memoryview(self.buffer))
+
+
+def load_params(buffer, open_shard=None):
+    """Load a params dict saved in either the indexed or the relay.save_param_dict format.
+
+    Parameters
+    ----------
+    buffer : buffer
+        The serialized params.
+    open_shard : Callable[[str], buffer], optional
+        Function returning the buffer of a shard of an indexed container.
+
+    Returns
+    -------
+    params : Mapping
+        Mapping from parameter names to NDArrays.
+    """
+    if is_indexed_params(buffer):
+        return IndexedParamsReader(buffer, open_shard)
+    return relay.load_param_dict(bytearray(buffer))
+
+
+def params_to_bytes(buffer):
+    """Convert serialized params to the relay.save_param_dict format, if needed."""
+    if is_indexed_params(buffer):
+        return IndexedParamsReader(buffer).to_param_dict_bytes()
+    return buffer
@@ -0,0 +1,411 @@
+"""
+Helpers to build and transform the parameter dictionaries of OSTARC models.
+"""
+import logging
+
+import numpy as np
+
+import ostar
+from ostar import relay
+
+
+# pylint: disable=invalid-name
+logger = logging.getLogger("OSTARC")
+
+# Alignment the runtime requires from the data of NDArrays (kAllocAlignment).
+NDARRAY_ALIGNMENT = 64
+
+
+def ndarray_view(array: np.ndarray):
+    """Wrap a NumPy array into an NDArray, sharing its memory when possible.
+
+    The array is handed over through DLPack, which keeps it (and whatever
+    buffer backs it, e.g. a memory map) alive as long as the NDArray. A copy
+    is made when the array is not contiguous, its data is not aligned to
+    `NDARRAY_ALIGNMENT` bytes (e.g. a tensor at an arbitrary offset of a
+    memory-mapped file), it is read-only, the installed NumPy has no DLPack
+    support or the runtime rejects the buffer.
+
+    Parameters
+    ----------
+    array : np.ndarray
+        The array to wrap.
+
+    Returns
+    -------
+    ndarray : ostar.nd.NDArray
+        An NDArray with the same contents as ``array``.
+    """
+    flags = array.flags
+    if (
+        hasattr(array, "__dlpack__")
+        and flags["C_CONTIGUOUS"]
+        and flags["WRITEABLE"]
+        and array.dtype.isnative
+        and array.ctypes.data % NDARRAY_ALIGNMENT == 0
+    ):
+        try:
+            return ostar.nd.from_dlpack(array.__dlpack__())
+        # pylint: disable=protected-access
+        except (BufferError, TypeError, ValueError, ostar._ffi.base.OSTARError):
+            pass
+    return ostar.nd.array(np.ascontiguousarray(array))
+
+
+def _aligned_zeros(shape, dtype):
+    """Allocate a zero-filled array whose data is aligned to `NDARRAY_ALIGNMENT` bytes.
+
+    np.zeros only guarantees the alignment of the dtype, so the buffer is
+    over-allocated and sliced at an aligned offset. Large buffers are still
+    backed by untouched zero pages.
+    """
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+    raw = np.zeros(nbytes + NDARRAY_ALIGNMENT, dtype="uint8")
+    start = -raw.ctypes.data % NDARRAY_ALIGNMENT
+    return raw[start : start + nbytes].view(dtype).reshape(shape)
+
+
+class LazyParam(object):
+    """Placeholder for a parameter that only records its shape and dtype.
+
+    The data is generated the first time it is requested, either as zeros
+    (backed by untouched zero pages) or as seeded pseudo-random values,
+    generated in chunks to bound the temporary memory.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        The shape of the parameter.
+    dtype : str
+        The data type of the parameter.
+    fill : str, optional
+        How to generate the data, either "zeros" or "random".
+    seed : int, optional
+        Seed used when ``fill`` is "random".
+    """
+
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, shape, dtype, fill="zeros", seed=0):
+        if fill not in ("zeros", "random"):
+            raise ValueError(f"Unsupported fill '{fill}', expected 'zeros' or 'random'.")
+        self.shape = tuple(int(dim) for dim in shape)
+        self.dtype = str(dtype)
+        self.fill = fill
+        self.seed = seed
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    @property
+    def nbytes(self):
+        return self.size * np.dtype(self.dtype).itemsize
+
+    def numpy(self):
+        """Generate the data as a NumPy array, aligned so `materialize` does not copy it."""
+        data = _aligned_zeros((self.size,), self.dtype)
+        if self.fill == "zeros":
+            return data.reshape(self.shape)
+
+        rng = np.random.default_rng(self.seed)
+        for start in range(0, self.size, self.CHUNK_SIZE):
+            count = min(self.CHUNK_SIZE, self.size - start)
+            if "int" in self.dtype:
+                data[start : start + count] = rng.integers(128, size=count)
+            else:
+                data[start : start + count] = rng.uniform(-1, 1, size=count)
+        return data.reshape(self.shape)
+
+    def materialize(self):
+        """Generate the data as an NDArray."""
+        return ndarray_view(self.numpy())
+
+    def to_dict(self):
+        """Describe the placeholder as a JSON-serializable dict of its arguments."""
+        return {
+            "shape": list(self.shape),
+            "dtype": self.dtype,
+            "fill": self.fill,
+            "seed": self.seed,
+        }
+
+    def __repr__(self):
+        return f"LazyParam(shape={self.shape}, dtype={self.dtype}, fill={self.fill})"
+
+
+def materialize_params(params):
+    """Replace the LazyParam placeholders of a params dict by actual data.
+
+    Parameters
+    ----------
+    params : dict
+        Mapping from parameter names to NDArrays, NumPy arrays or LazyParams.
+
+    Returns
+    -------
+    params : dict
+        A new dict where every LazyParam has been materialized. Other
+        values are returned as they are.
+    """
+    return {
+        name: value.materialize() if isinstance(value, LazyParam) else value
+        for name, value in params.items()
+    }
+
+
+def split_lazy_params(params):
+    """Separate the LazyParam placeholders of a params dict from the params with data.
+
+    Parameters
+    ----------
+    params : dict
+        Mapping from parameter names to NDArrays, NumPy arrays or LazyParams.
+
+    Returns
+    -------
+    params : dict
+        The params with data. ``params`` itself when it has no placeholders.
+    placeholders : dict
+        Mapping from parameter names to LazyParams.
+    """
+    # Lazily loaded params dicts never hold placeholders, and iterating
+    # over their values would create their NDArrays.
+    if hasattr(params, "info"):
+        return params, {}
+    placeholders = {
+        name: value for name, value in params.items() if isinstance(value, LazyParam)
+    }
+    if not placeholders:
+        return params, {}
+    return {name: value for name, value in params.items() if name not in placeholders}, placeholders
+
+
+def rebind_main(mod, new_params, binds):
+    """Rebuild the main function of a module with new params.
+
+    Parameters
+    ----------
+    mod : ostar.IRModule
+        The module whose main function is rebuilt. It is not modified.
+    new_params : list of relay.Var
+        The params of the new main function.
+    binds : dict
+        Mapping from the params of the main function to the expressions
+        replacing them in its body.
+
+    Returns
+    -------
+    mod : ostar.IRModule
+        A new module with the rebuilt main function, with types inferred.
+    """
+    main_func = mod["main"]
+    new_func = relay.Function(
+        new_params,
+        relay.bind(main_func.body, binds),
+        None,
+        main_func.type_params,
+        main_func.attrs,
+    )
+    mod = ostar.IRModule(dict(mod.functions.items()), mod.type_definitions)
+    mod["main"] = new_func
+    return relay.transform.InferType()(mod)
+
+
+def _as_numpy(value):
+    """Get the data of a param as a NumPy array."""
+    if isinstance(value, np.ndarray):
+        return value
+    return value.numpy()
+
+
+def _nbytes(value):
+    """Get the size of the data of a param, in bytes."""
+    dtype = str(value.dtype)
+    itemsize = 2 if dtype == "bfloat16" else np.dtype(dtype).itemsize
+    return int(np.prod(value.shape, dtype=np.int64)) * itemsize
+
+
+def _float_to_bfloat16_bits(array):
+    """Round float32 data to bfloat16, returning the bits as uint16."""
+    array = np.ascontiguousarray(array, dtype="float32")
+    bits = array.view("uint32")
+    # Round to nearest even. NaNs are kept as quiet NaNs instead, as rounding
+    # their mantissa could turn them into infinities.
+    rounded = (bits + np.uint32(0x7FFF) + ((bits >> np.uint32(16)) & np.uint32(1))) >> np.uint32(16)
+    quiet_nan = (bits >> np.uint32(16)) | np.uint32(0x40)
+    return np.where(np.isnan(array), quiet_nan, rounded).astype("uint16")
+
+
+def _cast_param(value, dtype):
+    if isinstance(value, LazyParam):
+        return LazyParam(value.shape, dtype, fill=value.fill, seed=value.seed)
+    data = _as_numpy(value)
+    if dtype == "bfloat16":
+        return ostar.nd.empty(data.shape, "bfloat16").copyfrom(_float_to_bfloat16_bits(data))
+    return ostar.nd.array(data.astype(dtype))
+
+
+def cast_params_storage(mod, params, dtype="float16"):
+    """Store the float32 params of a model in a smaller floating point type.
+
+    The params are converted one at a time and, in the main function of the
+    module, each converted param is cast back to float32 where it is used,
+    so the model computes the same thing with half the params footprint.
+
+    Bound as constants, the converted params would be cast back by constant
+    folding at build time, so they must stay inputs of the built module;
+    see `storage_param_names`.
+
+    Parameters
+    ----------
+    mod : ostar.IRModule
+        The module using the params.
+    params : dict
+        The params of the module. Converted params are replaced in place.
+    dtype : str, optional
+        The storage type, either "float16" or "bfloat16".
+
+    Returns
+    -------
+    mod : ostar.IRModule
+        The module with the casts inserted.
+    """
+    if dtype not in ("float16", "bfloat16"):
+        raise ValueError(f"Unsupported storage type '{dtype}', expected float16 or bfloat16.")
+
+    main_func = mod["main"]
+    binds = {}
+    new_params = []
+    saved_bytes = 0
+    for param in main_func.params:
+        name = param.name_hint
+        param_type = param.type_annotation
+        if name not in params or param_type is None or param_type.dtype != "float32":
+            new_params.append(param)
+            continue
+        new_param = relay.var(name, shape=param_type.shape, dtype=dtype)
+        binds[param] = relay.cast(new_param, "float32")
+        new_params.append(new_param)
+        params[name] = _cast_param(params[name], dtype)
+        saved_bytes += int(np.prod(params[name].shape, dtype=np.int64)) * 2
+
+    if not binds:
+        return mod
+
+    logger.info(
+        "stored %d params as %s, saving %.1f MiB", len(binds), dtype, saved_bytes / 2**20
+    )
+    return rebind_main(mod, new_params, binds)
+
+
+def storage_param_names(mod, params):
+    """Find the params stored in a smaller type by `cast_params_storage`.
+
+    These are the float16 and bfloat16 params of the main function that are
+    cast to float32 where they are used. If they were bound to the module
+    when building it, FoldConstant would evaluate the casts and the built
+    module would hold float32 copies of them, so they are left as inputs
+    and passed along with the params of the built module instead.
+
+    Parameters
+    ----------
+    mod : ostar.IRModule
+        The module using the params.
+    params : dict
+        The params of the module.
+
+    Returns
+    -------
+    names : list of str
+        The names of the params kept in their storage type.
+    """
+    main_func = mod["main"]
+    candidates = {
+        param.name_hint
+        for param in main_func.params
+        if param.name_hint in params
+        and param.type_annotation is not None
+        and getattr(param.type_annotation, "dtype", None) in ("float16", "bfloat16")
+    }
+    cast_op = relay.op.get("cast")
+    names = set()
+
+    def visit(expr):
+        if (
+            isinstance(expr, relay.Call)
+            and expr.op == cast_op
+            and expr.attrs.dtype == "float32"
+            and isinstance(expr.args[0], relay.Var)
+            and expr.args[0].name_hint in candidates
+        ):
+            names.add(expr.args[0].name_hint)
+
+    relay.analysis.post_order_visit(main_func.body, visit)
+    return [param.name_hint for param in main_func.params if param.name_hint in names]
+
+
+def dedup_params(mod, params):
+    """Make params with identical contents share a single entry.
+
+    Params of the main function are grouped by dtype and shape, and the
+    contents of the params sharing a group are hashed. Every duplicate is
+    replaced in the graph by the first param with the same contents and
+    removed from ``params``, so it is only saved and exported once.
+
+    Parameters
+    ----------
+    mod : ostar.IRModule
+        The module using the params.
+    params : dict
+        The params of the module. Duplicates are removed in place.
+
+    Returns
+    -------
+    mod : ostar.IRModule
+        The module where duplicates are replaced.
+    report : dict
+        The mapping from each removed param to the param it now refers to,
+        and the number of bytes saved.
+    """
+    # pylint: disable=import-outside-toplevel
+    from ostar.driver.ostarc.param_io import tensor_digest
+
+    main_func = mod["main"]
+    groups = {}
+    for param in main_func.params:
+        value = params.get(param.name_hint)
+        if value is None or isinstance(value, LazyParam):
+            continue
+        key = (str(value.dtype), tuple(value.shape))
+        groups.setdefault(key, []).append(param)
+
+    binds = {}
+    aliases = {}
+    saved_bytes = 0
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        canonical = {}
+        for param in group:
+            value = params[param.name_hint]
+            digest = tensor_digest(value)
+            if digest not in canonical:
+                canonical[digest] = param
+                continue
+            binds[param] = canonical[digest]
+            aliases[param.name_hint] = canonical[digest].name_hint
+            saved_bytes += _nbytes(value)
+
+    report = {"aliases": aliases, "saved_bytes": saved_bytes}
+    if not binds:
+        return mod, report
+
+    mod = rebind_main(mod, [param for param in main_func.params if param not in binds], binds)
+    for name in aliases:
+        del params[name]
+    logger.info(
+        "deduplicated %d params, saving %.1f MiB", len(aliases), saved_bytes / 2**20
+    )
+    return mod, report
@@ -0,0 +1,144 @@
+"""
+Per-stage time and memory profiling of model imports.
+"""
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# pylint: disable=invalid-name
+logger = logging.getLogger("OSTARC")
+
+# The profile collecting the stages of the import in progress, if any.
+_active_profile = None
+
+
+def _peak_rss():
+    """Peak resident set size of the process so far, in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _current_rss():
+    """Current resident set size of the process, in bytes."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _delta(after, before):
+    if after is None or before is None:
+        return None
+    return after - before
+
+
+class ImportProfile(object):
+    """Timings and memory usage of the stages of a model import.
+
+    Each stage records its wall time, the change of the resident set size
+    and how much it raised the peak resident set size of the process.
+
+    Parameters
+    ----------
+    path : str, optional
+        The path to the imported model.
+    frontend : str, optional
+        The name of the frontend used for the import.
+    """
+
+    def __init__(self, path=None, frontend=None):
+        self.path = path
+        self.frontend = frontend
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Context manager measuring a stage of the import."""
+        rss_before = _current_rss()
+        peak_before = _peak_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append(
+                {
+                    "stage": name,
+                    "time": time.perf_counter() - start,
+                    "rss_delta": _delta(_current_rss(), rss_before),
+                    "peak_rss_delta": _delta(_peak_rss(), peak_before),
+                }
+            )
+
+    @property
+    def total_time(self):
+        return sum(stage["time"] for stage in self.stages)
+
+    def to_dict(self):
+        """Get the profile as a dict."""
+        return {
+            "path": self.path,
+            "frontend": self.frontend,
+            "total_time": self.total_time,
+            "peak_rss": _peak_rss(),
+            "stages": list(self.stages),
+        }
+
+    def to_json_lines(self):
+        """Get the profile as JSON lines, one per stage."""
+        common = {"path": self.path, "frontend": self.frontend}
+        return "".join(json.dumps({**common, **stage}) + "\n" for stage in self.stages)
+
+    def dump(self, path):
+        """Append the profile to a JSON lines file."""
+        with open(path, "a") as profile_file:
+            profile_file.write(self.to_json_lines())
+
+    def __str__(self):
+        lines = [f"Import profile of {self.path} ({self.frontend}):"]
+        for stage in self.stages:
+            peak = stage["peak_rss_delta"]
+            peak = "n/a" if peak is None else f"{peak / 2**20:.1f} MiB"
+            lines.append(f"  {stage['stage']:<16} {stage['time']:10.3f} s  peak +{peak}")
+        lines.append(f"  {'total':<16} {self.total_time:10.3f} s")
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def profile_import(profile):
+    """Make ``profile`` collect the stages recorded by `profile_stage`."""
+    global _active_profile  # pylint: disable=global-statement
+    previous, _active_profile = _active_profile, profile
+    try:
+        yield profile
+    finally:
+        _active_profile = previous
+
+
+@contextlib.contextmanager
+def profile_stage(name):
+    """Record a stage of the current import, if it is being profiled.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage, e.g. "file_read", "deserialize", "convert"
+        or "params".
+    """
+    if _active_profile is None:
+        yield
+    else:
+        with _active_profile.stage(name):
+            yield
@@ -0,0 +1,172 @@
+"""
+Quantitative statistics of OSTARC models.
+"""
+import heapq
+import json
+import logging
+from collections import Counter
+
+import numpy as np
+
+import ostar
+from ostar import relay
+from ostar.driver.ostarc.params import LazyParam
+
+
+# pylint: disable=invalid-name
+logger = logging.getLogger("OSTARC")
+
+
+def _nbytes(shape, dtype):
+    dtype = str(dtype)
+    itemsize = 2 if dtype == "bfloat16" else np.dtype(dtype).itemsize
+    return int(np.prod([int(dim) for dim in shape], dtype=np.int64)) * itemsize
+
+
+class ModelSummary(object):
+    """Statistics of a model, computed without printing its IR.
+
+    Attributes
+    ----------
+    ops : dict
+        Number of calls of each operator, or of each global function for
+        calls to ``@name``.
+    nodes : dict
+        Number of IR nodes of each kind (Call, Var, Constant, ...).
+    num_functions : int
+        Number of Relay functions in the module.
+    param_bytes : dict
+        Total size of the params by dtype, in bytes.
+    constant_bytes : dict
+        Total size of the constants embedded in the IR by dtype, in bytes.
+    largest_tensors : list of dict
+        The largest params and constants, by decreasing size.
+    macs : int or None
+        Multiply-accumulate count of the main function, when it can be
+        computed.
+    """
+
+    def __init__(self):
+        self.ops = Counter()
+        self.nodes = Counter()
+        self.num_functions = 0
+        self.param_bytes = Counter()
+        self.constant_bytes = Counter()
+        self.largest_tensors = []
+        self.macs = None
+
+    @property
+    def total_param_bytes(self):
+        return sum(self.param_bytes.values())
+
+    def to_dict(self):
+        """Get the statistics as a dict."""
+        return {
+            "ops": dict(self.ops.most_common()),
+            "nodes": dict(self.nodes.most_common()),
+            "num_functions": self.num_functions,
+            "param_bytes": dict(self.param_bytes),
+            "total_param_bytes": self.total_param_bytes,
+            "constant_bytes": dict(self.constant_bytes),
+            "largest_tensors": list(self.largest_tensors),
+            "macs": self.macs,
+        }
+
+    def to_json(self):
+        """Get the statistics as JSON."""
+        return json.dumps(self.to_dict(), indent=2)
+
+    def __str__(self):
+        lines = [
+            f"Functions: {self.num_functions}, IR nodes: {sum(self.nodes.values())}",
+            "MACs: " + ("n/a" if self.macs is None else f"{self.macs:,}"),
+            f"Params: {self.total_param_bytes / 2**20:.2f} MiB",
+        ]
+        for dtype, size in sorted(self.param_bytes.items()):
+            lines.append(f"  {dtype:<12} {size / 2**20:12.2f} MiB")
+        if self.constant_bytes:
+            lines.append(f"Constants: {sum(self.constant_bytes.values()) / 2**20:.2f} MiB")
+        lines.append("Ops:")
+        for op_name, count in self.ops.most_common():
+            lines.append(f"  {op_name:<40} {count:8d}")
+        lines.append("Largest tensors:")
+        for tensor in self.largest_tensors:
+            lines.append(
+                f"  {tensor['name']:<40} {str(tensor['shape']):<24} "
+                f"{tensor['dtype']:<10} {tensor['nbytes'] / 2**20:10.2f} MiB"
+            )
+        return "\n".join(lines)
+
+
+def summarize_model(mod, params=None, top_k=10):
+    """Compute the statistics of a model.
+
+    The IR is traversed once per function with post_order_visit, and the
+    params are only inspected through their shape and dtype, so neither
+    the IR is printed nor lazily loaded params are read.
+
+    Parameters
+    ----------
+    mod : ostar.IRModule
+        The module of the model.
+    params : dict, optional
+        The params of the model.
+    top_k : int, optional
+        The number of largest tensors to report.
+
+    Returns
+    -------
+    summary : ModelSummary
+        The statistics of the model.
+    """
+    summary = ModelSummary()
+    tensors = []
+
+    params = params or {}
+    for name in params:
+        # Lazily loaded params dicts describe their tensors without reading them.
+        value = params.info(name) if hasattr(params, "info") else params[name]
+        if isinstance(value, dict):
+            shape, dtype = [int(dim) for dim in value["shape"]], str(value["dtype"])
+        else:
+            shape, dtype = [int(dim) for dim in value.shape], str(value.dtype)
+        nbytes = value.nbytes if isinstance(value, LazyParam) else _nbytes(shape, dtype)
+        summary.param_bytes[dtype] += nbytes
+        tensors.append({"name": name, "shape": shape, "dtype": dtype, "nbytes": nbytes})
+
+    def _visit(node):
+        summary.nodes[type(node).__name__] += 1
+        if isinstance(node, relay.Call):
+            if isinstance(node.op, ostar.ir.Op):
+                summary.ops[node.op.name] += 1
+            elif isinstance(node.op, ostar.ir.GlobalVar):
+                summary.ops["@" + node.op.name_hint] += 1
+        elif isinstance(node, relay.Constant):
+            shape = [int(dim) for dim in node.data.shape]
+            dtype = str(node.data.dtype)
+            nbytes = _nbytes(shape, dtype)
+            summary.constant_bytes[dtype] += nbytes
+            tensors.append(
+                {
+                    "name": f"constant_{summary.nodes['Constant'] - 1}",
+                    "shape": shape,
+                    "dtype": dtype,
+                    "nbytes": nbytes,
+                }
+            )
+
+    for global_var, func in mod.functions.items():
+        if not isinstance(func, relay.Function):
+            continue
+        summary.num_functions += 1
+        relay.analysis.post_order_visit(func, _visit)
+        logger.debug("summarized function %s", global_var.name_hint)
+
+    summary.largest_tensors = heapq.nlargest(top_k, tensors, key=lambda tensor: tensor["nbytes"])
+
+    try:
+        main = relay.transform.InferType()(mod)["main"]
+        summary.macs = int(relay.analysis.get_total_mac_number(main))
+    except (ostar.error.OSTARError, ValueError) as error:
+        logger.debug("could not count the MACs: %s", error)
+    return summary
@@ -1,12 +1,18 @@
 import os
+import copy
+import functools
+import hashlib
 import logging
 import json
 import re
+import threading
+from collections import OrderedDict
 
 import ostar
 from ostar.driver import ostarc
 from ostar.driver.ostarc import OSTARCException
 from ostar.driver.ostarc.composite_target import get_codegen_by_target, get_codegen_names
+from ostar.driver.ostarc.host_cpu import NATIVE_TARGET, detect_host_cpu
 from ostar.ir.attrs import make_node, _ffi_api as attrs_api
 from ostar.ir.transform import PassContext
 from ostar.target import Target, TargetKind
@@ -26,34 +32,128 @@ def _valid_target_kinds():
     return filter(lambda target: target not in codegen_names, Target.list_kinds())
 
 
-def _generate_target_kind_args(parser, kind_name):
-    target_group = parser.add_argument_group(f"target {kind_name}")
+# Maximum number of entries of the parsed and interned target caches.
+TARGET_CACHE_SIZE = 256
+
+# Resolved targets keyed on the target string and the additional options,
+# and Targets interned on their canonical string, see `target_from_cli`.
+_target_cache = OrderedDict()
+_interned_targets = OrderedDict()
+_target_cache_lock = threading.Lock()
+
+# Cache of the target and codegen options schema, see `get_target_args_schema`.
+TARGET_ARGS_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join("~", ".cache")), "ostar", "target_args.json"
+)
+
+NATIVE_TYPE_NAMES = {str: "str", int: "int"}
+NATIVE_TYPES = {"str": str, "int": int}
+
+
+def _target_kind_schema(kind_name):
+    options = []
     for target_option, target_type in TargetKind.options_from_name(kind_name).items():
         if target_type in INTERNAL_TO_NATIVE_TYPE:
-            target_group.add_argument(
-                f"--target-{kind_name}-{target_option}",
-                type=INTERNAL_TO_NATIVE_TYPE[target_type],
-                help=f"target {kind_name} {target_option}{INTERNAL_TO_HELP[target_type]}",
+            options.append(
+                {
+                    "name": target_option,
+                    "type": NATIVE_TYPE_NAMES[INTERNAL_TO_NATIVE_TYPE[target_type]],
+                    "help": f"target {kind_name} {target_option}{INTERNAL_TO_HELP[target_type]}",
+                }
             )
+    return {"name": kind_name, "options": options}
 
 
-def _generate_codegen_args(parser, codegen_name):
+def _codegen_schema(codegen_name, pass_configs):
     codegen = get_codegen_by_target(codegen_name)
+    if codegen["config_key"] is None or codegen["config_key"] not in pass_configs:
+        return None
+
+    options = []
+    attrs = make_node(pass_configs[codegen["config_key"]]["type"])
+    fields = attrs_api.AttrsListFieldInfo(attrs)
+    for field in fields:
+        for ostar_type, python_type in INTERNAL_TO_NATIVE_TYPE.items():
+            if field.type_info.startswith(ostar_type):
+                options.append(
+                    {
+                        "name": str(field.name),
+                        "type": NATIVE_TYPE_NAMES[python_type],
+                        "help": str(field.description),
+                    }
+                )
+    return {"name": codegen_name, "options": options}
+
+
+def _build_target_args_schema():
+    """Walk the TargetKind and codegen registries to list the options of each target."""
+    schema = [_target_kind_schema(target_kind) for target_kind in _valid_target_kinds()]
     pass_configs = PassContext.list_configs()
+    for codegen_name in get_codegen_names():
+        codegen_schema = _codegen_schema(codegen_name, pass_configs)
+        if codegen_schema is not None:
+            schema.append(codegen_schema)
+    return schema
+
+
+def _library_fingerprint():
+    """Identify the libostar build and the registered codegens.
 
-    if codegen["config_key"] is not None and codegen["config_key"] in pass_configs:
-        target_group = parser.add_argument_group(f"target {codegen_name}")
-        attrs = make_node(pass_configs[codegen["config_key"]]["type"])
-        fields = attrs_api.AttrsListFieldInfo(attrs)
-        for field in fields:
-            for ostar_type, python_type in INTERNAL_TO_NATIVE_TYPE.items():
-                if field.type_info.startswith(ostar_type):
-                    target_option = field.name
-                    target_group.add_argument(
-                        f"--target-{codegen_name}-{target_option}",
-                        type=python_type,
-                        help=field.description,
-                    )
+    The fingerprint covers the library file metadata, the version, and the
+    names and config keys of the codegens, which Python packages can
+    register without rebuilding the library.
+    """
+    lib_path = getattr(ostar._ffi.base._LIB, "_name", None)  # pylint: disable=protected-access
+    lib_stat = None
+    if lib_path and os.path.exists(lib_path):
+        stat = os.stat(lib_path)
+        lib_stat = [os.path.realpath(lib_path), stat.st_size, stat.st_mtime_ns]
+    codegens = [
+        [codegen_name, get_codegen_by_target(codegen_name)["config_key"]]
+        for codegen_name in sorted(get_codegen_names())
+    ]
+    text = json.dumps([ostar.__version__, lib_stat, codegens])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def get_target_args_schema():
+    """Get the options of every target kind and codegen, to generate CLI arguments.
+
+    Walking the registries is slow, so the schema is cached in
+    ``TARGET_ARGS_CACHE_PATH``, keyed by a fingerprint of the libostar build,
+    and only rebuilt when the library changes.
+
+    Returns
+    -------
+    schema : list of dict
+        The name and options of each target kind and codegen. Each option
+        has a name, a type ("str" or "int") and a help message.
+    """
+    cache_path = os.path.expanduser(TARGET_ARGS_CACHE_PATH)
+    fingerprint = _library_fingerprint()
+    try:
+        with open(cache_path) as cache_file:
+            cached = json.load(cache_file)
+        if cached.get("fingerprint") == fingerprint:
+            return cached["schema"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    schema = _build_target_args_schema()
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as cache_file:
+            json.dump({"fingerprint": fingerprint, "schema": schema}, cache_file)
+        os.replace(tmp_path, cache_path)
+    except OSError as error:
+        logger.debug("could not cache the target arguments schema: %s", error)
+    return schema
+
+
+def _option_var_name(target_name, target_option):
+    return f"target_{target_name.replace('-', '_')}_{target_option.replace('-', '_')}"
 
 
 def generate_target_args(parser):
@@ -63,56 +163,27 @@ def generate_target_args(parser):
         help="compilation target as plain string, inline JSON or path to a JSON file",
         required=False,
     )
-    for target_kind in _valid_target_kinds():
-        _generate_target_kind_args(parser, target_kind)
-    for codegen_name in get_codegen_names():
-        _generate_codegen_args(parser, codegen_name)
-
-
-def _reconstruct_target_kind_args(args, kind_name):
-    kind_options = {}
-    for target_option, target_type in TargetKind.options_from_name(kind_name).items():
-        if target_type in INTERNAL_TO_NATIVE_TYPE:
-            var_name = f"target_{kind_name.replace('-', '_')}_{target_option.replace('-', '_')}"
-            option_value = getattr(args, var_name)
-            if option_value is not None:
-                kind_options[target_option] = getattr(args, var_name)
-    return kind_options
-
-
-def _reconstruct_codegen_args(args, codegen_name):
-    codegen = get_codegen_by_target(codegen_name)
-    pass_configs = PassContext.list_configs()
-    codegen_options = {}
-
-    if codegen["config_key"] is not None and codegen["config_key"] in pass_configs:
-        attrs = make_node(pass_configs[codegen["config_key"]]["type"])
-        fields = attrs_api.AttrsListFieldInfo(attrs)
-        for field in fields:
-            for ostar_type in INTERNAL_TO_NATIVE_TYPE:
-                if field.type_info.startswith(ostar_type):
-                    target_option = field.name
-                    var_name = (
-                        f"target_{codegen_name.replace('-', '_')}_{target_option.replace('-', '_')}"
-                    )
-                    option_value = getattr(args, var_name)
-                    if option_value is not None:
-                        codegen_options[target_option] = option_value
-    return codegen_options
+    for target in get_target_args_schema():
+        target_group = parser.add_argument_group(f"target {target['name']}")
+        for option in target["options"]:
+            target_group.add_argument(
+                f"--target-{target['name']}-{option['name']}",
+                type=NATIVE_TYPES[option["type"]],
+                help=option["help"],
+            )
 
 
 def reconstruct_target_args(args):
     """Reconstructs the target options from the arguments"""
     reconstructed = {}
-    for target_kind in _valid_target_kinds():
-        kind_options = _reconstruct_target_kind_args(args, target_kind)
-        if kind_options:
-            reconstructed[target_kind] = kind_options
-
-    for codegen_name in get_codegen_names():
-        codegen_options = _reconstruct_codegen_args(args, codegen_name)
-        if codegen_options:
-            reconstructed[codegen_name] = codegen_options
+    for target in get_target_args_schema():
+        target_options = {}
+        for option in target["options"]:
+            option_value = getattr(args, _option_var_name(target["name"], option["name"]))
+            if option_value is not None:
+                target_options[option["name"]] = option_value
+        if target_options:
+            reconstructed[target["name"]] = target_options
 
     return reconstructed
 
@@ -163,7 +234,32 @@ def tokenize_target(target):
     return re.findall(target_pattern, target)
 
 
+def _registry_key():
+    """Identify the registered target kinds and codegens.
+
+    Parsing a target depends on them, and Python packages can register
+    codegens or target kinds at any time, so the target caches are keyed on
+    this as well as on the target string.
+    """
+    codegens = tuple(
+        (codegen_name, get_codegen_by_target(codegen_name)["config_key"])
+        for codegen_name in sorted(get_codegen_names())
+    )
+    return codegens, tuple(sorted(Target.list_kinds()))
+
+
 def parse_target(target):
+    """Parse a target string into a list of codegen definitions.
+
+    Parsing is memoized, so the returned list is a fresh copy that callers
+    are free to modify.
+    """
+    return copy.deepcopy(_parse_target_cached(target, _registry_key()))
+
+
+@functools.lru_cache(maxsize=TARGET_CACHE_SIZE)
+def _parse_target_cached(target, registry):  # pylint: disable=unused-argument
+    # ``registry`` is only part of the cache key, see `_registry_key`.
     codegen_names = ostarc.composite_target.get_codegen_names()
     codegens = []
 
@@ -237,19 +333,111 @@ def _combine_target_options(target, additional_target_options=None):
     return target
 
 
+def _expand_native_targets(parsed_targets):
+    """Replace the `native` target by an llvm target describing the host CPU.
+
+    Options given to `native` take precedence over the detected ones, e.g.
+    ``native -num-cores=4``.
+    """
+    for parsed_target in parsed_targets:
+        if parsed_target["name"] != NATIVE_TARGET:
+            continue
+        host = detect_host_cpu()
+        logger.info("resolved target '%s' to '%s'", NATIVE_TARGET, host.target_string())
+        opts = host.target_options()
+        opts.update(parsed_target["opts"])
+        parsed_target["name"] = "llvm"
+        parsed_target["opts"] = opts
+        parsed_target["raw"] = _recombobulate_target(parsed_target)
+        parsed_target["is_ostar_target"] = True
+
+
 def _recombobulate_target(target):
     name = target["name"]
     opts = " ".join([f"-{key}={value}" for key, value in target["opts"].items()])
     return f"{name} {opts}"
 
 
-def target_from_cli(target, additional_target_options=None):
-    extra_targets = []
+def clear_target_cache():
+    """Clear the parsed and interned targets cached by `target_from_cli`."""
+    with _target_cache_lock:
+        _target_cache.clear()
+        _interned_targets.clear()
+    _parse_target_cached.cache_clear()
+
+
+def _lru_lookup(cache, key):
+    """Get an entry of an OrderedDict LRU cache. Must be called with the lock held."""
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
 
-    if os.path.isfile(target):
+
+def _lru_insert(cache, key, value):
+    """Add an entry to an OrderedDict LRU cache. Must be called with the lock held."""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > TARGET_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def target_from_cli(target, additional_target_options=None):
+    """Resolve a target given on the command line.
+
+    Resolutions are cached, keyed on the target string (or the contents of
+    the target file), the additional options and the registered codegens
+    and target kinds, and the resulting Targets
+    are interned on their canonical string, so resolving equivalent targets
+    returns the same Target object.
+
+    Parameters
+    ----------
+    target : str
+        A target string, inline JSON or the path to a JSON file.
+    additional_target_options : dict, optional
+        Options to add to the targets, keyed by target name.
+
+    Returns
+    -------
+    target : ostar.target.Target
+        The target, with its host if one was given.
+    extra_targets : list of dict
+        The codegens that are not OSTAR targets. A fresh copy is returned
+        on every call.
+    """
+    from_file = os.path.isfile(target)
+    if from_file:
         with open(target) as target_file:
             logger.debug("target input is a path: %s", target)
             target = "".join(target_file.readlines())
+
+    options_key = json.dumps(additional_target_options, sort_keys=True, default=str)
+    key = (from_file, target.strip(), options_key, _registry_key())
+    with _target_cache_lock:
+        cached = _lru_lookup(_target_cache, key)
+    if cached is not None:
+        return cached[0], copy.deepcopy(cached[1])
+
+    ostar_target, extra_targets = _resolve_target(target, additional_target_options, from_file)
+    canonical = (str(ostar_target), str(ostar_target.host) if ostar_target.host else None)
+    with _target_cache_lock:
+        interned = _lru_lookup(_interned_targets, canonical)
+        if interned is None:
+            _lru_insert(_interned_targets, canonical, ostar_target)
+        else:
+            ostar_target = interned
+        _lru_insert(_target_cache, key, (ostar_target, extra_targets))
+    return ostar_target, copy.deepcopy(extra_targets)
+
+
+def _resolve_target(target, additional_target_options=None, from_file=False):
+    extra_targets = []
+    target_host = None
+
+    if from_file:
+        # The contents of target files are passed to Target as they are.
+        pass
     elif is_inline_json(target):
         logger.debug("target input is inline JSON: %s", target)
     else:
@@ -259,6 +447,7 @@ def target_from_cli(target, additional_target_options=None):
         except ValueError as error:
             raise OSTARCException(f"Error parsing target string '{target}'.\nThe error was: {error}")
 
+        _expand_native_targets(parsed_targets)
         validate_targets(parsed_targets, additional_target_options)
         ostar_targets = [
             _combine_target_options(t, additional_target_options)
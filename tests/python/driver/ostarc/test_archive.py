@@ -0,0 +1,97 @@
+import tarfile
+
+import pytest
+
+from ostar.driver.ostarc import OSTARCException
+from ostar.driver.ostarc.archive import (
+    MANIFEST_NAME,
+    extract_member,
+    manifest_member,
+    read_manifest,
+    read_member,
+    verify_package,
+    write_package,
+)
+
+
+def _read(path):
+    with open(path, "rb") as in_file:
+        return in_file.read()
+
+
+def _write_members(tmpdir, sizes):
+    members = []
+    for index, size in enumerate(sizes):
+        path = tmpdir.join(f"member{index}.bin")
+        path.write_binary(bytes((index + offset) % 251 for offset in range(size)))
+        members.append((f"dir/member{index}.bin", str(path)))
+    return members
+
+
+# Sizes around the tar block size, and a long name needing a GNU long name header.
+@pytest.mark.parametrize("sizes", [[0, 1, 511, 512, 513, 5000], [100000]])
+@pytest.mark.parametrize("long_name", [False, True])
+def test_manifest_offsets(tmpdir, sizes, long_name):
+    members = _write_members(tmpdir, sizes)
+    if long_name:
+        members[-1] = ("x" * 200 + ".bin", members[-1][1])
+    package_path = str(tmpdir.join("package.tar"))
+    write_package(package_path, members, "classic", "graph", "mod.so")
+
+    manifest = read_manifest(package_path)
+    assert manifest["type"] == "classic"
+    assert manifest["executor_type"] == "graph"
+    assert manifest["lib"] == "mod.so"
+    assert [entry["name"] for entry in manifest["members"]] == [name for name, _ in members]
+    verify_package(package_path, manifest)
+
+    with tarfile.open(package_path) as tar:
+        assert tar.getnames() == [MANIFEST_NAME] + [name for name, _ in members]
+        for name, path in members:
+            entry = manifest_member(manifest, name)
+            expected = _read(path)
+            assert entry["offset"] == tar.getmember(name).offset_data
+            assert read_member(package_path, entry) == expected
+            assert tar.extractfile(name).read() == expected
+            out_path = str(tmpdir.join("extracted"))
+            extract_member(package_path, entry, out_path)
+            assert _read(out_path) == expected
+
+
+def test_verify_package_corrupt(tmpdir):
+    members = _write_members(tmpdir, [1000, 2000])
+    package_path = str(tmpdir.join("package.tar"))
+    write_package(package_path, members, "classic")
+    entry = manifest_member(read_manifest(package_path), members[1][0])
+
+    with open(package_path, "r+b") as package_file:
+        package_file.seek(entry["offset"] + 10)
+        byte = package_file.read(1)
+        package_file.seek(entry["offset"] + 10)
+        package_file.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(OSTARCException, match="truncated or corrupt"):
+        verify_package(package_path)
+
+    with open(package_path, "r+b") as package_file:
+        package_file.truncate(entry["offset"] + 100)
+    with pytest.raises(OSTARCException, match="truncated or corrupt"):
+        verify_package(package_path)
+    with pytest.raises(OSTARCException, match="Truncated member"):
+        extract_member(package_path, entry, str(tmpdir.join("extracted")))
+
+
+def test_without_manifest(tmpdir):
+    package_path = str(tmpdir.join("package.tar"))
+    with tarfile.open(package_path, "w") as tar:
+        tar.add(_write_members(tmpdir, [10])[0][1], "mod.so")
+    assert read_manifest(package_path) is None
+    with pytest.raises(OSTARCException, match="no manifest"):
+        verify_package(package_path)
+    with pytest.raises(OSTARCException, match="not found"):
+        manifest_member({"members": []}, "mod.so")
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
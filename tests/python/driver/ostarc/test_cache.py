@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from ostar.driver.ostarc import OSTARCException, cache
+from ostar.driver.ostarc.cache import DirectoryLRUCache, ImportCache
+
+
+def _writer(size):
+    def _write(path):
+        with open(path, "wb") as entry_file:
+            entry_file.write(bytes(size))
+
+    return _write
+
+
+def _set_access_time(lru_cache, key, seconds):
+    os.utime(lru_cache.entry_path(key), ns=(seconds * 10**9, seconds * 10**9))
+
+
+def _counts(lru_cache):
+    stats = lru_cache.stats()
+    return stats["hits"], stats["misses"], stats["evictions"], stats["entries"], stats["size"]
+
+
+def test_lru_eviction(tmpdir):
+    lru_cache = DirectoryLRUCache(str(tmpdir.join("cache")), max_size=250, suffix=".bin")
+    lru_cache.insert("a", _writer(100))
+    lru_cache.insert("b", _writer(100))
+    _set_access_time(lru_cache, "a", 1)
+    _set_access_time(lru_cache, "b", 2)
+    assert _counts(lru_cache) == (0, 0, 0, 2, 200)
+
+    # The lookup makes "a" the most recently used entry, so "b" is evicted.
+    assert lru_cache.lookup("a") == lru_cache.entry_path("a")
+    lru_cache.insert("c", _writer(100))
+    assert lru_cache.lookup("b") is None
+    assert os.path.exists(lru_cache.entry_path("a"))
+    assert _counts(lru_cache) == (1, 1, 1, 2, 200)
+
+    # An entry larger than the cache evicts all others but is kept itself.
+    lru_cache.insert("d", _writer(300))
+    assert lru_cache.lookup("d") is not None
+    assert _counts(lru_cache) == (2, 1, 3, 1, 300)
+
+    lru_cache.remove("d")
+    lru_cache.remove("d")
+    assert _counts(lru_cache) == (2, 1, 4, 0, 0)
+
+    lru_cache.insert("e", _writer(10))
+    lru_cache.clear()
+    assert _counts(lru_cache) == (0, 0, 0, 0, 0)
+
+
+def test_stats_shared_between_instances(tmpdir):
+    first = DirectoryLRUCache(str(tmpdir.join("cache")))
+    second = DirectoryLRUCache(str(tmpdir.join("cache")))
+    first.insert("a", _writer(10))
+    assert second.lookup("a") is not None
+    assert second.lookup("b") is None
+    assert _counts(first) == (1, 1, 0, 1, 10)
+
+
+def test_invalid_size(tmpdir):
+    with pytest.raises(OSTARCException, match="positive"):
+        DirectoryLRUCache(str(tmpdir.join("cache")), max_size=0)
+
+
+def test_import_cache_corrupt_entry(tmpdir, monkeypatch):
+    def _load_truncated(model_path):
+        raise ValueError(f"truncated params in {model_path}")
+
+    monkeypatch.setattr(cache, "OSTARCModel", _load_truncated)
+    import_cache = ImportCache(str(tmpdir.join("cache")))
+    import_cache.insert("a", _writer(10))
+
+    # The corrupt entry is evicted and its lookup counted as a miss.
+    assert import_cache.get("a") is None
+    assert not os.path.exists(import_cache.entry_path("a"))
+    assert _counts(import_cache) == (0, 1, 1, 0, 0)
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
@@ -0,0 +1,112 @@
+import types
+
+import numpy as np
+import pytest
+
+import ostar
+from ostar.driver.ostarc import OSTARCException, OSTARCImportError
+from ostar.driver.ostarc.frontends import OnnxFrontend, PyTorchFrontend, load_model_batch
+
+
+class _FakeTracedModel(object):
+    def __init__(self, state_dict):
+        self._state_dict = state_dict
+
+    def state_dict(self):
+        return self._state_dict
+
+
+def test_share_torch_params_mismatch_fallback():
+    torch = pytest.importorskip("torch")
+
+    weight = torch.arange(12, dtype=torch.float32).reshape(3, 4)
+    bias = torch.arange(4, dtype=torch.float32)
+    scale = torch.ones(2, dtype=torch.float32)
+    traced_model = _FakeTracedModel(
+        {
+            "weight": weight,
+            # Renamed by the converter, so not found in the params.
+            "layer.bias": bias,
+            # Shape changed by the converter.
+            "scale": scale,
+        }
+    )
+    converted = {
+        "weight": ostar.nd.array(weight.numpy()),
+        "layer_bias": ostar.nd.array(bias.numpy()),
+        "scale": ostar.nd.array(scale.numpy().reshape(2, 1)),
+        # Missing from the state dict.
+        "running_mean": ostar.nd.array(np.zeros(4, dtype="float32")),
+    }
+    params = dict(converted)
+
+    PyTorchFrontend._share_torch_params(torch, traced_model, params)
+
+    assert sorted(params) == sorted(converted)
+    assert params["weight"] is not converted["weight"]
+    np.testing.assert_array_equal(params["weight"].numpy(), weight.numpy())
+    # The weight is shared: writes to the Torch tensor show through.
+    weight[0, 0] = 42
+    assert params["weight"].numpy()[0, 0] == 42
+    for name in ["layer_bias", "scale", "running_mean"]:
+        assert params[name] is converted[name]
+
+
+# Stand-ins for the onnx module and initializers, for float32 tensors only.
+_FAKE_ONNX = types.SimpleNamespace(
+    helper=types.SimpleNamespace(tensor_dtype_to_np_dtype=lambda data_type: np.float32)
+)
+
+
+def _external_initializer(name, dims, location, offset=None, length=None):
+    info = {"location": location, "offset": offset, "length": length}
+    return types.SimpleNamespace(
+        name=name,
+        dims=dims,
+        data_type=1,
+        external_data=[
+            types.SimpleNamespace(key=key, value=str(value))
+            for key, value in info.items()
+            if value is not None
+        ],
+    )
+
+
+def test_map_external_initializers(tmpdir):
+    data = np.arange(10, dtype="<f4")
+    tmpdir.join("weights.bin").write_binary(data.tobytes())
+    tmpdir.join("empty.bin").write_binary(b"")
+    initializers = [
+        _external_initializer("a", [2, 3], "weights.bin"),
+        _external_initializer("b", [4], "weights.bin", offset=24, length=16),
+        _external_initializer("c", [0, 3], "empty.bin"),
+    ]
+    arrays = OnnxFrontend._map_external_initializers(_FAKE_ONNX, initializers, str(tmpdir))
+    np.testing.assert_array_equal(arrays["a"], data[:6].reshape(2, 3))
+    np.testing.assert_array_equal(arrays["b"], data[6:])
+    assert arrays["c"].shape == (0, 3)
+
+
+@pytest.mark.parametrize(
+    "dims, location, offset",
+    [([11], "weights.bin", None), ([4], "weights.bin", 28), ([1], "empty.bin", None)],
+)
+def test_map_external_initializers_out_of_bounds(tmpdir, dims, location, offset):
+    tmpdir.join("weights.bin").write_binary(np.arange(10, dtype="<f4").tobytes())
+    tmpdir.join("empty.bin").write_binary(b"")
+    initializers = [_external_initializer("w", dims, location, offset)]
+    with pytest.raises(OSTARCImportError, match=f"initializer 'w'.*{location}"):
+        OnnxFrontend._map_external_initializers(_FAKE_ONNX, initializers, str(tmpdir))
+
+
+@pytest.mark.parametrize("job", ["model.onnx", ("model.onnx", "onnx", None, {}), (), (42,), None])
+def test_load_model_batch_invalid_job(tmpdir, job):
+    # Rejected before any worker starts.
+    with pytest.raises(OSTARCException, match="Invalid job 1"):
+        load_model_batch([("model.onnx",), job], output_dir=str(tmpdir))
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
@@ -0,0 +1,115 @@
+import pytest
+
+from ostar.driver.ostarc import host_cpu
+
+
+def _cpuinfo(num_cores, threads_per_core, fields):
+    blocks = []
+    for processor in range(num_cores * threads_per_core):
+        lines = [f"processor\t: {processor}"]
+        lines += [f"{key}\t: {value}" for key, value in fields.items()]
+        lines += ["physical id\t: 0", f"core id\t\t: {processor % num_cores}"]
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks) + "\n"
+
+
+def _detect(monkeypatch, tmpdir, arch, cpuinfo, available=None):
+    cpuinfo_path = tmpdir.join("cpuinfo")
+    cpuinfo_path.write(cpuinfo)
+    real_open = open
+
+    def _open(path, *args, **kwargs):
+        if path == "/proc/cpuinfo":
+            path = str(cpuinfo_path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(host_cpu, "open", _open, raising=False)
+    monkeypatch.setattr(host_cpu.platform, "machine", lambda: arch)
+    monkeypatch.setattr(host_cpu, "_available_cpus", lambda: available)
+    monkeypatch.setattr(host_cpu, "_read_caches", dict)
+    host_cpu.detect_host_cpu.cache_clear()
+    try:
+        return host_cpu.detect_host_cpu()
+    finally:
+        host_cpu.detect_host_cpu.cache_clear()
+
+
+ZEN4_FLAGS = "fpu sse4_1 sse4_2 ssse3 popcnt avx avx2 fma f16c bmi1 bmi2"
+
+
+@pytest.mark.parametrize("avx512", [True, False])
+def test_zen4(monkeypatch, tmpdir, avx512):
+    flags = ZEN4_FLAGS + (" avx512f avx512bw avx512_vnni" if avx512 else "")
+    fields = {
+        "vendor_id": "AuthenticAMD",
+        "cpu family": 25,
+        "model": 97,
+        "model name": "AMD Ryzen 9 7950X",
+        "flags": flags,
+    }
+    cpuinfo = _cpuinfo(4, 2, fields)
+    info = _detect(monkeypatch, tmpdir, "x86_64", cpuinfo, available=3)
+
+    assert (info.family, info.model) == (0x19, 0x61)
+    assert info.num_threads == 8
+    # 4 cores, capped by the affinity mask.
+    assert info.num_cores == 3
+    assert info.mcpu == "znver4"
+    mattr = info.mattr
+    assert "+avx2" in mattr and "+fma" in mattr and "+bmi" in mattr
+    if avx512:
+        assert "+avx512f" in mattr and "+avx512vnni" in mattr
+    else:
+        # AVX-512 hidden by a hypervisor must not be implied by -mcpu.
+        assert "-avx512f" in mattr and "-avx512vnni" in mattr
+    assert "-amx-tile" in mattr
+    assert info.target_options()["mattr"] == ",".join(mattr)
+
+
+@pytest.mark.parametrize(
+    "flags, mcpu",
+    [
+        ("avx2 fma bmi2 avx512f avx512_vnni avx512_bf16", "cooperlake"),
+        ("avx2 fma bmi2 avx512f", "skylake-avx512"),
+        ("avx2 fma bmi2 clflushopt", "skylake"),
+        ("avx2 fma bmi2", "haswell"),
+        ("sse4_2", "x86-64"),
+    ],
+)
+def test_intel_mcpu(monkeypatch, tmpdir, flags, mcpu):
+    fields = {"vendor_id": "GenuineIntel", "cpu family": 6, "model": 85, "flags": flags}
+    cpuinfo = _cpuinfo(2, 1, fields)
+    info = _detect(monkeypatch, tmpdir, "x86_64", cpuinfo)
+    assert info.mcpu == mcpu
+    assert info.num_cores == 2
+
+
+def test_aarch64(monkeypatch, tmpdir):
+    cpuinfo = "\n\n".join(
+        f"processor\t: {processor}\n"
+        "Features\t: fp asimd asimddp sve\n"
+        "CPU implementer\t: 0x41\n"
+        "CPU part\t: 0xd40\n"
+        for processor in range(3)
+    )
+    info = _detect(monkeypatch, tmpdir, "aarch64", cpuinfo)
+    assert info.mcpu == "neoverse-v1"
+    assert info.num_cores == 3
+    assert "+neon" in info.mattr and "+sve" in info.mattr and "-sve2" in info.mattr
+
+    # Part numbers of other implementers do not name Arm cores.
+    cpuinfo = cpuinfo.replace("0x41", "0x51")
+    assert _detect(monkeypatch, tmpdir, "aarch64", cpuinfo).mcpu == "generic"
+
+
+def test_without_cpuinfo(monkeypatch, tmpdir):
+    info = _detect(monkeypatch, tmpdir, "x86_64", "", available=3)
+    assert info.num_cores == 3
+    assert info.mcpu == "x86-64"
+    assert info.mattr == []
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pytest
+
+from ostar.driver.ostarc.latency import MIN_WARMUP_SAMPLES, LatencyDistribution
+
+
+@pytest.mark.parametrize("significant_bits", [3, 7])
+def test_bucket_bounds(significant_bits):
+    distribution = LatencyDistribution(significant_bits=significant_bits)
+    values = list(range(0, 1000)) + [int(value) for value in np.geomspace(1000, 1e12, 500)]
+    for nanoseconds in values:
+        low, width = distribution._bucket_bounds(distribution._bucket_index(nanoseconds))
+        assert low <= nanoseconds < low + width
+        # Buckets keep significant_bits + 1 significant bits.
+        assert width == 1 or width <= low * 2.0**-significant_bits
+
+
+def test_percentiles():
+    rng = np.random.default_rng(0)
+    samples = rng.uniform(1e-4, 1e-2, size=10000)
+    distribution = LatencyDistribution.from_samples(samples, warmup_window=0)
+
+    assert distribution.count == samples.size
+    assert distribution.warmup_count == 0
+    assert distribution.min == samples.min() and distribution.max == samples.max()
+    assert distribution.mean == pytest.approx(samples.mean())
+    assert distribution.std == pytest.approx(samples.std())
+    for percent in [1, 50, 90, 99, 99.9]:
+        expected = np.percentile(samples, percent, method="inverted_cdf")
+        assert distribution.percentile(percent) == pytest.approx(expected, rel=2**-7)
+    assert distribution.percentile(0) == pytest.approx(distribution.min, rel=2**-7)
+    assert distribution.percentile(100) == pytest.approx(distribution.max, rel=2**-7)
+    assert sum(count for _, _, count in distribution.histogram()) == samples.size
+
+    exported = json.loads(distribution.to_json())
+    assert exported["count"] == samples.size
+    assert exported["percentiles"]["p50"] == distribution.percentile(50)
+
+
+def test_warmup_and_outliers():
+    samples = [5e-3] * 100 + [1e-3] * 900
+    samples[500] = 1e-1
+    distribution = LatencyDistribution(warmup_window=1000)
+    distribution.record_many(samples)
+    distribution.record(1e-3)
+    distribution.record(2e-1)
+
+    assert distribution.warmup_count == 100
+    assert distribution.count == len(samples) + 2 - 100
+    assert distribution.max == 2e-1
+    assert distribution.num_outliers == 2
+    assert distribution.outliers == [(500, 1e-1), (1001, 2e-1)]
+
+
+def test_few_samples_not_trimmed():
+    samples = [5e-3, 5e-3] + [1e-3] * (MIN_WARMUP_SAMPLES - 3)
+    distribution = LatencyDistribution.from_samples(samples)
+    assert distribution.warmup_count == 0
+    assert distribution.count == len(samples)
+
+
+def test_empty():
+    distribution = LatencyDistribution.from_samples([])
+    assert distribution.count == 0
+    assert np.isnan(distribution.mean) and np.isnan(distribution.percentile(50))
+    assert distribution.to_dict()["min"] is None
+
+
+def test_sample_name():
+    distribution = LatencyDistribution.from_samples([1e-3, 2e-3], sample_name="repeat")
+    assert distribution.format_percentiles().startswith("Latency percentiles per repeat")
+    assert distribution.to_dict()["sample"] == "repeat"
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import ostar
+from ostar import relay
+from ostar.contrib import graph_executor
+from ostar.driver.ostarc.model import OSTARCModel, OSTARCPackage
+from ostar.driver.ostarc.params import cast_params_storage
+
+
+@pytest.mark.parametrize("params_format", ["legacy", "indexed"])
+def test_export_package_keeps_storage_dtype(tmpdir, params_format):
+    data = relay.var("data", shape=(2, 4), dtype="float32")
+    weight = relay.var("weight", shape=(3, 4), dtype="float32")
+    func = relay.Function([data, weight], relay.nn.dense(data, weight))
+    mod = ostar.IRModule.from_expr(func)
+    weight_data = np.arange(12, dtype="float32").reshape(3, 4) / 8
+    params = {"weight": ostar.nd.array(weight_data)}
+    mod = cast_params_storage(mod, params, "float16")
+
+    model = OSTARCModel(mod, params)
+    assert "weight" not in model.build_params()
+    with ostar.transform.PassContext(opt_level=3):
+        executor_factory = relay.build(mod, target="llvm", params=model.build_params())
+    package_path = model.export_package(
+        executor_factory, str(tmpdir.join("model.tar")), params_format=params_format
+    )
+
+    package = OSTARCPackage(package_path)
+    package_params = relay.load_param_dict(package.params)
+    assert package_params["weight"].dtype == "float16"
+    assert all(value.dtype != "float32" for value in package_params.values())
+
+    lib = ostar.runtime.load_module(package.lib_path)
+    module = graph_executor.create(package.graph, lib, ostar.cpu())
+    module.load_params(package.params)
+    input_data = np.ones((2, 4), dtype="float32")
+    module.set_input("data", input_data)
+    module.run()
+    np.testing.assert_allclose(module.get_output(0).numpy(), input_data @ weight_data.T)
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
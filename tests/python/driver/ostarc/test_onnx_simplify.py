@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+
+from ostar.driver.ostarc.onnx_simplify import (
+    FOLDING_RULES,
+    _output_size_estimate,
+    simplify_onnx_model,
+)
+
+
+def _fold(op_type, inputs, **attrs):
+    inputs = [np.asarray(value) if value is not None else None for value in inputs]
+    return FOLDING_RULES[op_type](None, attrs, inputs)
+
+
+def test_fold_shape_ops():
+    data = np.arange(24, dtype="int64").reshape(2, 3, 4)
+    np.testing.assert_array_equal(_fold("Gather", [[5, 6, 7], 1]), 6)
+    np.testing.assert_array_equal(
+        _fold("Gather", [data, [2, 0]], axis=-1), np.take(data, [2, 0], axis=-1)
+    )
+    np.testing.assert_array_equal(_fold("Concat", [[1], [2, 3]], axis=0), [1, 2, 3])
+
+    # Unsqueeze axes index the output, as an attribute (opset < 13) or an input.
+    assert _fold("Unsqueeze", [data], axes=[0, -1]).shape == (1, 2, 3, 4, 1)
+    assert _fold("Unsqueeze", [data, [3, 1]]).shape == (2, 1, 3, 1, 4)
+    assert _fold("Unsqueeze", [np.array(7)], axes=[0]).shape == (1,)
+    squeezable = data.reshape(1, 2, 1, 12)
+    assert _fold("Squeeze", [squeezable]).shape == (2, 12)
+    assert _fold("Squeeze", [squeezable], axes=[-2]).shape == (1, 2, 12)
+    assert _fold("Squeeze", [squeezable, [0]]).shape == (2, 1, 12)
+
+    np.testing.assert_array_equal(_fold("Reshape", [data, [0, -1]]), data.reshape(2, 12))
+    assert _fold("Reshape", [np.zeros((0, 3)), [0, 3]], allowzero=1).shape == (0, 3)
+    np.testing.assert_array_equal(_fold("Identity", [data]), data)
+
+
+@pytest.mark.parametrize(
+    "starts, ends, axes, steps",
+    [
+        ([1], [3], None, None),
+        ([0, 1], [2, -1], [0, -1], None),
+        ([-1], [-1000], [2], [-2]),
+        ([0], [2**62], [1], [2]),
+    ],
+)
+def test_fold_slice(starts, ends, axes, steps):
+    data = np.arange(24, dtype="float32").reshape(2, 3, 4)
+    slices = [slice(None)] * data.ndim
+    for index, (start, end) in enumerate(zip(starts, ends)):
+        axis = axes[index] if axes is not None else index
+        slices[axis] = slice(start, end, steps[index] if steps is not None else 1)
+    expected = data[tuple(slices)]
+
+    inputs = [data, starts, ends]
+    inputs += ([axes] if axes is not None else []) + ([steps] if steps is not None else [])
+    np.testing.assert_array_equal(_fold("Slice", inputs), expected)
+    if steps is None:
+        # Opset < 10 takes the slice as attributes.
+        attrs = {"starts": starts, "ends": ends}
+        if axes is not None:
+            attrs["axes"] = axes
+        np.testing.assert_array_equal(_fold("Slice", [data], **attrs), expected)
+
+
+def test_fold_arithmetic():
+    np.testing.assert_array_equal(_fold("Add", [[1, 2], 3]), [4, 5])
+    np.testing.assert_array_equal(_fold("Sub", [[1, 2], 3]), [-2, -1])
+    np.testing.assert_array_equal(_fold("Mul", [[1, 2], [3, 4]]), [3, 8])
+    # Integer division truncates towards zero, unlike NumPy's floor division.
+    lhs = np.array([7, -7, 6, -1], dtype="int64")
+    result = _fold("Div", [lhs, np.array(2, dtype="int64")])
+    assert result.dtype == np.int64
+    np.testing.assert_array_equal(result, [3, -3, 3, 0])
+    np.testing.assert_allclose(_fold("Div", [np.float32(1), np.float32(4)]), 0.25)
+
+    result = _fold("Range", [np.int64(2), np.int64(11), np.int64(3)])
+    assert result.dtype == np.int64
+    np.testing.assert_array_equal(result, [2, 5, 8])
+    result = _fold("Range", [np.int64(5), np.int64(0), np.int64(-2)])
+    np.testing.assert_array_equal(result, [5, 3, 1])
+
+
+def test_output_size_estimate():
+    inputs = [np.array([1000, 1000], dtype="int64")]
+    assert _output_size_estimate("ConstantOfShape", inputs) == 10**6
+    assert _output_size_estimate("Range", [np.int64(0), np.int64(10), np.int64(3)]) == 4
+    assert _output_size_estimate("Range", [np.int64(10), np.int64(0), np.int64(1)]) == 0
+    assert _output_size_estimate("Range", [np.int64(0), np.int64(10), np.int64(0)]) == 0
+    assert _output_size_estimate("Concat", [np.zeros(10**7)]) == 0
+
+
+def _reshape_model(onnx, batch):
+    helper = onnx.helper
+    data = np.arange(12, dtype="float32")
+    nodes = [
+        helper.make_node("Shape", ["x"], ["shape"]),
+        helper.make_node("Gather", ["shape", "zero"], ["batch"], axis=0),
+        helper.make_node("Unsqueeze", ["batch", "axes"], ["batch_1d"]),
+        helper.make_node("Concat", ["batch_1d", "minus_one"], ["new_shape"], axis=0),
+        helper.make_node("Reshape", ["x", "new_shape"], ["reshaped"]),
+        helper.make_node("Add", ["reshaped", "bias"], ["y"]),
+    ]
+    initializers = [
+        onnx.numpy_helper.from_array(np.array(0, dtype="int64"), "zero"),
+        onnx.numpy_helper.from_array(np.array([0], dtype="int64"), "axes"),
+        onnx.numpy_helper.from_array(np.array([-1], dtype="int64"), "minus_one"),
+        onnx.numpy_helper.from_array(data, "bias"),
+        onnx.numpy_helper.from_array(data, "unused"),
+    ]
+    graph = helper.make_graph(
+        nodes,
+        "reshape",
+        [helper.make_tensor_value_info("x", onnx.TensorProto.FLOAT, [batch, 3, 4])],
+        [helper.make_tensor_value_info("y", onnx.TensorProto.FLOAT, None)],
+        initializers,
+    )
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+
+
+def test_simplify_onnx_model():
+    onnx = pytest.importorskip("onnx")
+
+    model = _reshape_model(onnx, 2)
+    report = simplify_onnx_model(onnx, model)
+    assert [node.op_type for node in model.graph.node] == ["Reshape", "Add"]
+    initializers = {init.name: init for init in model.graph.initializer}
+    assert "unused" not in initializers
+    np.testing.assert_array_equal(onnx.numpy_helper.to_array(initializers["new_shape"]), [2, -1])
+    assert report["folded_nodes"] == 4
+    assert report["removed_initializers"] == 4
+    assert report["removed_bytes"] == 48 + 3 * 8
+    onnx.checker.check_model(model)
+
+    # A batch left dynamic by the user is not folded to the declared one.
+    model = _reshape_model(onnx, 2)
+    simplify_onnx_model(onnx, model, {"x": [None, 3, 4]})
+    assert [node.op_type for node in model.graph.node][0] == "Shape"
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
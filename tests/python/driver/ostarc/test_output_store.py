@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from ostar.driver.ostarc import OSTARCException
+from ostar.driver.ostarc.output_store import OutputStore, OutputStoreReader
+
+
+def test_output_store_append_empty(tmpdir):
+    store = OutputStore(str(tmpdir.join("outputs")))
+    with pytest.raises(OSTARCException, match="no outputs to append"):
+        store.append({})
+
+    # The store is still usable after the failed append.
+    store.append({"output_0": np.zeros((2, 3), dtype="float32")})
+    store.close()
+    assert OutputStoreReader(str(tmpdir.join("outputs"))).read("output_0").shape == (1, 2, 3)
+
+
+def _outputs(sample):
+    return {
+        "logits": np.full((2, 3), sample, dtype="float32"),
+        "index": np.array([sample, -sample], dtype="int64"),
+    }
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_output_store_round_trip(tmpdir, compression):
+    path = str(tmpdir.join("outputs"))
+    with OutputStore(path, compression, chunk_samples=3) as store:
+        for sample in range(7):
+            store.append(_outputs(sample))
+        assert store.num_samples == 7
+    assert OutputStoreReader(path).num_samples == 7
+
+    # Reopened stores keep their compression and continue after the last chunk.
+    with OutputStore(path, chunk_samples=4) as store:
+        assert store.num_samples == 7
+        for sample in range(7, 12):
+            store.append(_outputs(sample))
+        with pytest.raises(OSTARCException, match="has shape"):
+            store.append({"logits": np.zeros((3, 2), "float32"), "index": np.zeros(2, "int64")})
+        with pytest.raises(OSTARCException, match="Expected outputs"):
+            store.append({"logits": np.zeros((2, 3), "float32")})
+
+    reader = OutputStoreReader(path)
+    assert reader.names == ["logits", "index"]
+    assert len(reader) == 12
+    # 3 + 3 + 1 samples in the first session, 4 + 1 in the second.
+    assert [len(chunk) for chunk in reader.iter_chunks("index")] == [3, 3, 1, 4, 1]
+    expected = {name: np.stack([_outputs(i)[name] for i in range(12)]) for name in reader.names}
+    for name in reader.names:
+        np.testing.assert_array_equal(reader[name], expected[name])
+        for start, stop in [(0, 3), (2, 4), (5, 9), (6, 7), (1, 12), (11, None), (-4, -1), (8, 8)]:
+            np.testing.assert_array_equal(
+                reader.read(name, start, stop), expected[name][start:stop]
+            )
+    with pytest.raises(OSTARCException, match="not found"):
+        reader.read("missing")
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
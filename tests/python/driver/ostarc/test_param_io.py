@@ -0,0 +1,149 @@
+import mmap
+import zlib
+
+import numpy as np
+import pytest
+
+from ostar.driver.ostarc.params import NDARRAY_ALIGNMENT, LazyParam
+from ostar.driver.ostarc.param_io import (
+    IndexedParamsReader,
+    LazyParamDict,
+    ParamArena,
+    ParamDictStream,
+    parse_param_dict,
+    save_indexed_params,
+)
+
+
+def _write_legacy_params(path, params):
+    with open(path, "wb") as params_file:
+        for chunk in ParamDictStream(params).chunks():
+            params_file.write(chunk)
+
+
+@pytest.mark.parametrize("copy_on_write", [False, True])
+def test_lazy_param_dict_unaligned_offsets(tmpdir, copy_on_write):
+    # Names of odd lengths put the tensor data at unaligned offsets.
+    params = {
+        "w": np.arange(12, dtype="float32").reshape(3, 4),
+        "bias_abc": np.arange(5, dtype="int64"),
+        "x": np.linspace(0, 1, 7, dtype="float64"),
+    }
+    path = str(tmpdir.join("legacy.params"))
+    _write_legacy_params(path, params)
+
+    with open(path, "rb") as params_file:
+        access = mmap.ACCESS_COPY if copy_on_write else mmap.ACCESS_READ
+        buffer = mmap.mmap(params_file.fileno(), 0, access=access)
+    offsets = [entry[3] for entry in parse_param_dict(buffer)]
+    assert any(offset % NDARRAY_ALIGNMENT for offset in offsets)
+
+    loaded = LazyParamDict(buffer)
+    assert sorted(loaded) == sorted(params)
+    for name, value in params.items():
+        np.testing.assert_array_equal(loaded[name].numpy(), value)
+
+
+class _NoGetItemParamDict(LazyParamDict):
+    def __getitem__(self, name):
+        raise AssertionError(f"param '{name}' was materialized")
+
+
+def test_streams_read_buffer_params_in_place(tmpdir):
+    params = {
+        "w": np.arange(12, dtype="float32").reshape(3, 4),
+        "bias_abc": np.arange(5, dtype="int64"),
+    }
+    path = str(tmpdir.join("legacy.params"))
+    _write_legacy_params(path, params)
+    with open(path, "rb") as params_file:
+        expected = params_file.read()
+
+    loaded = _NoGetItemParamDict(bytearray(expected))
+    assert ParamDictStream(loaded).reader().read() == expected
+
+    indexed_path = str(tmpdir.join("model.params"))
+    save_indexed_params(loaded, indexed_path, shard_size=64)
+    reader = IndexedParamsReader.open(indexed_path)
+    assert ParamDictStream(reader).reader().read() == expected
+    for name, value in params.items():
+        np.testing.assert_array_equal(reader.read(name, verify=True).numpy(), value)
+
+
+@pytest.mark.parametrize("fill", ["zeros", "random"])
+def test_lazy_param_aligned(fill):
+    for shape, dtype in [((3, 5), "float32"), ((7,), "int8"), ((0, 4), "float64")]:
+        param = LazyParam(shape, dtype, fill=fill, seed=1)
+        data = param.numpy()
+        assert data.shape == shape and data.dtype == dtype
+        # Aligned, so materialize() can wrap the array without copying it.
+        assert data.size == 0 or data.ctypes.data % NDARRAY_ALIGNMENT == 0
+        np.testing.assert_array_equal(data, param.numpy())
+        if fill == "zeros":
+            assert not data.any()
+
+
+class _CountingLazyParam(LazyParam):
+    def __init__(self, *args, **kwargs):
+        super(_CountingLazyParam, self).__init__(*args, **kwargs)
+        self.num_materialized = 0
+
+    def numpy(self):
+        self.num_materialized += 1
+        return super(_CountingLazyParam, self).numpy()
+
+
+def test_indexed_params_checksums_sharded(tmpdir):
+    lazy = _CountingLazyParam((1000,), "float32", fill="random")
+    params = {
+        "a": np.arange(10, dtype="float32"),
+        "b": lazy,
+        "c": np.arange(3000, dtype="int64"),
+    }
+    path = str(tmpdir.join("model.params"))
+    paths = save_indexed_params(params, path, shard_size=4096)
+    assert len(paths) == 2
+    # The checksums are computed while writing, without serializing twice.
+    assert lazy.num_materialized == 1
+
+    reader = IndexedParamsReader.open(path)
+    for name in params:
+        data = reader.read(name, verify=True).numpy()
+        assert reader.info(name)["crc32"] == zlib.crc32(data.tobytes())
+
+    with open(paths[1], "r+b") as shard_file:
+        shard_file.write(b"\xff")
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        IndexedParamsReader.open(path).read("c", verify=True)
+
+
+@pytest.mark.parametrize("alignment", [64, 256])
+def test_param_arena_alignment(tmpdir, alignment):
+    # Sizes that are not multiples of the alignment, so padding is needed.
+    params = {
+        "a": np.arange(3, dtype="float32"),
+        "b": np.arange(17, dtype="int8"),
+        "c": np.arange(5 * 7, dtype="float64").reshape(5, 7),
+        "d": np.arange(1, dtype="int16"),
+    }
+    arenas = [ParamArena.pack(params, alignment)]
+    path = str(tmpdir.join("arena.params"))
+    arenas[0].save(path)
+    arenas += [ParamArena.load(path), ParamArena.load(path, mmap_file=True)]
+
+    for arena in arenas:
+        start = np.frombuffer(arena.buffer, dtype="uint8").ctypes.data
+        for name, value in params.items():
+            view = arena.view(name)
+            offset = view.ctypes.data - start
+            assert 0 <= offset and offset + view.nbytes <= arena.nbytes
+            assert view.ctypes.data % NDARRAY_ALIGNMENT == 0
+            assert offset % alignment == 0
+            np.testing.assert_array_equal(view, value)
+            np.testing.assert_array_equal(arena[name].numpy(), value)
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))